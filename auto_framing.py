@@ -0,0 +1,174 @@
+import math
+import time
+import logging
+
+import cv2
+import mediapipe as mp
+
+# Автокадрирование зелёной области (лицо стримера) во время воспроизведения в редакторе.
+# Детектор (лицо, при неудаче - поза) работает на уменьшенном кадре раз в несколько кадров, между
+# детекциями область ведёт трекер OpenCV. Рамка сглаживается, интервал детекции подстраивается так,
+# чтобы средняя стоимость кадра укладывалась в долю бюджета воспроизведения.
+logger = logging.getLogger("TwitchVideoSuite")
+
+# Ширина кадра для детектора и трекера
+DETECT_WIDTH = 320
+# Доля длительности кадра, которую может занимать автокадрирование в среднем
+BUDGET_SHARE = 0.25
+# Во сколько раз кадр шире и выше лица
+FACE_ZOOM = 2.5
+# Сглаживание рамки: доля пути к новой цели за кадр; сдвиги меньше мёртвой зоны игнорируются
+SMOOTHING = 0.15
+DEAD_ZONE = 0.02
+# Ориентиры головы в MediaPipe Pose: нос, глаза, уши
+POSE_HEAD_LANDMARKS = (0, 2, 5, 7, 8)
+
+def create_tracker():
+    """KCF из opencv-contrib, иначе MIL из основной сборки; None - трекера нет, работает только детектор"""
+    for factory in ('TrackerKCF_create', 'legacy.TrackerKCF_create', 'TrackerMIL_create'):
+        owner = cv2
+        for name in factory.split('.'):
+            owner = getattr(owner, name, None)
+            if owner is None:
+                break
+        if owner is not None:
+            return owner()
+    return None
+
+class AutoFramer:
+    """Предлагаемая рамка (x, y, w, h) в координатах кадра с заданным соотношением сторон"""
+
+    def __init__(self, fps, detect_width=DETECT_WIDTH, min_interval=3, max_interval=30):
+        self.frame_ms = 1000.0 / (fps or 30.0)
+        self.detect_width = detect_width
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.face = mp.solutions.face_detection.FaceDetection(model_selection=0, min_detection_confidence=0.5)
+        self.pose = None
+        self.tracker = None
+        self.box = None
+        self.crop = None
+        self.since_detect = self.interval
+        # Скользящие средние стоимости, мс: весь кадр, детекция, трекинг
+        self.cost_ms = 0.0
+        self.detect_ms = 0.0
+        self.track_ms = 0.0
+        self.last_ms = 0.0
+
+    @property
+    def budget_ms(self):
+        return self.frame_ms * BUDGET_SHARE
+
+    def reset(self):
+        """Сброс после перемотки: следующая рамка начнётся с детекции"""
+        self.tracker = None
+        self.box = None
+        self.since_detect = self.interval
+
+    def detect(self, small):
+        rgb = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+        h, w = small.shape[:2]
+        results = self.face.process(rgb)
+        if results.detections:
+            best = max(results.detections, key=lambda detection: detection.score[0])
+            bbox = best.location_data.relative_bounding_box
+            return bbox.xmin * w, bbox.ymin * h, bbox.width * w, bbox.height * h
+
+        # Лицо не найдено (профиль, маска, мелко) - голова по ориентирам позы
+        if self.pose is None:
+            self.pose = mp.solutions.pose.Pose(static_image_mode=True, model_complexity=0)
+        results = self.pose.process(rgb)
+        if not results.pose_landmarks:
+            return None
+        points = [results.pose_landmarks.landmark[index] for index in POSE_HEAD_LANDMARKS]
+        points = [(p.x * w, p.y * h) for p in points if p.visibility > 0.5]
+        if len(points) < 2:
+            return None
+        xs, ys = [p[0] for p in points], [p[1] for p in points]
+        size = max(max(xs) - min(xs), max(ys) - min(ys)) * 1.6
+        cx, cy = (min(xs) + max(xs)) / 2, (min(ys) + max(ys)) / 2
+        return cx - size / 2, cy - size / 2, size, size
+
+    def update(self, frame, aspect):
+        """Рамка для кадра frame с соотношением сторон aspect (w / h); None, пока лицо не найдено"""
+        started = time.perf_counter()
+        frame_h, frame_w = frame.shape[:2]
+        scale = min(1.0, self.detect_width / frame_w)
+        small = None
+        if self.since_detect >= self.interval or self.tracker is not None:
+            small = cv2.resize(frame, (int(frame_w * scale), int(frame_h * scale)), interpolation=cv2.INTER_AREA)
+
+        box = None
+        detected = False
+        # Без лица и без трекера детектор тоже ждёт интервал: иначе он шёл бы на каждом кадре,
+        # причём с запасным проходом позы - самый дорогой случай
+        if self.since_detect >= self.interval:
+            box = self.detect(small)
+            self.since_detect = 0
+            detected = True
+            self.tracker = None
+            if box is not None:
+                self.tracker = create_tracker()
+                if self.tracker is not None:
+                    self.tracker.init(small, tuple(int(v) for v in box))
+        elif self.tracker is not None:
+            ok, tracked = self.tracker.update(small)
+            box = tracked if ok else None
+            if not ok:
+                # Трекер потерял цель - детекция на следующем кадре
+                self.tracker = None
+                self.since_detect = self.interval
+        self.since_detect += 1
+        if box is not None:
+            self.box = [v / scale for v in box]
+
+        if self.box is not None:
+            self.crop = self.smooth(self.target_crop(self.box, aspect, frame_w, frame_h), frame_w, frame_h)
+
+        elapsed = (time.perf_counter() - started) * 1000
+        self.account(elapsed, detected)
+        return [int(round(v)) for v in self.crop] if self.crop is not None else None
+
+    @staticmethod
+    def target_crop(box, aspect, frame_w, frame_h):
+        x, y, w, h = box
+        crop_h = min(frame_h, h * FACE_ZOOM, frame_w / aspect)
+        crop_w = crop_h * aspect
+        cx, cy = x + w / 2, y + h / 2
+        return [cx - crop_w / 2, cy - crop_h / 2, crop_w, crop_h]
+
+    def smooth(self, target, frame_w, frame_h):
+        if self.crop is None or abs(target[2] - self.crop[2]) > self.crop[2] * 0.5:
+            crop = list(target)
+        else:
+            crop = list(self.crop)
+            dead_zone = frame_w * DEAD_ZONE
+            target_center = (target[0] + target[2] / 2, target[1] + target[3] / 2)
+            center = (crop[0] + crop[2] / 2, crop[1] + crop[3] / 2)
+            if math.hypot(target_center[0] - center[0], target_center[1] - center[1]) > dead_zone:
+                crop[0] += (target[0] - crop[0]) * SMOOTHING
+                crop[1] += (target[1] - crop[1]) * SMOOTHING
+            crop[2] += (target[2] - crop[2]) * SMOOTHING
+            crop[3] += (target[3] - crop[3]) * SMOOTHING
+        # Рамка не выходит за кадр
+        crop[2], crop[3] = min(crop[2], frame_w), min(crop[3], frame_h)
+        crop[0] = max(0.0, min(crop[0], frame_w - crop[2]))
+        crop[1] = max(0.0, min(crop[1], frame_h - crop[3]))
+        return crop
+
+    def account(self, elapsed, detected):
+        self.last_ms = elapsed
+        self.cost_ms = elapsed if not self.cost_ms else 0.9 * self.cost_ms + 0.1 * elapsed
+        if detected:
+            self.detect_ms = elapsed if not self.detect_ms else 0.7 * self.detect_ms + 0.3 * elapsed
+        else:
+            self.track_ms = elapsed if not self.track_ms else 0.9 * self.track_ms + 0.1 * elapsed
+        # Детекция размазывается по интервалу: detect / interval + track укладываются в бюджет
+        spare = max(0.1, self.budget_ms - self.track_ms)
+        self.interval = max(self.min_interval, min(self.max_interval, math.ceil(self.detect_ms / spare)))
+
+    def close(self):
+        self.face.close()
+        if self.pose is not None:
+            self.pose.close()
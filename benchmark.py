@@ -0,0 +1,330 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+
+# Бенчмарк рендера на синтетических исходниках (ffmpeg testsrc2 + sine), без Qt.
+#
+#   python benchmark.py --save bench.json
+#   python benchmark.py --resolutions 1080p,4k --fps 60 --cases render_9x16,preview
+#   python benchmark.py --baseline bench.json --threshold 0.1    # код выхода 1 при регрессии
+#
+# Каждый замер запускается отдельным процессом, чтобы пиковое потребление памяти относилось к нему одному.
+
+logger = logging.getLogger("TwitchVideoSuite")
+
+RESOLUTIONS = {
+    '720p': (1280, 720),
+    '1080p': (1920, 1080),
+    '1440p': (2560, 1440),
+    '4k': (3840, 2160),
+}
+FRAME_RATES = (30, 60)
+
+# Пути рендера: полный Renderer (декодирование, компоновка, энкодер, звук) и компоновка кадра отдельно
+CASES = (
+    'render_9x16',
+    'render_all_formats',
+    'render_keyframed',
+    'render_remote',
+    'compose_remap',
+    'compose_area',
+    'preview',
+)
+
+# Скорость локального media_server.py для render_remote, Мбит/с на соединение: рендер читает
+# исходник по HTTP, и при перекрытии сети с рендером fps близок к render_9x16
+REMOTE_MBPS = 50
+
+# Метрика -> True, если больше значит лучше
+REGRESSION_METRICS = {
+    'fps': True,
+    'p95_ms': False,
+    'peak_rss_mb': False,
+}
+
+def synthetic_source(folder, width, height, fps, duration):
+    """Тестовое видео H.264 со звуком; генерируется один раз и переиспользуется"""
+    path = os.path.join(folder, f"testsrc_{width}x{height}_{fps}fps_{duration}s.mp4")
+    if os.path.exists(path):
+        return path
+    os.makedirs(folder, exist_ok=True)
+    tmp_path = path + '.part.mp4'
+    command = [
+        'ffmpeg', '-y',
+        '-f', 'lavfi', '-i', f"testsrc2=size={width}x{height}:rate={fps}:duration={duration}",
+        '-f', 'lavfi', '-i', f"sine=frequency=440:sample_rate=48000:duration={duration}",
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p', '-g', str(fps * 2),
+        '-c:a', 'aac', '-b:a', '128k',
+        '-shortest',
+        tmp_path
+    ]
+    logger.info(f"Генерация тестового видео {width}x{height}@{fps}")
+    subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    os.replace(tmp_path, path)
+    return path
+
+def default_rects(width, height):
+    # Игровая область по центру и веб-камера в левом верхнем углу, как в типичной раскладке стрима
+    game = [int(width * 0.3), 0, int(width * 0.4), height]
+    camera = [0, 0, int(width * 0.25), int(height * 0.25)]
+    return [game, camera]
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux отдаёт килобайты, macOS - байты
+        return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    try:
+        import psutil
+    except ImportError:
+        return None
+    info = psutil.Process().memory_info()
+    return round(getattr(info, 'peak_wset', info.rss) / (1024 * 1024), 1)
+
+def folder_size(folder):
+    total = 0
+    for root, _, files in os.walk(folder):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+def bench_render(case, source):
+    import cv2
+    from render_core import Renderer, OUTPUT_FORMATS
+
+    cap = cv2.VideoCapture(source)
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    duration = cap.get(cv2.CAP_PROP_FRAME_COUNT) / fps
+    cap.release()
+
+    rects = default_rects(width, height)
+    if case == 'render_all_formats':
+        formats = [{'name': name.replace(':', 'x'), 'rects': rects, 'size': size} for name, size in OUTPUT_FORMATS.items()]
+    else:
+        formats = [{'name': '', 'rects': rects, 'size': OUTPUT_FORMATS['9:16']}]
+    if case == 'render_keyframed':
+        # Веб-камера плавно переезжает через весь кадр - путь с покадровой геометрией
+        camera = rects[1]
+        moved = [width - camera[2], height - camera[3], camera[2], camera[3]]
+        formats[0]['keyframes'] = [None, [[0.0, camera, 'ease_in_out'], [duration, moved, 'linear']]]
+
+    output = tempfile.mkdtemp(prefix='bench_render_')
+    latencies = []
+    last = [time.perf_counter()]
+
+    def on_frame(frame_index):
+        now = time.perf_counter()
+        latencies.append((now - last[0]) * 1000)
+        last[0] = now
+
+    server = None
+    render_source = source
+    if case == 'render_remote':
+        from media_server import MediaServer
+        server = MediaServer(('127.0.0.1', 0), os.path.dirname(source), mbps=REMOTE_MBPS)
+        server.start_background()
+        render_source = server.url_for(source)
+
+    # Рендерится всё видео одной частью: остановка посреди части отбросила бы результат,
+    # а размер вывода не должен зависеть от длины частей
+    renderer = Renderer(render_source, output, formats, encoder={'part_duration': 24 * 3600},
+                        on_frame=on_frame, metrics_dir=None)
+    started = time.perf_counter()
+    last[0] = started
+    try:
+        renderer.run()
+    finally:
+        if server:
+            server.shutdown()
+            server.server_close()
+    seconds = time.perf_counter() - started
+    output_bytes = folder_size(output)
+    shutil.rmtree(output, ignore_errors=True)
+    if renderer.error:
+        raise RuntimeError(renderer.error)
+    return latencies, seconds, output_bytes, renderer.stats.snapshot()['stages']
+
+def bench_compose(case, source, max_frames):
+    import cv2
+    import numpy as np
+    from render_core import LayoutEngine, OUTPUT_FORMATS, PROXY_HEIGHT, scale_rect_list
+
+    cap = cv2.VideoCapture(source)
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    rects = default_rects(width, height)
+
+    proxy_size = None
+    if case == 'preview':
+        # Как update_preview: кадр прокси 540p, предпросмотр 360x640 в переиспользуемый буфер
+        scale = min(1.0, PROXY_HEIGHT / height)
+        proxy_size = (int(width * scale), int(height * scale))
+        rects = [scale_rect_list(rect, scale, scale) for rect in rects]
+        out_size = (360, 640)
+    else:
+        out_size = OUTPUT_FORMATS['9:16']
+    method = {'compose_remap': 'remap', 'compose_area': 'resize'}.get(case, 'auto')
+    engine = LayoutEngine.stacked(rects, out_size, method=method)
+    out = np.empty((out_size[1], out_size[0], 3), np.uint8)
+
+    latencies = []
+    started = time.perf_counter()
+    while not max_frames or len(latencies) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if proxy_size and proxy_size != (width, height):
+            frame = cv2.resize(frame, proxy_size, interpolation=cv2.INTER_AREA)
+        # Замеряется только компоновка, декодирование в латентность не входит
+        t0 = time.perf_counter()
+        engine.compose(frame, out=out)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    seconds = sum(latencies) / 1000
+    cap.release()
+    logger.info(f"Прогон {case}: {time.perf_counter() - started:.2f} сек с декодированием")
+    return latencies, seconds, None, None
+
+def run_case(case, source, max_frames):
+    if case.startswith('render_'):
+        latencies, seconds, output_bytes, stages = bench_render(case, source)
+    else:
+        latencies, seconds, output_bytes, stages = bench_compose(case, source, max_frames)
+    return {
+        'frames': len(latencies),
+        'seconds': round(seconds, 3),
+        'fps': round(len(latencies) / seconds, 2) if seconds > 0 else None,
+        'p50_ms': round(percentile(latencies, 50), 3) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95), 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99), 3) if latencies else None,
+        'max_ms': round(max(latencies), 3) if latencies else None,
+        'peak_rss_mb': peak_rss_mb(),
+        'output_bytes': output_bytes,
+        'stages': stages,
+    }
+
+def run_case_subprocess(case, source, max_frames):
+    command = [sys.executable, os.path.abspath(__file__), '--run-case', case, '--source', source,
+               '--max-frames', str(max_frames)]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        return {'error': result.stderr.decode('utf-8', 'replace').strip().splitlines()[-1:]}
+    return json.loads(result.stdout.decode('utf-8').strip().splitlines()[-1])
+
+def result_key(result):
+    return f"{result['case']}@{result['source']}"
+
+def compare(results, baseline, threshold):
+    """Регрессии относительно базового прогона: список строк, пустой - всё в порядке"""
+    previous = {result_key(result): result for result in baseline.get('results', [])}
+    regressions = []
+    for result in results:
+        base = previous.get(result_key(result))
+        if not base or 'error' in base:
+            continue
+        if 'error' in result:
+            regressions.append(f"{result_key(result)}: ошибка {result['error']}")
+            continue
+        for metric, higher_is_better in REGRESSION_METRICS.items():
+            old, new = base.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (higher_is_better and change < -threshold) or (not higher_is_better and change > threshold):
+                regressions.append(f"{result_key(result)}: {metric} {old} -> {new} ({change:+.1%})")
+    return regressions
+
+def main(argv=None):
+    from render_core import APP_DATA_DIR
+
+    parser = argparse.ArgumentParser(description="Бенчмарк рендера на синтетических видео")
+    parser.add_argument('--resolutions', default=','.join(RESOLUTIONS), help="через запятую: " + ', '.join(RESOLUTIONS))
+    parser.add_argument('--fps', default=','.join(str(f) for f in FRAME_RATES), help="частоты кадров через запятую")
+    parser.add_argument('--cases', default=','.join(CASES), help="через запятую: " + ', '.join(CASES))
+    parser.add_argument('--duration', type=int, default=10, help="длительность тестовых видео, секунд")
+    parser.add_argument('--max-frames', type=int, default=300, help="кадров на замер компоновки (0 - всё видео), рендер идёт по всему видео")
+    parser.add_argument('--sources', default=os.path.join(APP_DATA_DIR, 'bench_sources'), help="кэш тестовых видео")
+    parser.add_argument('--save', help="сохранить результаты в JSON")
+    parser.add_argument('--baseline', help="JSON прошлого прогона для проверки регрессий")
+    parser.add_argument('--threshold', type=float, default=0.10, help="допустимое ухудшение метрики (доля)")
+    parser.add_argument('--run-case', help=argparse.SUPPRESS)
+    parser.add_argument('--source', help=argparse.SUPPRESS)
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stderr)]
+    )
+
+    if args.run_case:
+        print(json.dumps(run_case(args.run_case, args.source, args.max_frames)))
+        return 0
+
+    cases = [c.strip() for c in args.cases.split(',') if c.strip()]
+    unknown = [c for c in cases if c not in CASES]
+    if unknown:
+        parser.error(f"неизвестные замеры: {', '.join(unknown)}")
+
+    results = []
+    for label in (r.strip().lower() for r in args.resolutions.split(',') if r.strip()):
+        width, height = RESOLUTIONS[label]
+        for fps in (int(f) for f in args.fps.split(',') if f.strip()):
+            try:
+                source = synthetic_source(args.sources, width, height, fps, args.duration)
+            except (OSError, subprocess.CalledProcessError) as e:
+                logger.error(f"Не удалось сгенерировать тестовое видео (нужен ffmpeg): {e}")
+                return 2
+            for case in cases:
+                result = {'case': case, 'source': f"{label}{fps}"}
+                result.update(run_case_subprocess(case, source, args.max_frames))
+                results.append(result)
+                if 'error' in result:
+                    print(f"{result_key(result):28} ошибка: {result['error']}")
+                else:
+                    print(f"{result_key(result):28} {result['fps'] or 0:9.1f} fps  p95 {result['p95_ms'] or 0:8.2f} ms"
+                          f"  RSS {result['peak_rss_mb'] or 0:7.1f} MB")
+                sys.stdout.flush()
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'machine': {'platform': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()},
+        'max_frames': args.max_frames,
+        'results': results,
+    }
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for line in regressions:
+            print(f"РЕГРЕССИЯ {line}")
+        if regressions:
+            return 1
+    return 1 if any('error' in result for result in results) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
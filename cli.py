@@ -0,0 +1,384 @@
+import os
+import sys
+import json
+import time
+import signal
+import logging
+import argparse
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+# Консольный вход без Qt для серверов рендера.
+# Тяжёлые модули (requests, cv2, numpy) импортируются внутри подкоманд, которым они нужны.
+#
+#   python cli.py clips --channels shroud,xqc --save clips.jsonl
+#   python cli.py download --clips clips.jsonl --output ./clips --jobs 4
+#   python cli.py render job.json --parallel 2
+#   python cli.py watch ./clips --output ./out --preset layout_preset.json --workers 2
+#
+# Спецификация задачи рендера (объект или список объектов):
+#   {"source": "vod.mp4", "output": "out",
+#    "formats": [{"preset": "9:16", "rects": [[x, y, w, h], [x, y, w, h]]}],
+#    "rect_space": null, "encoder": {"fourcc": "mp4v", "part_duration": 180},
+#    "segment": [start_sec, end_sec],   # необязательно, например момент из подкоманды highlights
+#    "clip_id": "..."}                  # необязательно, связывает интервалы рендера в --trace с загрузкой клипа
+# source может быть ссылкой: прямой адрес видео читается по сети во время рендера, страница клипа
+# (https://clips.twitch.tv/...) сначала разрешается через yt-dlp -g.
+# encoder.cut: "scene" (по умолчанию) - граница части на смене сцены или паузе в пределах
+# part_duration +- cut_tolerance секунд (по умолчанию 20), "fixed" - ровно каждые part_duration секунд.
+# encoder.container: "faststart" (по умолчанию, moov в начале файла), "mp4", "fragmented" (fMP4) или
+# "hls" (part_N/index.m3u8 с сегментами fMP4 и общий stream.m3u8, который дописывается по мере рендера).
+# encoder.loudness: целевая громкость частей по EBU R128, LUFS (по умолчанию -16), null - без нормализации.
+#
+# Пресет для watch сохраняется кнопкой Save Preset в редакторе: {"formats": [...], "rect_space": [w, h], "encoder": null}
+#
+# Прогресс и результаты выводятся в stdout построчно в JSON, логи - в stderr.
+# --trace trace.json (или TRACE_PATH) сохраняет интервалы Helix, загрузок и рендера в формате Chrome trace events.
+
+logger = logging.getLogger("TwitchVideoSuite")
+
+output_lock = threading.Lock()
+
+def emit(event, **fields):
+    record = {'event': event, 'time': round(time.time(), 3)}
+    record.update(fields)
+    line = json.dumps(record, ensure_ascii=False)
+    with output_lock:
+        sys.stdout.write(line + '\n')
+        sys.stdout.flush()
+
+def load_env():
+    # python-dotenv необязателен: на серверах переменные обычно задаются окружением
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        return
+    load_dotenv()
+
+def read_json_lines(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def cmd_clips(args):
+    import twitch_api
+
+    client_id = os.getenv('CLIENT_ID')
+    client_secret = os.getenv('CLIENT_SECRET')
+    if not client_id or not client_secret:
+        logger.error("CLIENT_ID и CLIENT_SECRET должны быть заданы в окружении")
+        return 2
+
+    channels = [c.strip() for c in (args.channels or os.getenv('CHANNELS', '')).split(',') if c.strip()]
+    if not channels:
+        logger.error("Укажите хотя бы один канал")
+        return 2
+
+    token = twitch_api.get_access_token(client_id, client_secret)
+    headers = twitch_api.helix_headers(client_id, token)
+
+    save_file = open(args.save, 'w', encoding='utf-8') if args.save else None
+    count = 0
+
+    def output(clip):
+        emit('clip', clip=clip)
+        if save_file:
+            save_file.write(json.dumps(clip, ensure_ascii=False) + '\n')
+
+    try:
+        if args.top:
+            # Лучшие клипы по всем каналам, страницы ранжируются по мере получения
+            from clip_ranking import TopKRanker, stream_top_clips
+            ranker = TopKRanker(args.top, args.score)
+            for clip in stream_top_clips(channels, headers, ranker, workers=args.jobs, started_at=args.started_at):
+                output(clip)
+                count += 1
+        else:
+            for channel in channels:
+                user_id = twitch_api.get_user_id(channel, headers)
+                if not user_id:
+                    emit('channel_missing', channel=channel)
+                    continue
+                clips = twitch_api.get_clips(user_id, headers, first=args.first, started_at=args.started_at)
+                for clip in clips:
+                    clip['channel'] = channel
+                    output(clip)
+                    count += 1
+    finally:
+        if save_file:
+            save_file.close()
+
+    emit('clips_done', count=count)
+    return 0
+
+def cmd_download(args):
+    import twitch_api
+
+    clips = []
+    if args.clips:
+        clips.extend(read_json_lines(args.clips))
+    for url in args.url or []:
+        clips.append({'url': url, 'channel': 'clip', 'title': str(len(clips) + 1)})
+    if not clips:
+        logger.error("Нет клипов для скачивания")
+        return 2
+
+    if args.dedup:
+        # Почти одинаковые клипы одного момента определяются по миниатюрам и не скачиваются
+        from clip_dedup import mark_duplicates
+        mark_duplicates(clips, max_distance=args.max_distance, workers=args.jobs)
+        for clip in clips:
+            if clip.get('duplicate_of'):
+                emit('duplicate_skipped', url=clip['url'], duplicate_of=clip['duplicate_of'])
+        clips = [clip for clip in clips if not clip.get('duplicate_of')]
+
+    os.makedirs(args.output, exist_ok=True)
+
+    def download(clip):
+        save_path = os.path.join(args.output, twitch_api.clip_filename(clip))
+        emit('download_started', url=clip['url'], path=save_path)
+        try:
+            twitch_api.download_clip(clip['url'], save_path)
+        except Exception as e:
+            emit('download_failed', url=clip['url'], error=str(e))
+            return False
+        # clip_id переносится в спецификацию рендера, чтобы трасса связала загрузку и рендер
+        emit('downloaded', url=clip['url'], path=save_path, clip_id=twitch_api.clip_id_from_url(clip['url']))
+        return True
+
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        results = list(pool.map(download, clips))
+
+    failed = results.count(False)
+    emit('download_done', total=len(results), failed=failed)
+    return 1 if failed else 0
+
+def load_job_specs(paths):
+    specs = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        for index, spec in enumerate(data if isinstance(data, list) else [data]):
+            spec.setdefault('id', f"{os.path.splitext(os.path.basename(path))[0]}-{index + 1}")
+            specs.append(spec)
+    return specs
+
+def normalize_formats(spec, output_formats):
+    """Форматы из спецификации: размер можно задать явно или именем пресета ('9:16', '1:1', '4:5')"""
+    formats = []
+    for fmt in spec['formats']:
+        fmt = dict(fmt)
+        preset = fmt.pop('preset', '9:16')
+        fmt.setdefault('size', output_formats[preset])
+        fmt.setdefault('name', preset.replace(':', 'x') if len(spec['formats']) > 1 else '')
+        formats.append(fmt)
+    return formats
+
+def cmd_render(args):
+    from render_core import Renderer, OUTPUT_FORMATS
+    from stream_source import is_remote, is_direct_media
+
+    specs = load_job_specs(args.jobs)
+    renderers = []
+    renderers_lock = threading.Lock()
+
+    def stop_all(signum, frame):
+        # Остановка на границе кадра: манифест сохранится, повторный запуск продолжит рендер
+        emit('stopping', signal=signum)
+        with renderers_lock:
+            for renderer in renderers:
+                renderer.stop()
+
+    signal.signal(signal.SIGINT, stop_all)
+    signal.signal(signal.SIGTERM, stop_all)
+
+    def render(spec):
+        job_id = spec['id']
+        last_percent = [-1]
+
+        def on_progress(percent):
+            if percent != last_percent[0]:
+                last_percent[0] = percent
+                emit('progress', job=job_id, percent=percent)
+
+        source = spec['source']
+        clip_id = spec.get('clip_id')
+        if is_remote(source) and not is_direct_media(source):
+            # Страница клипа разрешается через yt-dlp; локальный рендер не тянет requests
+            import twitch_api
+            clip_id = clip_id or twitch_api.clip_id_from_url(source)
+            try:
+                source = twitch_api.resolve_direct_url(source)
+            except (subprocess.CalledProcessError, OSError) as e:
+                emit('job_finished', job=job_id, status='failed', error=f"Не удалось получить прямую ссылку: {e}",
+                     seconds=0.0)
+                return 'failed'
+
+        # Ошибка одной задачи не должна обрывать pool.map и остальные задачи
+        try:
+            renderer = Renderer(
+                source,
+                spec['output'],
+                normalize_formats(spec, OUTPUT_FORMATS),
+                rect_space=spec.get('rect_space'),
+                encoder=spec.get('encoder'),
+                on_progress=on_progress,
+                on_stats=lambda stats: emit('stats', job=job_id, **stats),
+                job_id=job_id,
+                segment=spec.get('segment'),
+                clip_id=clip_id
+            )
+        except (KeyError, ValueError) as e:
+            emit('job_finished', job=job_id, status='failed', error=f"Неверная спецификация: {e}", seconds=0.0)
+            return 'failed'
+        with renderers_lock:
+            renderers.append(renderer)
+        emit('job_started', job=job_id, source=spec['source'])
+        started = time.perf_counter()
+        try:
+            renderer.run()
+        except Exception as e:
+            logger.error(f"Ошибка рендера {job_id}: {e}")
+            renderer.error = str(e)
+
+        if renderer.completed:
+            status = 'done'
+        elif not renderer.running:
+            status = 'stopped'
+        else:
+            status = 'failed'
+        emit('job_finished', job=job_id, status=status, error=renderer.error,
+             seconds=round(time.perf_counter() - started, 3))
+        return status
+
+    with ThreadPoolExecutor(max_workers=args.parallel) as pool:
+        statuses = list(pool.map(render, specs))
+
+    emit('render_done', total=len(statuses), failed=statuses.count('failed'), stopped=statuses.count('stopped'))
+    if 'stopped' in statuses:
+        return 130
+    return 1 if 'failed' in statuses else 0
+
+def cmd_watch(args):
+    from render_core import load_layout_preset
+    from watch_daemon import WatchDaemon
+
+    try:
+        preset = load_layout_preset(args.preset)
+    except (OSError, ValueError) as e:
+        logger.error(f"Не удалось загрузить пресет: {e}")
+        return 2
+
+    daemon = WatchDaemon(
+        args.folder,
+        args.output,
+        preset,
+        workers=args.workers,
+        ledger_path=args.ledger,
+        poll_interval=args.poll,
+        settle_seconds=args.settle,
+        retry_failed=args.retry_failed,
+        dedup_distance=args.max_distance if args.dedup else None,
+        emit=emit
+    )
+
+    def stop(signum, frame):
+        emit('stopping', signal=signum)
+        daemon.stop()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    daemon.run()
+    return 0
+
+def cmd_highlights(args):
+    from highlights import detect_highlights
+
+    last_percent = [-1]
+
+    def on_progress(percent):
+        if percent != last_percent[0]:
+            last_percent[0] = percent
+            emit('progress', path=args.vod, percent=percent)
+
+    started = time.perf_counter()
+    highlights = detect_highlights(args.vod, top_k=args.top, threshold=args.threshold, on_progress=on_progress)
+    for rank, highlight in enumerate(highlights, start=1):
+        emit('highlight', rank=rank, **highlight)
+    emit('highlights_done', count=len(highlights), seconds=round(time.perf_counter() - started, 3))
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Twitch Video Suite без графического интерфейса")
+    parser.add_argument('-v', '--verbose', action='store_true', help="подробные логи в stderr")
+    parser.add_argument('--trace', help="сохранить трассировку в формате Chrome trace events")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    clips = subparsers.add_parser('clips', help="поиск клипов каналов через Twitch Helix")
+    clips.add_argument('--channels', help="каналы через запятую (по умолчанию CHANNELS из окружения)")
+    clips.add_argument('--first', type=int, default=20, help="клипов на канал")
+    clips.add_argument('--started-at', default='2024-01-01T00:00:00Z')
+    clips.add_argument('--save', help="сохранить клипы в JSONL для подкоманды download")
+    clips.add_argument('--top', type=int, help="вместо --first: K лучших клипов по всем каналам")
+    clips.add_argument('--score', default='velocity', choices=('velocity', 'recency', 'views'), help="оценка для --top")
+    clips.add_argument('--jobs', type=int, default=8, help="каналов одновременно для --top")
+    clips.set_defaults(handler=cmd_clips)
+
+    download = subparsers.add_parser('download', help="массовое скачивание клипов через yt-dlp")
+    download.add_argument('--clips', help="JSONL с клипами из подкоманды clips")
+    download.add_argument('--url', action='append', help="ссылка на клип, можно несколько")
+    download.add_argument('--output', required=True, help="папка для сохранения")
+    download.add_argument('--jobs', type=int, default=4, help="параллельных загрузок")
+    download.add_argument('--dedup', action='store_true', help="пропускать почти одинаковые клипы (по миниатюрам)")
+    download.add_argument('--max-distance', type=int, default=8, help="порог расстояния Хэмминга для --dedup")
+    download.set_defaults(handler=cmd_download)
+
+    render = subparsers.add_parser('render', help="рендер вертикальных частей по JSON-спецификациям")
+    render.add_argument('jobs', nargs='+', help="файлы спецификаций (объект или список объектов)")
+    render.add_argument('--parallel', type=int, default=1, help="задач одновременно")
+    render.set_defaults(handler=cmd_render)
+
+    highlights = subparsers.add_parser('highlights', help="яркие моменты VOD по всплескам громкости")
+    highlights.add_argument('vod', help="локальный файл VOD")
+    highlights.add_argument('--top', type=int, default=20, help="сколько моментов вернуть")
+    highlights.add_argument('--threshold', type=float, default=2.5, help="порог z-оценки громкости")
+    highlights.set_defaults(handler=cmd_highlights)
+
+    watch = subparsers.add_parser('watch', help="автоматический рендер новых клипов из папки по пресету")
+    watch.add_argument('folder', help="папка, куда скачиваются клипы")
+    watch.add_argument('--output', required=True, help="папка результатов, по подпапке на клип")
+    watch.add_argument('--preset', required=True, help="пресет раскладки из редактора (Save Preset)")
+    watch.add_argument('--workers', type=int, default=2, help="рендеров одновременно")
+    watch.add_argument('--ledger', help="журнал обработанных файлов (по умолчанию .render_ledger.jsonl в папке)")
+    watch.add_argument('--poll', type=float, default=2.0, help="интервал опроса папки, секунд")
+    watch.add_argument('--settle', type=float, default=5.0, help="сколько секунд файл не должен меняться")
+    watch.add_argument('--retry-failed', action='store_true', help="повторить файлы, рендер которых упал")
+    watch.add_argument('--dedup', action='store_true', help="не рендерить почти одинаковые клипы (по кадрам)")
+    watch.add_argument('--max-distance', type=int, default=8, help="порог расстояния Хэмминга для --dedup")
+    watch.set_defaults(handler=cmd_watch)
+
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stderr)]
+    )
+    load_env()
+
+    # Импорт после load_env: TRACE_PATH может прийти из .env
+    from tracing import tracer, TRACE_PATH
+    trace_path = args.trace or TRACE_PATH
+    tracer.enabled = bool(trace_path)
+    try:
+        return args.handler(args)
+    finally:
+        if trace_path:
+            tracer.export_chrome(trace_path)
+            emit('trace_saved', path=trace_path)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import requests
+
+# Поиск почти одинаковых клипов (один момент, клипнутый разными зрителями) по перцептивному хешу.
+# Хеш - 64 бита DCT (pHash) по миниатюре Helix или по среднему нескольких кадров файла.
+logger = logging.getLogger("TwitchVideoSuite")
+
+# Порог расстояния Хэмминга из 64 бит, ниже которого клипы считаются одним моментом
+DEFAULT_MAX_DISTANCE = 8
+SAMPLE_POSITIONS = (0.25, 0.5, 0.75)
+
+# Таблица числа единичных бит для numpy без np.bitwise_count (numpy < 2.0)
+POPCOUNT8 = np.array([bin(value).count('1') for value in range(256)], np.uint8)
+
+def popcount64(values):
+    values = np.ascontiguousarray(values, np.uint64)
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    return POPCOUNT8[values.view(np.uint8)].reshape(values.shape + (8,)).sum(axis=-1, dtype=np.uint8)
+
+def phash(image):
+    """64-битный pHash: знаки низких частот DCT уменьшенного серого кадра относительно медианы"""
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(image, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].flatten()
+    # Постоянная составляющая зависит только от яркости и в сравнении не участвует: хешируются 63
+    # коэффициента, старший бит - постоянная 1 (прежнее значение бита DC, сохранённые хеши совместимы)
+    ac = low[1:]
+    bits = np.concatenate(([True], ac > np.median(ac)))
+    return int(np.packbits(bits).view('>u8')[0])
+
+def thumbnail_hash(url, timeout=10):
+    response = requests.get(url, timeout=timeout)
+    response.raise_for_status()
+    image = cv2.imdecode(np.frombuffer(response.content, np.uint8), cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        raise ValueError(f"Не удалось декодировать миниатюру {url}")
+    return phash(image)
+
+def video_hash(path, positions=SAMPLE_POSITIONS):
+    """pHash среднего по нескольким кадрам: устойчив к разной обрезке по времени в пределах момента"""
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f"Не удалось открыть видео {path}")
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    accumulator = None
+    frames = 0
+    for position in positions:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, int(frame_count * position))
+        ret, frame = cap.read()
+        if not ret:
+            continue
+        small = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (64, 64), interpolation=cv2.INTER_AREA)
+        accumulator = small.astype(np.float32) if accumulator is None else accumulator + small
+        frames += 1
+    cap.release()
+    if not frames:
+        raise ValueError(f"В видео {path} не прочитано ни одного кадра")
+    return phash(accumulator / frames)
+
+class HashIndex:
+    """Плотный растущий массив хешей с векторным поиском по расстоянию Хэмминга.
+
+    Один запрос - XOR и подсчёт бит по всему массиву uint64: на десятках тысяч клипов это доли миллисекунды.
+    """
+
+    def __init__(self, capacity=1024):
+        self.hashes = np.zeros(capacity, np.uint64)
+        self.keys = []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, key, value):
+        size = len(self.keys)
+        if size == len(self.hashes):
+            self.hashes = np.concatenate([self.hashes, np.zeros(size, np.uint64)])
+        self.hashes[size] = np.uint64(value)
+        self.keys.append(key)
+
+    def distances(self, value):
+        return popcount64(self.hashes[:len(self.keys)] ^ np.uint64(value))
+
+    def search(self, value, max_distance=DEFAULT_MAX_DISTANCE):
+        """Ключи с расстоянием не больше max_distance, ближайшие первыми"""
+        distances = self.distances(value)
+        matches = np.flatnonzero(distances <= max_distance)
+        matches = matches[np.argsort(distances[matches], kind='stable')]
+        return [(self.keys[position], int(distances[position])) for position in matches]
+
+def group_duplicates(hashes, max_distance=DEFAULT_MAX_DISTANCE, block=64):
+    """Номер группы для каждого хеша; порядок важен - первый клип группы считается основным.
+
+    None в hashes (хеш не получен) всегда образует отдельную группу. Каждый хеш сравнивается со всеми
+    предыдущими без индекса (HashIndex не используется); чтобы не держать матрицу N x N, сравнение идёт
+    блоками: расстояния блока ко всем предыдущим хешам считаются одной операцией.
+    """
+    groups = [None] * len(hashes)
+    known = [index for index, value in enumerate(hashes) if value is not None]
+    values = np.array([hashes[index] for index in known], np.uint64)
+    next_group = 0
+    for start in range(0, len(known), block):
+        end = min(start + block, len(known))
+        matrix = popcount64(values[start:end, None] ^ values[None, :end])
+        for row in range(end - start):
+            position = start + row
+            earlier = matrix[row, :position]
+            if len(earlier):
+                nearest = int(np.argmin(earlier))
+                if earlier[nearest] <= max_distance:
+                    groups[known[position]] = groups[known[nearest]]
+                    continue
+            groups[known[position]] = next_group
+            next_group += 1
+    for index, group in enumerate(groups):
+        if group is None:
+            groups[index] = next_group
+            next_group += 1
+    return groups
+
+def hash_thumbnails(clips, workers=8, stop_event=None):
+    """pHash миниатюр клипов Helix параллельно; для недоступных миниатюр - None"""
+    def fetch(clip):
+        url = clip.get('thumbnail_url')
+        # После остановки оставшиеся миниатюры не скачиваются
+        if not url or (stop_event is not None and stop_event.is_set()):
+            return None
+        try:
+            return thumbnail_hash(url)
+        except (requests.RequestException, ValueError) as e:
+            logger.warning(f"Миниатюра клипа {clip.get('id')} недоступна: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(fetch, clips))
+
+def mark_duplicates(clips, max_distance=DEFAULT_MAX_DISTANCE, workers=8, stop_event=None):
+    """Проставляет клипам 'dup_group' и 'duplicate_of' (id основного клипа группы или None)"""
+    groups = group_duplicates(hash_thumbnails(clips, workers, stop_event), max_distance)
+    primary = {}
+    for clip, group in zip(clips, groups):
+        clip['dup_group'] = group
+        clip['duplicate_of'] = primary.get(group)
+        primary.setdefault(group, clip['id'])
+    return clips
+
+def grouped_order(clips):
+    """Клипы в исходном порядке групп, дубликаты сразу под основным клипом"""
+    groups = {}
+    for clip in clips:
+        groups.setdefault(clip.get('dup_group', id(clip)), []).append(clip)
+    return [clip for members in groups.values() for clip in members]
@@ -0,0 +1,121 @@
+import heapq
+import logging
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+import twitch_api
+
+# Потоковый отбор лучших клипов по нескольким каналам: страницы Helix ранжируются по мере получения,
+# в памяти держатся только K лучших клипов.
+logger = logging.getLogger("TwitchVideoSuite")
+
+# velocity - просмотров в час с момента создания, recency - просмотры с затуханием по возрасту, views - как раньше
+SCORES = ('velocity', 'recency', 'views')
+
+def clip_age_hours(clip, now):
+    created = datetime.strptime(clip['created_at'], '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc)
+    # Не меньше часа: свежий клип с десятком просмотров не должен получить бесконечную скорость
+    return max(1.0, (now - created).total_seconds() / 3600)
+
+class TopKRanker:
+    """Ограниченная куча K лучших клипов; дубликаты по id отбрасываются. Потокобезопасен.
+
+    Любая оценка не больше view_count (возраст не меньше часа, затухание не больше 1), поэтому
+    канал можно дальше не листать, когда просмотры на странице опустились ниже порога кучи.
+    """
+
+    def __init__(self, k=50, score='velocity', half_life_hours=48.0, now=None):
+        if score not in SCORES:
+            raise ValueError(f"Неизвестная оценка: {score}")
+        self.k = k
+        self.score_name = score
+        self.half_life_hours = half_life_hours
+        self.now = now or datetime.now(timezone.utc)
+        self.heap = []
+        self.seen = set()
+        self.counter = 0
+        self.lock = threading.Lock()
+
+    def score(self, clip):
+        views = clip['view_count']
+        if self.score_name == 'views':
+            return float(views)
+        age = clip_age_hours(clip, self.now)
+        if self.score_name == 'velocity':
+            return views / age
+        return views * 0.5 ** (age / self.half_life_hours)
+
+    @property
+    def full(self):
+        return len(self.heap) >= self.k
+
+    @property
+    def threshold(self):
+        """Оценка, которую нужно превысить, чтобы попасть в топ"""
+        with self.lock:
+            return self.heap[0][0] if len(self.heap) >= self.k else float('-inf')
+
+    def add(self, clip):
+        score = self.score(clip)
+        with self.lock:
+            if clip['id'] in self.seen:
+                return False
+            self.seen.add(clip['id'])
+            self.counter += 1
+            # Счётчик разрешает равенство оценок, не сравнивая словари
+            entry = (score, self.counter, clip)
+            if len(self.heap) < self.k:
+                heapq.heappush(self.heap, entry)
+                return True
+            if score > self.heap[0][0]:
+                heapq.heapreplace(self.heap, entry)
+                return True
+            return False
+
+    def extend(self, clips):
+        changed = False
+        for clip in clips:
+            changed = self.add(clip) or changed
+        return changed
+
+    def top(self):
+        with self.lock:
+            entries = sorted(self.heap, reverse=True)
+        return [dict(clip, score=round(score, 2)) for score, _, clip in entries]
+
+def stream_top_clips(channels, headers, ranker, workers=8, started_at='2024-01-01T00:00:00Z', max_pages=10,
+                     on_page=None, stop_event=None, helix_url=twitch_api.HELIX_URL):
+    """Листает клипы каналов параллельно и сливает страницы в ranker.
+
+    on_page(channel, changed) вызывается из рабочих потоков после каждой страницы.
+    """
+    def channel_stream(channel):
+        try:
+            rank_channel(channel)
+        except Exception as e:
+            # Ошибка одного канала не останавливает остальные
+            logger.error(f"Не удалось получить клипы канала {channel}: {e}")
+
+    def rank_channel(channel):
+        user_id = twitch_api.get_user_id(channel, headers, helix_url=helix_url)
+        if not user_id:
+            logger.warning(f"Канал не найден: {channel}")
+            return
+        pages = twitch_api.iter_clip_pages(user_id, headers, started_at=started_at, max_pages=max_pages,
+                                           helix_url=helix_url)
+        for page in pages:
+            if stop_event is not None and stop_event.is_set():
+                return
+            for clip in page:
+                clip['channel'] = channel
+            changed = ranker.extend(page)
+            if on_page:
+                on_page(channel, changed)
+            # Helix отдаёт клипы по убыванию просмотров: ниже порога дальше в топ уже никто не попадёт
+            if page and ranker.full and page[-1]['view_count'] <= ranker.threshold:
+                return
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(channels)))) as pool:
+        list(pool.map(channel_stream, channels))
+    return ranker.top()
@@ -0,0 +1,294 @@
+import sys
+import json
+import time
+import random
+import hashlib
+import logging
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# Локальная замена Twitch Helix для тестов и нагрузочных замеров поиска клипов без сети.
+#
+#   python fake_helix.py --port 8787 --channels 100 --clips-per-channel 2000 --latency-ms 50 --inject-429 0.02
+#   TWITCH_TOKEN_URL=http://127.0.0.1:8787/oauth2/token TWITCH_HELIX_URL=http://127.0.0.1:8787/helix python redy.py
+#
+# Эндпоинты: POST /oauth2/token, GET /helix/users?login=..., GET /helix/clips?broadcaster_id=...&first=...&after=...
+# Каналы называются channel0000, channel0001, ...; клипы генерируются детерминированно по номеру и не хранятся в памяти.
+logger = logging.getLogger("TwitchVideoSuite")
+
+CLIP_PAGE_MAX = 100
+
+class Catalog:
+    """Синтетический каталог: у канала i ровно clips_per_channel клипов, отсортированных по просмотрам"""
+
+    def __init__(self, channels=100, clips_per_channel=1000, seed=0, days=60):
+        self.channels = channels
+        self.clips_per_channel = clips_per_channel
+        self.seed = seed
+        self.days = days
+        self.now = datetime.now(timezone.utc).replace(microsecond=0)
+
+    def login(self, index):
+        return f"channel{index:04d}"
+
+    def user(self, login):
+        if not login.startswith('channel') or not login[7:].isdigit():
+            return None
+        index = int(login[7:])
+        if index >= self.channels:
+            return None
+        return {
+            'id': str(100000 + index),
+            'login': login,
+            'display_name': login.capitalize(),
+            'type': '',
+            'broadcaster_type': 'partner',
+            'description': '',
+            'created_at': '2016-01-01T00:00:00Z',
+        }
+
+    def channel_index(self, broadcaster_id):
+        if not broadcaster_id.isdigit():
+            return None
+        index = int(broadcaster_id) - 100000
+        return index if 0 <= index < self.channels else None
+
+    def clip(self, channel, number):
+        rng = random.Random(f"{self.seed}:{channel}:{number}")
+        slug = hashlib.sha1(f"{self.seed}:{channel}:{number}".encode()).hexdigest()[:16]
+        # Просмотры убывают по номеру, как в выдаче Helix; у популярных каналов база выше
+        base = 200000 / (1 + channel % 50)
+        views = int(base / (number + 1) ** 0.8) + rng.randint(0, 50)
+        created = self.now - timedelta(seconds=rng.randint(0, self.days * 86400))
+        login = self.login(channel)
+        return {
+            'id': slug,
+            'url': f"https://clips.twitch.tv/{slug}",
+            'embed_url': f"https://clips.twitch.tv/embed?clip={slug}",
+            'broadcaster_id': str(100000 + channel),
+            'broadcaster_name': login.capitalize(),
+            'creator_id': str(rng.randint(1, 10 ** 8)),
+            'creator_name': f"viewer{rng.randint(1, 99999)}",
+            'video_id': '',
+            'game_id': str(rng.choice((509658, 32982, 21779, 33214))),
+            'language': 'en',
+            'title': f"{login} clip {number}",
+            'view_count': views,
+            'created_at': created.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'thumbnail_url': f"https://clips-media-assets2.twitch.tv/{slug}-preview-480x272.jpg",
+            'duration': round(rng.uniform(5, 60), 1),
+            'vod_offset': None,
+            'is_featured': False,
+        }
+
+    def clips_page(self, channel, first, after=0, started_at=None):
+        """Страница клипов с позиции after; курсор - номер следующего клипа"""
+        started = started_at.replace('Z', '') if started_at else None
+        page = []
+        number = after
+        while number < self.clips_per_channel and len(page) < first:
+            clip = self.clip(channel, number)
+            number += 1
+            if started and clip['created_at'].replace('Z', '') < started:
+                continue
+            page.append(clip)
+        cursor = str(number) if number < self.clips_per_channel else None
+        return page, cursor
+
+class RateLimiter:
+    """Ведро токенов на клиента, как в Helix: limit запросов за period секунд"""
+
+    def __init__(self, limit=800, period=60.0):
+        self.limit = limit
+        self.period = period
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def take(self, client):
+        now = time.time()
+        rate = self.limit / self.period
+        with self.lock:
+            tokens, updated = self.buckets.get(client, (float(self.limit), now))
+            tokens = min(float(self.limit), tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self.buckets[client] = (tokens, now)
+        reset = int(now + (self.limit - tokens) / rate) + 1
+        return allowed, int(tokens), reset
+
+class FakeHelixServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, catalog, latency_ms=0.0, jitter_ms=0.0, inject_429=0.0, error_rate=0.0,
+                 rate_limit=800, seed=0):
+        super().__init__(address, FakeHelixHandler)
+        self.catalog = catalog
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.inject_429 = inject_429
+        self.error_rate = error_rate
+        self.limiter = RateLimiter(rate_limit)
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.stats = {}
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def roll(self):
+        with self.random_lock:
+            return self.random.random()
+
+    def count(self, endpoint, status):
+        key = f"{endpoint} {status}"
+        with self.stats_lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def start_background(self):
+        thread = threading.Thread(target=self.serve_forever, name='fake-helix', daemon=True)
+        thread.start()
+        return thread
+
+class FakeHelixHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.debug("fake_helix: " + format % args)
+
+    def send_json(self, endpoint, status, data, headers=None):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.server.count(endpoint, status)
+        self.wfile.write(body)
+
+    def simulate_latency(self):
+        server = self.server
+        if server.latency_ms or server.jitter_ms:
+            delay = server.latency_ms + server.jitter_ms * (server.roll() * 2 - 1)
+            time.sleep(max(0.0, delay) / 1000)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        if url.path != '/oauth2/token':
+            self.send_json(url.path, 404, {'error': 'Not Found', 'status': 404})
+            return
+        params = parse_qs(url.query)
+        self.simulate_latency()
+        if not params.get('client_id') or not params.get('client_secret'):
+            self.send_json('token', 400, {'status': 400, 'message': 'missing client_id or client_secret'})
+            return
+        token = hashlib.sha1(f"{params['client_id'][0]}:{time.time()}".encode()).hexdigest()[:30]
+        self.send_json('token', 200, {'access_token': token, 'expires_in': 5184000, 'token_type': 'bearer'})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        server = self.server
+
+        if url.path == '/_stats':
+            self.send_json('stats', 200, server.stats)
+            return
+
+        endpoint = url.path.rsplit('/', 1)[-1]
+        if url.path not in ('/helix/users', '/helix/clips'):
+            self.send_json(url.path, 404, {'error': 'Not Found', 'status': 404})
+            return
+
+        authorization = self.headers.get('Authorization', '')
+        if not self.headers.get('Client-ID') or not authorization.startswith('Bearer '):
+            self.send_json(endpoint, 401, {'error': 'Unauthorized', 'status': 401, 'message': 'OAuth token is missing'})
+            return
+
+        self.simulate_latency()
+
+        allowed, remaining, reset = server.limiter.take(authorization)
+        limit_headers = {
+            'Ratelimit-Limit': server.limiter.limit,
+            'Ratelimit-Remaining': remaining,
+            'Ratelimit-Reset': reset,
+        }
+        if not allowed or server.roll() < server.inject_429:
+            limit_headers['Ratelimit-Remaining'] = 0
+            self.send_json(endpoint, 429, {'error': 'Too Many Requests', 'status': 429, 'message': ''}, limit_headers)
+            return
+        if server.roll() < server.error_rate:
+            self.send_json(endpoint, 503, {'error': 'Service Unavailable', 'status': 503, 'message': ''}, limit_headers)
+            return
+
+        catalog = server.catalog
+        if endpoint == 'users':
+            users = [catalog.user(login) for login in params.get('login', [])[:100]]
+            self.send_json(endpoint, 200, {'data': [user for user in users if user]}, limit_headers)
+            return
+
+        channel = catalog.channel_index(params.get('broadcaster_id', [''])[0])
+        if channel is None:
+            self.send_json(endpoint, 400, {'error': 'Bad Request', 'status': 400,
+                                           'message': 'invalid broadcaster_id'}, limit_headers)
+            return
+        first = max(1, min(CLIP_PAGE_MAX, int(params.get('first', ['20'])[0])))
+        after = params.get('after', [None])[0]
+        page, cursor = catalog.clips_page(
+            channel, first,
+            after=int(after) if after and after.isdigit() else 0,
+            started_at=params.get('started_at', [None])[0]
+        )
+        pagination = {'cursor': cursor} if cursor else {}
+        self.send_json(endpoint, 200, {'data': page, 'pagination': pagination}, limit_headers)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Локальная замена Twitch Helix")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8787)
+    parser.add_argument('--channels', type=int, default=100, help="каналов в каталоге")
+    parser.add_argument('--clips-per-channel', type=int, default=1000)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="задержка ответа")
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help="разброс задержки +-")
+    parser.add_argument('--inject-429', type=float, default=0.0, help="доля случайных ответов 429")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="доля случайных ответов 503")
+    parser.add_argument('--rate-limit', type=int, default=800, help="запросов в минуту на токен")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stderr)]
+    )
+    server = FakeHelixServer(
+        (args.host, args.port),
+        Catalog(args.channels, args.clips_per_channel, args.seed),
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        inject_429=args.inject_429,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        seed=args.seed
+    )
+    logger.info(f"Fake Helix: {server.base_url}/helix, токен: {server.base_url}/oauth2/token")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
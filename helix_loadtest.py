@@ -0,0 +1,145 @@
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Нагрузочный тест поиска клипов против локального fake_helix.py (без сети).
+#
+#   python helix_loadtest.py --channels 100 --pages 5 --workers 8 --latency-ms 40 --inject-429 0.02
+#   python helix_loadtest.py --url http://127.0.0.1:8787 --channels 50   # уже запущенный сервер
+#
+# Поиск идёт теми же функциями twitch_api, что и вкладка поиска клипов и cli.py clips.
+# Отчёт: запросов в секунду, время до первой строки, число 429 и ошибок, печатается одной строкой JSON.
+logger = logging.getLogger("TwitchVideoSuite")
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+def server_stats(base_url):
+    import requests
+    return requests.get(f"{base_url}/_stats").json()
+
+def run_discovery(base_url, channels, pages, page_size, workers, started_at):
+    import twitch_api
+
+    token_url = f"{base_url}/oauth2/token"
+    helix_url = f"{base_url}/helix"
+    started = time.perf_counter()
+    token = twitch_api.get_access_token('loadtest', 'loadtest', token_url=token_url)
+    headers = twitch_api.helix_headers('loadtest', token)
+
+    lock = threading.Lock()
+    first_row = [None]
+    clip_count = [0]
+    request_latencies = []
+
+    def timed(call):
+        t0 = time.perf_counter()
+        result = call()
+        with lock:
+            request_latencies.append((time.perf_counter() - t0) * 1000)
+        return result
+
+    def discover(login):
+        user_id = timed(lambda: twitch_api.get_user_id(login, headers, helix_url=helix_url))
+        if not user_id:
+            return 0
+        count = 0
+        clip_pages = twitch_api.iter_clip_pages(user_id, headers, page_size=page_size, started_at=started_at,
+                                                max_pages=pages, helix_url=helix_url)
+        while True:
+            page = timed(lambda: next(clip_pages, None))
+            if page is None:
+                break
+            count += len(page)
+            if page:
+                with lock:
+                    clip_count[0] += len(page)
+                    if first_row[0] is None:
+                        first_row[0] = time.perf_counter() - started
+        return count
+
+    logins = [f"channel{index:04d}" for index in range(channels)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(discover, logins))
+    seconds = time.perf_counter() - started
+
+    return {
+        'channels': channels,
+        'workers': workers,
+        'clips': clip_count[0],
+        'seconds': round(seconds, 3),
+        'time_to_first_row': round(first_row[0], 3) if first_row[0] is not None else None,
+        # Время вызова вместе с ожиданием 429 и повторами
+        'request_p50_ms': round(percentile(request_latencies, 50), 2) if request_latencies else None,
+        'request_p95_ms': round(percentile(request_latencies, 95), 2) if request_latencies else None,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный тест поиска клипов на локальном Helix")
+    parser.add_argument('--url', help="адрес уже запущенного fake_helix.py; по умолчанию сервер поднимается здесь")
+    parser.add_argument('--channels', type=int, default=100, help="сколько каналов искать")
+    parser.add_argument('--pages', type=int, default=3, help="страниц клипов на канал")
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=8, help="параллельных запросов")
+    parser.add_argument('--started-at', default='2000-01-01T00:00:00Z')
+    parser.add_argument('--clips-per-channel', type=int, default=1000)
+    parser.add_argument('--latency-ms', type=float, default=30.0)
+    parser.add_argument('--jitter-ms', type=float, default=10.0)
+    parser.add_argument('--inject-429', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=int, default=800, help="запросов в минуту на токен")
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.ERROR,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stderr)]
+    )
+
+    server = None
+    base_url = args.url
+    if not base_url:
+        from fake_helix import FakeHelixServer, Catalog
+        server = FakeHelixServer(
+            ('127.0.0.1', 0),
+            Catalog(args.channels, args.clips_per_channel),
+            latency_ms=args.latency_ms,
+            jitter_ms=args.jitter_ms,
+            inject_429=args.inject_429,
+            error_rate=args.error_rate,
+            rate_limit=args.rate_limit
+        )
+        server.start_background()
+        base_url = server.base_url
+
+    try:
+        # Счётчики сервера сравниваются до и после, так что внешний сервер можно не перезапускать
+        before = server_stats(base_url)
+        report = run_discovery(base_url, args.channels, args.pages, args.page_size, args.workers, args.started_at)
+        after = server_stats(base_url)
+    finally:
+        if server:
+            server.shutdown()
+            server.server_close()
+
+    responses = {key: count - before.get(key, 0) for key, count in after.items() if count - before.get(key, 0)}
+    responses.pop('stats 200', None)
+    requests_total = sum(responses.values())
+    report['requests'] = requests_total
+    report['requests_per_second'] = round(requests_total / report['seconds'], 1) if report['seconds'] else None
+    report['throttled'] = sum(count for key, count in responses.items() if key.endswith(' 429'))
+    report['server_errors'] = sum(count for key, count in responses.items() if key.endswith(' 503'))
+    report['responses'] = responses
+    print(json.dumps(report, ensure_ascii=False))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
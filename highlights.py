@@ -0,0 +1,142 @@
+import heapq
+import logging
+import subprocess
+
+import numpy as np
+
+# Поиск ярких моментов длинного VOD по всплескам громкости.
+# Звук читается из ffmpeg потоком PCM (моно, 8 кГц), окна считаются векторно, в памяти - только
+# текущий блок, скользящая базовая линия и куча лучших отрезков. Видео не декодируется, поэтому
+# 8-часовой VOD обрабатывается за минуты.
+logger = logging.getLogger("TwitchVideoSuite")
+
+SAMPLE_RATE = 8000
+# Минимальная громкость окна, дБFS: тишина не считается всплеском даже на тихом фоне
+SILENCE_DB = -50.0
+
+def media_duration(path):
+    try:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of',
+             'default=noprint_wrappers=1:nokey=1', path],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=True
+        )
+        return float(result.stdout.decode('utf-8').strip())
+    except (subprocess.CalledProcessError, OSError, ValueError) as e:
+        logger.warning(f"Не удалось определить длительность {path}: {e}")
+        return None
+
+def iter_loudness(path, window=0.5, chunk_seconds=60, sample_rate=SAMPLE_RATE):
+    """Громкость (дБFS) окон по window секунд, блоками по chunk_seconds"""
+    window_samples = int(window * sample_rate)
+    chunk_bytes = int(chunk_seconds / window) * window_samples * 2
+    command = [
+        'ffmpeg', '-v', 'error', '-i', path,
+        '-map', '0:a:0', '-vn', '-ac', '1', '-ar', str(sample_rate),
+        '-f', 's16le', '-'
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    remainder = b''
+    try:
+        while True:
+            data = process.stdout.read(chunk_bytes)
+            if not data:
+                break
+            data = remainder + data
+            usable = len(data) - len(data) % (window_samples * 2)
+            remainder = data[usable:]
+            if not usable:
+                continue
+            samples = np.frombuffer(data[:usable], np.int16).astype(np.float32) / 32768.0
+            windows = samples.reshape(-1, window_samples)
+            rms = np.sqrt(np.mean(windows * windows, axis=1))
+            yield 20 * np.log10(rms + 1e-9)
+    finally:
+        process.stdout.close()
+        process.kill()
+        process.wait()
+
+class HighlightDetector:
+    """Отрезки, где громкость заметно выше скользящей базовой линии (z-оценка по EMA).
+
+    Оценка отрезка - сумма z-оценок его окон: учитывает и силу, и длительность всплеска.
+    Хранятся только top_k лучших отрезков.
+    """
+
+    def __init__(self, window=0.5, baseline_seconds=120.0, threshold=2.5, max_gap=3.0, top_k=20,
+                 pre_roll=10.0, post_roll=5.0):
+        self.window = window
+        self.alpha = window / baseline_seconds
+        self.threshold = threshold
+        self.max_gap_windows = int(max_gap / window)
+        self.top_k = top_k
+        self.pre_roll = pre_roll
+        self.post_roll = post_roll
+        self.mean = None
+        self.var = 1.0
+        self.index = 0
+        self.segment = None
+        self.heap = []
+
+    def feed(self, loudness):
+        alpha = self.alpha
+        for db in loudness.tolist():
+            if self.mean is None:
+                self.mean = db
+            deviation = db - self.mean
+            z = deviation / max(self.var ** 0.5, 1.0)
+            if z >= self.threshold and db > SILENCE_DB:
+                if self.segment is None:
+                    self.segment = {'start': self.index, 'last': self.index, 'peak': z, 'peak_index': self.index,
+                                    'score': 0.0}
+                segment = self.segment
+                segment['last'] = self.index
+                if z > segment['peak']:
+                    segment['peak'] = z
+                    segment['peak_index'] = self.index
+                segment['score'] += z
+            elif self.segment is not None and self.index - self.segment['last'] > self.max_gap_windows:
+                self.close_segment()
+            # Базовая линия обновляется и на всплесках, но медленно: длинный громкий участок станет фоном
+            self.mean += alpha * deviation
+            self.var = (1 - alpha) * (self.var + alpha * deviation * deviation)
+            self.index += 1
+
+    def close_segment(self):
+        segment, self.segment = self.segment, None
+        entry = (segment['score'], segment['start'], segment)
+        if len(self.heap) < self.top_k:
+            heapq.heappush(self.heap, entry)
+        elif entry[0] > self.heap[0][0]:
+            heapq.heapreplace(self.heap, entry)
+
+    def results(self, duration=None):
+        if self.segment is not None:
+            self.close_segment()
+        end_limit = duration if duration else self.index * self.window
+        highlights = []
+        for score, _, segment in sorted(self.heap, reverse=True):
+            start = segment['start'] * self.window
+            end = (segment['last'] + 1) * self.window
+            highlights.append({
+                'start': round(max(0.0, start - self.pre_roll), 2),
+                'end': round(min(end_limit, end + self.post_roll), 2),
+                'peak_time': round(segment['peak_index'] * self.window, 2),
+                'peak': round(segment['peak'], 2),
+                'score': round(score, 2),
+            })
+        return highlights
+
+def detect_highlights(path, top_k=20, threshold=2.5, window=0.5, on_progress=None, stop_event=None):
+    """Лучшие моменты VOD по громкости; on_progress(percent) вызывается после каждого блока"""
+    duration = media_duration(path)
+    detector = HighlightDetector(window=window, threshold=threshold, top_k=top_k)
+    for loudness in iter_loudness(path, window=window):
+        if stop_event is not None and stop_event.is_set():
+            break
+        detector.feed(loudness)
+        if on_progress and duration:
+            on_progress(min(100, int(detector.index * window / duration * 100)))
+    return detector.results(duration)
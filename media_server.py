@@ -0,0 +1,173 @@
+import os
+import sys
+import time
+import logging
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, unquote
+
+# Локальная замена CDN клипов для проверки рендера по ссылке без сети.
+#
+#   python media_server.py ./clips --port 8788 --mbps 20 --latency-ms 80
+#   python cli.py render job.json    # "source": "http://127.0.0.1:8788/clip.mp4"
+#
+# Отдаёт файлы папки с поддержкой Range (ffmpeg запрашивает moov в конце файла отдельным диапазоном),
+# ограничивает скорость на соединение и добавляет задержку перед первым байтом, как у настоящего CDN.
+logger = logging.getLogger("TwitchVideoSuite")
+
+CHUNK_SIZE = 64 * 1024
+CONTENT_TYPES = {'.mp4': 'video/mp4', '.mov': 'video/quicktime', '.mkv': 'video/x-matroska', '.ts': 'video/mp2t'}
+
+class MediaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, root, mbps=0.0, latency_ms=0.0):
+        super().__init__(address, MediaHandler)
+        self.root = os.path.abspath(root)
+        # 0 - без ограничения скорости
+        self.bytes_per_second = mbps * 1024 * 1024 / 8
+        self.latency_ms = latency_ms
+        self.stats_lock = threading.Lock()
+        self.stats = {'requests': 0, 'range_requests': 0, 'bytes_sent': 0}
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url_for(self, path):
+        return f"{self.base_url}/{os.path.relpath(os.path.abspath(path), self.root).replace(os.sep, '/')}"
+
+    def count(self, key, value=1):
+        with self.stats_lock:
+            self.stats[key] += value
+
+    def start_background(self):
+        thread = threading.Thread(target=self.serve_forever, name='media-server', daemon=True)
+        thread.start()
+        return thread
+
+class MediaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.debug("media_server: " + format % args)
+
+    def resolve(self):
+        relative = unquote(urlparse(self.path).path).lstrip('/')
+        path = os.path.abspath(os.path.join(self.server.root, relative))
+        if not path.startswith(self.server.root + os.sep) or not os.path.isfile(path):
+            return None
+        return path
+
+    def parse_range(self, size):
+        """(начало, конец) включительно из заголовка Range; None - весь файл, False - диапазон неверен"""
+        header = self.headers.get('Range')
+        if not header or not header.startswith('bytes='):
+            return None
+        start, _, end = header[6:].split(',')[0].strip().partition('-')
+        try:
+            if not start:
+                length = int(end)
+                return (max(0, size - length), size - 1) if length else False
+            start = int(start)
+            end = min(int(end), size - 1) if end else size - 1
+        except ValueError:
+            return False
+        return (start, end) if start <= end and start < size else False
+
+    def send_error_status(self, status):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_HEAD(self):
+        self.handle_file(send_body=False)
+
+    def do_GET(self):
+        self.handle_file(send_body=True)
+
+    def handle_file(self, send_body):
+        server = self.server
+        server.count('requests')
+        path = self.resolve()
+        if path is None:
+            self.send_error_status(404)
+            return
+        size = os.path.getsize(path)
+        byte_range = self.parse_range(size)
+        if byte_range is False:
+            self.send_response(416)
+            self.send_header('Content-Range', f"bytes */{size}")
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        if server.latency_ms:
+            time.sleep(server.latency_ms / 1000)
+        if byte_range is None:
+            start, end = 0, size - 1
+            self.send_response(200)
+        else:
+            start, end = byte_range
+            server.count('range_requests')
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {start}-{end}/{size}")
+        length = end - start + 1
+        self.send_header('Content-Type', CONTENT_TYPES.get(os.path.splitext(path)[1].lower(), 'application/octet-stream'))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(length))
+        self.end_headers()
+        if not send_body:
+            return
+
+        started = time.perf_counter()
+        sent = 0
+        try:
+            with open(path, 'rb') as f:
+                f.seek(start)
+                while sent < length:
+                    data = f.read(min(CHUNK_SIZE, length - sent))
+                    if not data:
+                        break
+                    self.wfile.write(data)
+                    sent += len(data)
+                    if server.bytes_per_second:
+                        # Ограничение скорости: не опережаем расписание отправки
+                        ahead = sent / server.bytes_per_second - (time.perf_counter() - started)
+                        if ahead > 0:
+                            time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            # ffmpeg закрывает соединение, когда перескакивает к другому диапазону
+            pass
+        finally:
+            server.count('bytes_sent', sent)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Локальная замена CDN для рендера по ссылке")
+    parser.add_argument('root', help="папка с видео")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8788)
+    parser.add_argument('--mbps', type=float, default=0.0, help="скорость на соединение, Мбит/с (0 - без ограничения)")
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="задержка перед первым байтом")
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stderr)]
+    )
+    server = MediaServer((args.host, args.port), args.root, mbps=args.mbps, latency_ms=args.latency_ms)
+    logger.info(f"Media server: {server.base_url}/ -> {server.root}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,25 +1,25 @@
 import sys
 import os
-import re
-import requests
 import subprocess
 import cv2
 import numpy as np
 import logging
 import mediapipe as mp
 import math
+import time
+import threading
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QTabWidget, QWidget, QVBoxLayout, QHBoxLayout,
     QLabel, QPushButton, QTableWidget, QTableWidgetItem, QLineEdit, 
     QHeaderView, QMessageBox, QFileDialog, QCheckBox, QFrame, 
-    QProgressBar, QToolBar, QStatusBar, QStyle, QStackedLayout,QGraphicsView, QGraphicsScene, QGraphicsItem
+    QProgressBar, QToolBar, QStatusBar, QStyle, QStackedLayout,QGraphicsView, QGraphicsScene, QGraphicsItem,
+    QSlider, QComboBox, QGraphicsPixmapItem, QSpinBox, QListWidget, QListWidgetItem, QInputDialog
 )
 from PyQt6.QtGui import (
     QColor, QPainter, QPen, QImage, QPixmap, QIcon, 
     QAction, QDesktopServices
 )
-from PyQt6.QtMultimedia import QMediaPlayer, QAudioOutput
-from PyQt6.QtMultimediaWidgets import QVideoWidget, QGraphicsVideoItem
+from PyQt6.QtMultimedia import QMediaPlayer, QAudioOutput, QVideoSink
 from PyQt6.QtCore import Qt, QRect, QPoint, QUrl, QThread, pyqtSignal, QSize, QTimer, QSizeF, QRectF
 from PyQt6.QtGui import QBrush, QColor
 from dotenv import load_dotenv
@@ -41,51 +41,84 @@ CLIENT_ID = os.getenv('CLIENT_ID')
 CLIENT_SECRET = os.getenv('CLIENT_SECRET')
 DEFAULT_CHANNELS = os.getenv('CHANNELS', '')
 
-mp_pose = mp.solutions.pose
-pose = mp_pose.Pose(static_image_mode=True)
-
-def sanitize_filename(name):
-    return re.sub(r'[\\/:"*?<>|]+', '_', name)   
+# Ядро импортируется после загрузки .env, чтобы пути из него учитывались
+import twitch_api
+from clip_ranking import SCORES, TopKRanker, stream_top_clips
+from clip_dedup import mark_duplicates, grouped_order
+from tracing import tracer, TRACE_PATH
+from highlights import detect_highlights
+from scene_cuts import detect_silences, plan_cuts
+from stream_source import is_remote, is_direct_media
+from auto_framing import AutoFramer
+from render_core import (
+    OUTPUT_FORMATS, PROXY_HEIGHT, RENDER_QUEUE_PATH, EASINGS, CONTAINERS,
+    rect_to_list, scale_rect_list, overlay_slot, proxy_path_for, build_proxy,
+    save_layout_preset, load_layout_preset, RectTrack, LayoutEngine, ScrubReader, FrameRingBuffer, Renderer, RenderQueue
+)
 
 class VideoPlayer(QWidget):
+    """Два вида одного видео: исходный 16:9 и вертикальный 9:16.
+
+    Видео декодирует один QMediaPlayer, каждый полученный кадр показывается в обоих видах:
+    вертикальный собирается из того же кадра компоновщиком рендера по регионам раскладки,
+    поэтому виды не расходятся и видео не декодируется дважды.
+    """
+
+    # Высота вертикального вида на экране
+    VERTICAL_HEIGHT = 640
+
     def __init__(self):
         super().__init__()
 
         self.setWindowTitle("Dual Video Player")
         self.resize(1280, 720)
 
-        # Виджеты для вывода видео
-        self.video_widget_main = QVideoWidget()     # 16:9
-        self.video_widget_vertical = QVideoWidget() # 9:16
-
-        # Основной плеер (16:9)
-        self.player_main = QMediaPlayer()
-        self.audio_output_main = QAudioOutput()
-        self.player_main.setAudioOutput(self.audio_output_main)
-        self.player_main.setVideoOutput(self.video_widget_main)
-
-        # Вертикальный плеер (9:16)
-        self.player_vertical = QMediaPlayer()
-        self.player_vertical.setVideoOutput(self.video_widget_vertical)
+        # Раскладка: регионы в координатах rect_space (как в пресете и задаче рендера); None - центр кадра 9:16
+        self.layout_rects = None
+        self.layout_overlays = []
+        self.rect_space = None
+        self.out_size = OUTPUT_FORMATS['9:16']
+        self.layout_engine = None
+        self.layout_key = None
+        self.vertical_buffer = None
+
+        # Виды для вывода видео
+        self.view_main = QLabel()                   # 16:9
+        self.view_main.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.view_main.setMinimumSize(1, 1)
+        self.view_vertical = QLabel()               # 9:16
+        self.view_vertical.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.set_vertical_size()
+
+        # Единственный плеер: звук в аудиовыход, кадры в приёмник, из которого рисуются оба вида
+        self.player = QMediaPlayer()
+        self.audio_output = QAudioOutput()
+        self.player.setAudioOutput(self.audio_output)
+        self.video_sink = QVideoSink()
+        self.video_sink.videoFrameChanged.connect(self.show_frame)
+        self.player.setVideoSink(self.video_sink)
 
         # Кнопки управления
         self.open_button = QPushButton("Открыть видео")
+        self.preset_button = QPushButton("Пресет раскладки")
         self.play_button = QPushButton("▶")
         self.pause_button = QPushButton("⏸")
 
         self.open_button.clicked.connect(self.open_file)
+        self.preset_button.clicked.connect(self.open_preset)
         self.play_button.clicked.connect(self.play_video)
         self.pause_button.clicked.connect(self.pause_video)
 
         # Макеты
         button_layout = QHBoxLayout()
         button_layout.addWidget(self.open_button)
+        button_layout.addWidget(self.preset_button)
         button_layout.addWidget(self.play_button)
         button_layout.addWidget(self.pause_button)
 
         video_layout = QHBoxLayout()
-        video_layout.addWidget(self.video_widget_main)          # основной холст 16:9
-        video_layout.addWidget(self.video_widget_vertical)  # вертикальный предпросмотр 9:16
+        video_layout.addWidget(self.view_main, 1)           # основной холст 16:9
+        video_layout.addWidget(self.view_vertical)          # вертикальный предпросмотр 9:16
 
         layout = QVBoxLayout()
         layout.addLayout(video_layout)
@@ -99,19 +132,93 @@ class VideoPlayer(QWidget):
         if path:
             self.load_video(path)
 
+    def open_preset(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Пресет раскладки", "", "JSON (*.json)")
+        if not path:
+            return
+        try:
+            preset = load_layout_preset(path)
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, "Внимание", f"Не удалось загрузить пресет:\n{e}")
+            return
+        fmt = preset['formats'][0]
+        self.set_layout(fmt['rects'], preset.get('rect_space'), fmt.get('size'), fmt.get('overlays'))
+
+    def set_layout(self, rects, rect_space=None, out_size=None, overlays=None):
+        """Регионы вертикального вида - те же, что в задаче рендера: [x, y, w, h] в координатах rect_space"""
+        self.layout_rects = [list(rect) for rect in rects] if rects else None
+        self.layout_overlays = [dict(overlay) for overlay in (overlays or [])]
+        self.rect_space = rect_space
+        if out_size:
+            self.out_size = tuple(out_size)
+            self.set_vertical_size()
+        self.layout_key = None
+
+    def set_vertical_size(self):
+        out_w, out_h = self.out_size
+        self.view_vertical.setFixedSize(max(1, int(self.VERTICAL_HEIGHT * out_w / out_h)), self.VERTICAL_HEIGHT)
+
     def load_video(self, path):
-        url = QUrl.fromLocalFile(path)
-        self.player_main.setSource(url)
-        self.player_vertical.setSource(url)
+        self.layout_key = None
+        self.player.setSource(QUrl(path) if is_remote(path) else QUrl.fromLocalFile(path))
 
     def play_video(self):
-        self.player_main.play()
-        self.player_vertical.play()
+        self.player.play()
 
     def pause_video(self):
-        self.player_main.pause()
-        self.player_vertical.pause()
-        
+        self.player.pause()
+
+    def layout_regions(self, frame_w, frame_h, view_w, view_h):
+        """Области стека и наложения для вида view_w x view_h"""
+        out_w, out_h = self.out_size
+        if not self.layout_rects:
+            # Без раскладки - центральная полоса на всю высоту с пропорциями выходного кадра
+            crop_w = min(frame_w, int(frame_h * out_w / out_h))
+            return [[(frame_w - crop_w) // 2, 0, crop_w, frame_h]], []
+        scale_x = scale_y = 1.0
+        if self.rect_space:
+            # Регионы пересчитываются в размер кадра так же, как в Renderer
+            scale_x = frame_w / self.rect_space[0]
+            scale_y = frame_h / self.rect_space[1]
+        rects = [scale_rect_list(rect, scale_x, scale_y) for rect in self.layout_rects]
+        # Слоты наложений заданы в выходном кадре рендера - переводим в размер вида
+        overlays = [
+            {
+                'src': scale_rect_list(overlay['src'], scale_x, scale_y),
+                'dst': scale_rect_list(overlay['dst'], view_w / out_w, view_h / out_h),
+            }
+            for overlay in self.layout_overlays
+        ]
+        return rects, overlays
+
+    def show_frame(self, video_frame):
+        if not video_frame.isValid():
+            return
+        image = video_frame.toImage().convertToFormat(QImage.Format.Format_BGR888)
+        if image.isNull():
+            return
+        w, h = image.width(), image.height()
+
+        main_w, main_h = self.view_main.width(), self.view_main.height()
+        self.view_main.setPixmap(QPixmap.fromImage(image).scaled(
+            main_w, main_h, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.FastTransformation))
+
+        # Кадр как массив BGR без копирования; строки QImage выровнены, поэтому лишние байты отрезаются
+        bits = image.constBits()
+        bits.setsize(image.sizeInBytes())
+        frame = np.frombuffer(bits, np.uint8).reshape(h, image.bytesPerLine())[:, :w * 3].reshape(h, w, 3)
+
+        view_w, view_h = self.view_vertical.width(), self.view_vertical.height()
+        layout_key = (w, h, view_w, view_h)
+        if layout_key != self.layout_key:
+            rects, overlays = self.layout_regions(w, h, view_w, view_h)
+            self.layout_engine = LayoutEngine.stacked(rects, (view_w, view_h), overlays=overlays)
+            self.vertical_buffer = np.empty((view_h, view_w, 3), np.uint8)
+            self.layout_key = layout_key
+        vertical = self.layout_engine.compose(frame, out=self.vertical_buffer)
+        qimg = QImage(vertical.data, view_w, view_h, view_w * 3, QImage.Format.Format_BGR888)
+        self.view_vertical.setPixmap(QPixmap.fromImage(qimg))
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -154,10 +261,12 @@ class MainWindow(QMainWindow):
         
         # Добавляем вкладки
         self.clip_finder_tab = TwitchClipFinderTab()
-        self.video_editor_tab = VideoEditorTab()
+        self.render_queue_tab = RenderQueueTab()
+        self.video_editor_tab = VideoEditorTab(self.render_queue_tab)
         
         self.tabs.addTab(self.clip_finder_tab, "Twitch Clip Finder")
         self.tabs.addTab(self.video_editor_tab, "Video Editor")
+        self.tabs.addTab(self.render_queue_tab, "Render Queue")
         
         self.setCentralWidget(self.tabs)
         
@@ -189,6 +298,15 @@ class MainWindow(QMainWindow):
         
         self.addToolBar(toolbar)
     
+    def closeEvent(self, event):
+        # Все потоки вкладок останавливаются и дожидаются: QThread, удалённый на ходу, роняет приложение
+        self.clip_finder_tab.shutdown()
+        self.video_editor_tab.shutdown()
+        self.render_queue_tab.shutdown()
+        if TRACE_PATH:
+            tracer.export_chrome(TRACE_PATH)
+        event.accept()
+
     def show_about(self):
         QMessageBox.about(self, "About Twitch Video Suite", 
                          "Twitch Video Suite v1.0\n\n"
@@ -254,9 +372,60 @@ class MainWindow(QMainWindow):
         return None        
 
 
+class ClipFetchThread(QThread):
+    """Поиск клипов вне потока интерфейса: топ обновляется по мере прихода страниц Helix"""
+    ranking_update = pyqtSignal(list)
+    # Интервал обновления таблицы, секунд
+    UPDATE_INTERVAL = 0.2
+
+    def __init__(self, channels, headers, top_k, score):
+        super().__init__()
+        self.channels = channels
+        self.headers = headers
+        self.ranker = TopKRanker(top_k, score)
+        self.stop_event = threading.Event()
+        self.last_update = 0.0
+        self.pages = 0
+
+    def on_page(self, channel, changed):
+        self.pages += 1
+        now = time.monotonic()
+        if changed and now - self.last_update >= self.UPDATE_INTERVAL:
+            self.last_update = now
+            self.ranking_update.emit(self.ranker.top())
+
+    def run(self):
+        top = stream_top_clips(self.channels, self.headers, self.ranker, on_page=self.on_page, stop_event=self.stop_event)
+        self.ranking_update.emit(top)
+
+    def stop(self):
+        self.stop_event.set()
+
+class ClipDedupThread(QThread):
+    """Хеширует миниатюры найденных клипов и группирует почти одинаковые"""
+    dedup_ready = pyqtSignal(list)
+
+    def __init__(self, clips):
+        super().__init__()
+        self.clips = [dict(clip) for clip in clips]
+        self.stop_event = threading.Event()
+
+    def run(self):
+        clips = grouped_order(mark_duplicates(self.clips, stop_event=self.stop_event))
+        if not self.stop_event.is_set():
+            self.dedup_ready.emit(clips)
+
+    def stop(self):
+        self.stop_event.set()
+
 class TwitchClipFinderTab(QWidget):
     def __init__(self):
         super().__init__()
+        self.fetch_thread = None
+        # Остановленные поиски живут до завершения потока, иначе QThread удалится на ходу
+        self.fetch_threads = set()
+        # Номер текущего поиска: результаты поиска дубликатов от прежних поисков отбрасываются
+        self.search_generation = 0
         self.setup_ui()
         self.setup_vlc()
     
@@ -279,6 +448,17 @@ class TwitchClipFinderTab(QWidget):
         self.input.setPlaceholderText("Enter channels separated by commas (e.g. shroud,xqc,pokimane)")
         self.input.setText(DEFAULT_CHANNELS)
         search_layout.addWidget(self.input)
+
+        # Топ-K по всем каналам: скорость просмотров, просмотры с затуханием или просто просмотры
+        search_layout.addWidget(QLabel("Top:"))
+        self.top_spin = QSpinBox()
+        self.top_spin.setRange(1, 1000)
+        self.top_spin.setValue(50)
+        search_layout.addWidget(self.top_spin)
+
+        self.score_combo = QComboBox()
+        self.score_combo.addItems(SCORES)
+        search_layout.addWidget(self.score_combo)
         
         self.search_btn = QPushButton("Find Clips")
         self.search_btn.setIcon(QIcon.fromTheme("edit-find"))
@@ -299,10 +479,10 @@ class TwitchClipFinderTab(QWidget):
         layout.addWidget(self.download_btn)
         
         # Таблица с клипами
-        self.table = QTableWidget(0, 7)
+        self.table = QTableWidget(0, 9)
         self.table.setHorizontalHeaderLabels([
             "Select", "Channel", "Title", "Views", 
-            "URL", "Download", "Preview"
+            "URL", "Download", "Preview", "Score", "Duplicate of"
         ])
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
         self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
@@ -324,65 +504,87 @@ class TwitchClipFinderTab(QWidget):
             print("HWND:", int(self.video_frame.winId()))
 
     def get_access_token(self):
-        url = 'https://id.twitch.tv/oauth2/token'
-        params = {
-            'client_id': CLIENT_ID,
-            'client_secret': CLIENT_SECRET,
-            'grant_type': 'client_credentials'
-        }
-        response = requests.post(url, params=params).json()
-        return response['access_token']
+        return twitch_api.get_access_token(CLIENT_ID, CLIENT_SECRET)
 
     def get_user_id(self, username, headers):
-        url = f'https://api.twitch.tv/helix/users'
-        params = {'login': username}
-        response = requests.get(url, headers=headers, params=params).json()
-        return response['data'][0]['id'] if response['data'] else None
+        return twitch_api.get_user_id(username, headers)
 
     def get_clips(self, user_id, headers):
-        url = f'https://api.twitch.tv/helix/clips'
-        params = {
-            'broadcaster_id': user_id,
-            'first': 20,
-            'started_at': '2024-01-01T00:00:00Z',
-        }
-        response = requests.get(url, headers=headers, params=params).json()
-        return response['data']
+        return twitch_api.get_clips(user_id, headers)
 
     def fetch_clips(self):
-        self.table.setRowCount(0)
-        self.status_label.setText("Загрузка...")
-        QApplication.processEvents()
-
-        headers = {
-            'Client-ID': CLIENT_ID,
-            'Authorization': f'Bearer {self.token}'
-        }
-
         channels = [c.strip() for c in self.input.text().split(',') if c.strip()]
         if not channels:
             QMessageBox.warning(self, "Ошибка", "Введите хотя бы один канал.")
             return
 
-        all_clips = []
+        # Новый поиск заменяет текущий (и его поиск дубликатов), их результаты больше не показываются
+        for thread in self.fetch_threads:
+            thread.stop()
+        self.search_generation += 1
 
-        for channel in channels:
-            user_id = self.get_user_id(channel, headers)
-            if not user_id:
-                continue
-            clips = self.get_clips(user_id, headers)
-            for clip in clips:
-                clip['channel'] = channel
-                all_clips.append(clip)
+        self.table.setRowCount(0)
+        self.status_label.setText("Загрузка...")
 
-        sorted_clips = sorted(all_clips, key=lambda x: x['view_count'], reverse=True)
+        headers = twitch_api.helix_headers(CLIENT_ID, self.token)
+        thread = ClipFetchThread(channels, headers, self.top_spin.value(), self.score_combo.currentText())
+        thread.ranking_update.connect(lambda clips, thread=thread: self.show_clips(clips) if thread is self.fetch_thread else None)
+        thread.finished.connect(lambda thread=thread: self.fetch_finished(thread))
+        self.fetch_thread = thread
+        self.fetch_threads.add(thread)
+        thread.start()
+
+    def shutdown(self):
+        """Останавливает поиск клипов и дубликатов при закрытии приложения"""
+        threads = list(self.fetch_threads)
+        for thread in threads:
+            thread.stop()
+        for thread in threads:
+            thread.wait()
+
+    def fetch_finished(self, thread):
+        self.fetch_threads.discard(thread)
+        if thread is self.fetch_thread:
+            self.fetch_thread = None
+            self.status_label.setText(f"Найдено клипов: {self.table.rowCount()} (страниц Helix: {thread.pages}), поиск дубликатов...")
+            dedup = ClipDedupThread(thread.ranker.top())
+            dedup.dedup_ready.connect(
+                lambda clips, dedup=dedup, generation=self.search_generation: self.dedup_finished(dedup, clips, generation)
+            )
+            self.fetch_threads.add(dedup)
+            dedup.start()
+
+    def dedup_finished(self, dedup, clips, generation):
+        dedup.wait()
+        self.fetch_threads.discard(dedup)
+        # Пока шёл поиск дубликатов, мог начаться новый поиск клипов (в том числе уже завершённый)
+        if generation != self.search_generation:
+            return
+        self.show_clips(clips)
+        duplicates = sum(1 for clip in clips if clip.get('duplicate_of'))
+        self.status_label.setText(f"Найдено клипов: {len(clips)}, из них почти одинаковых: {duplicates}")
 
+    def checked_clip_ids(self):
+        checked = set()
+        for row in range(self.table.rowCount()):
+            checkbox_widget = self.table.cellWidget(row, 0)
+            checkbox = checkbox_widget.findChild(QCheckBox) if checkbox_widget else None
+            url_item = self.table.item(row, 4)
+            if checkbox and checkbox.isChecked() and url_item:
+                checked.add(url_item.data(Qt.ItemDataRole.UserRole))
+        return checked
+
+    def show_clips(self, sorted_clips):
+        # Таблица перестраивается при каждом обновлении топа; отметки переносятся по id клипа
+        checked = self.checked_clip_ids()
+        self.table.setRowCount(0)
         for clip in sorted_clips:
             row_pos = self.table.rowCount()
             self.table.insertRow(row_pos)
 
             # NEW: Добавляем чекбокс в первый столбец
             checkbox = QCheckBox()
+            checkbox.setChecked(clip['id'] in checked)
             checkbox_widget = QWidget()
             layout_cb = QHBoxLayout(checkbox_widget)
             layout_cb.addWidget(checkbox)
@@ -396,6 +598,7 @@ class TwitchClipFinderTab(QWidget):
             self.table.setItem(row_pos, 3, QTableWidgetItem(str(clip['view_count'])))
             url_item = QTableWidgetItem(clip['url'])
             url_item.setForeground(QColor('cyan'))
+            url_item.setData(Qt.ItemDataRole.UserRole, clip['id'])
             self.table.setItem(row_pos, 4, url_item)
 
             preview_button = QPushButton("▶️")
@@ -408,16 +611,26 @@ class TwitchClipFinderTab(QWidget):
                        self.download_clip(url, {"channel": ch, "title": title}))
 
             self.table.setCellWidget(row_pos, 5, button)
+            self.table.setItem(row_pos, 7, QTableWidgetItem(str(clip['score'])))
+
+            # Дубликат показывается под основным клипом группы и не скачивается массово
+            if clip.get('duplicate_of'):
+                self.table.setItem(row_pos, 8, QTableWidgetItem(clip['duplicate_of']))
+                for column in (1, 2, 3):
+                    self.table.item(row_pos, column).setForeground(QColor('gray'))
 
-        self.status_label.setText(f"Найдено клипов: {len(sorted_clips)}")      
+        self.status_label.setText(f"Лучшие клипы: {len(sorted_clips)}, поиск продолжается...")
     
     def download_selected_clips(self):
         selected_clips = []
+        skipped = 0
         for row in range(self.table.rowCount()):
             checkbox_widget = self.table.cellWidget(row, 0)
             if checkbox_widget:
                 checkbox = checkbox_widget.findChild(QCheckBox)
-                if checkbox and checkbox.isChecked():
+                if checkbox and checkbox.isChecked() and self.table.item(row, 8):
+                    skipped += 1
+                elif checkbox and checkbox.isChecked():
                     url_item = self.table.item(row, 4)
                     channel_item = self.table.item(row, 1)
                     title_item = self.table.item(row, 2)
@@ -428,6 +641,8 @@ class TwitchClipFinderTab(QWidget):
                             'title': title_item.text()
                         })
 
+        if skipped:
+            logger.info(f"Пропущено почти одинаковых клипов: {skipped}")
         if not selected_clips:
             QMessageBox.information(self, "Информация", "Не выбраны клипы для скачивания.")
             return
@@ -442,10 +657,8 @@ class TwitchClipFinderTab(QWidget):
         errors = []
         for clip in selected_clips:
             try:
-                filename = f"{clip['channel']} - {clip['title']}.mp4"
-                filename = sanitize_filename(filename)
-                save_path = os.path.join(save_dir, filename)
-                subprocess.run(["yt-dlp", "-o", save_path, clip['url']], check=True)
+                save_path = os.path.join(save_dir, twitch_api.clip_filename(clip))
+                twitch_api.download_clip(clip['url'], save_path)
             except subprocess.CalledProcessError:
                 errors.append(clip['url'])
 
@@ -462,14 +675,7 @@ class TwitchClipFinderTab(QWidget):
             self.status_label.setText("Получение прямой ссылки...")
             QApplication.processEvents()
 
-            result = subprocess.run(
-                ["yt-dlp", "-f", "mp4", "-g", clip_url],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                check=True
-            )
-            direct_url = result.stdout.strip()
+            direct_url = twitch_api.resolve_direct_url(clip_url)
             print("Direct URL:", direct_url)
 
             # Открываем отдельное окно предпросмотра
@@ -499,7 +705,7 @@ class TwitchClipFinderTab(QWidget):
                 save_path += ".mp4"
 
             # Скачиваем с помощью yt-dlp
-            subprocess.run(["yt-dlp", "-o", save_path, clip_url], check=True)
+            twitch_api.download_clip(clip_url, save_path)
             QMessageBox.information(self, "Готово", "Клип успешно скачан.")
         except subprocess.CalledProcessError as e:
             QMessageBox.critical(self, "Ошибка", f"Не удалось скачать клип:\n{e}")
@@ -542,16 +748,123 @@ class PreviewWindow(QWidget):
         self.mediaplayer.stop()
         event.accept()
         
+class FrameDecoderThread(QThread):
+    """Единственный декодер редактора: читает кадры с заданной позиции в кольцевой буфер"""
+
+    def __init__(self, video_path, start_frame, buffer):
+        super().__init__()
+        self.video_path = video_path
+        self.start_frame = start_frame
+        self.buffer = buffer
+        self.running = True
+        self.eof = False
+
+    def run(self):
+        cap = cv2.VideoCapture(self.video_path)
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        if self.start_frame > 0:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, self.start_frame)
+
+        frame_number = self.start_frame
+        while self.running:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            pts = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            # Не все контейнеры отдают pts, тогда считаем его по номеру кадра
+            if pts <= 0 and frame_number > 0:
+                pts = frame_number / fps
+            if not self.buffer.put((frame_number, pts, frame)):
+                break
+            frame_number += 1
+
+        cap.release()
+        self.eof = True
+
+    def stop(self):
+        self.running = False
+        self.buffer.close()
+
+class HighlightThread(QThread):
+    """Ищет яркие моменты VOD по громкости звука, видео не декодируется"""
+    progress_update = pyqtSignal(int)
+    highlights_ready = pyqtSignal(list)
+
+    def __init__(self, video_path):
+        super().__init__()
+        self.video_path = video_path
+        self.stop_event = threading.Event()
+
+    def run(self):
+        try:
+            highlights = detect_highlights(self.video_path, on_progress=self.progress_update.emit,
+                                           stop_event=self.stop_event)
+        except Exception as e:
+            logger.error(f"Ошибка поиска ярких моментов: {e}")
+            highlights = []
+        self.highlights_ready.emit(highlights)
+
+    def stop(self):
+        self.stop_event.set()
+
+class ProxyBuildThread(QThread):
+    proxy_ready = pyqtSignal(str, str)
+
+    def __init__(self, video_path, proxy_path):
+        super().__init__()
+        self.video_path = video_path
+        self.proxy_path = proxy_path
+        self.stop_event = threading.Event()
+
+    def run(self):
+        if build_proxy(self.video_path, self.proxy_path, stop_event=self.stop_event):
+            self.proxy_ready.emit(self.video_path, self.proxy_path)
+
+    def stop(self):
+        self.stop_event.set()
+
 class VideoEditorTab(QWidget):
-    def __init__(self):
+    # Цвета областей: лицо, игра, чат, вебкамера
+    REGION_COLORS = [(0, 255, 0), (255, 0, 0), (0, 160, 255), (255, 200, 0)]
+
+    def __init__(self, queue_tab=None):
         super().__init__()
         self.video_path = None
+        # Идентификатор клипа Helix, если видео открыто по ссылке на клип; попадает в задачи рендера
+        self.clip_id = None
         self.cap = None
         self.frame = None
         self.save_folder = None
-        self.cutting_thread = None
+        # Редактор только создаёт задачи, рендер выполняет очередь
+        self.queue_tab = queue_tab
         self.frame_for_display = None
+        self.media_player = None
+        self.decoder = None
+        self.ring_buffer = None
+        self.scrub_reader = None
+        self.pending_seek = None
+        # Редактор воспроизводит прокси, когда оно готово; рендер всегда идёт по оригиналу
+        self.playback_path = None
+        self.proxy_threads = []
+        # Буферы холста и предпросмотра переиспользуются между кадрами
+        self.canvas_buffer = None
+        self.preview_engine = None
+        self.preview_buffer = None
+        self.preview_key = None
+        self.preview_frame = None
+        self.highlight_thread = None
+        self.highlight_threads = []
+        self.clock_origin = None
+        # Автокадрирование зелёной области при воспроизведении; создаётся при включении
+        self.auto_framer = None
+        self.auto_frame_aspect = None
         self.playing = False
+        self.fps = 30.0
+        self.frame_count = 0
+        # Ключевые кадры для каждой области: [время, [x, y, w, h], сглаживание] в координатах кадра
+        self.keyframes = [[], []]
+        # Для каждой области: False - часть вертикального стека, True - наложение поверх стека
+        self.region_overlay = [False, False]
         self.timer = QTimer()
         self.timer.timeout.connect(self.update_frame)
         
@@ -577,6 +890,12 @@ class VideoEditorTab(QWidget):
         self.load_btn.clicked.connect(self.load_video)
         tool_panel.addWidget(self.load_btn)
 
+        # Клип по ссылке открывается и рендерится без предварительного скачивания
+        self.url_btn = QPushButton("Open URL")
+        self.url_btn.setIcon(QIcon.fromTheme("network-workgroup"))
+        self.url_btn.clicked.connect(self.load_url)
+        tool_panel.addWidget(self.url_btn)
+
         self.save_btn = QPushButton("Set Output")
         self.save_btn.setIcon(QIcon.fromTheme("folder"))
         self.save_btn.clicked.connect(self.selectSaveFolder)
@@ -589,6 +908,17 @@ class VideoEditorTab(QWidget):
         self.play_btn.setEnabled(False)
         tool_panel.addWidget(self.play_btn)
 
+        # Дополнительные области: чат, вебкамера и т.п.
+        self.add_region_btn = QPushButton("Add Region")
+        self.add_region_btn.clicked.connect(self.add_region)
+        tool_panel.addWidget(self.add_region_btn)
+
+        # Выделенная область накладывается поверх стека в углу кадра, а не занимает в нём полосу
+        self.overlay_check = QCheckBox("Overlay")
+        self.overlay_check.setEnabled(False)
+        self.overlay_check.toggled.connect(self.toggle_overlay)
+        tool_panel.addWidget(self.overlay_check)
+
         left_panel.addLayout(tool_panel)
 
         # Основной холст для видео 16:9
@@ -597,11 +927,10 @@ class VideoEditorTab(QWidget):
         self.canvas_view.setFixedSize(960, 540)  # 16:9
         self.canvas_view.setStyleSheet("background-color: black;")
 
-        # Видеоэлемент
-        self.video_item = QGraphicsVideoItem()
-        self.video_item.setPos(0, 0)
-        self.video_item.setSize(QSizeF(960, 540))
-        self.scene.addItem(self.video_item)
+        # Кадры на холст выводятся из общего декодера, а не отдельным видеоплеером
+        self.frame_item = QGraphicsPixmapItem()
+        self.frame_item.setPos(0, 0)
+        self.scene.addItem(self.frame_item)
 
         # Прямоугольники для выделения областей
         self.area1_item = self.scene.addRect(
@@ -620,29 +949,75 @@ class VideoEditorTab(QWidget):
         self.area1_item.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsSelectable)
         self.area2_item.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsMovable)
         self.area2_item.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsSelectable)
+        self.area_items = [self.area1_item, self.area2_item]
 
         left_panel.addWidget(self.canvas_view)
 
+        # Таймлайн и ключевые кадры анимации областей
+        timeline_panel = QHBoxLayout()
+        self.timeline = QSlider(Qt.Orientation.Horizontal)
+        self.timeline.setEnabled(False)
+        self.timeline.valueChanged.connect(self.seek_to_frame)
+        timeline_panel.addWidget(self.timeline)
+
+        self.time_label = QLabel("0.00 s")
+        timeline_panel.addWidget(self.time_label)
+
+        self.easing_combo = QComboBox()
+        self.easing_combo.addItems(list(EASINGS))
+        timeline_panel.addWidget(self.easing_combo)
+
+        self.keyframe_btn = QPushButton("Add Keyframe")
+        self.keyframe_btn.clicked.connect(self.add_keyframe)
+        self.keyframe_btn.setEnabled(False)
+        timeline_panel.addWidget(self.keyframe_btn)
+
+        self.clear_keyframes_btn = QPushButton("Clear Keyframes")
+        self.clear_keyframes_btn.clicked.connect(self.clear_keyframes)
+        timeline_panel.addWidget(self.clear_keyframes_btn)
+
+        self.auto_frame_check = QCheckBox("Auto-frame")
+        self.auto_frame_check.toggled.connect(self.toggle_auto_frame)
+        timeline_panel.addWidget(self.auto_frame_check)
+        self.auto_frame_label = QLabel("")
+        timeline_panel.addWidget(self.auto_frame_label)
+
+        left_panel.addLayout(timeline_panel)
+
         # Панель управления обработкой
         control_panel = QHBoxLayout()
-        self.start_btn = QPushButton("Start Processing")
+        self.start_btn = QPushButton("Add to Queue")
         self.start_btn.setIcon(QIcon.fromTheme("media-playback-start"))
         self.start_btn.clicked.connect(self.startCutting)
         self.start_btn.setEnabled(False)
         control_panel.addWidget(self.start_btn)
 
-        self.stop_btn = QPushButton("Stop")
-        self.stop_btn.setIcon(QIcon.fromTheme("media-playback-stop"))
-        self.stop_btn.clicked.connect(self.stopCutting)
-        self.stop_btn.setEnabled(False)
-        control_panel.addWidget(self.stop_btn)
+        control_panel.addWidget(QLabel("Priority:"))
+        self.priority_spin = QSpinBox()
+        self.priority_spin.setRange(-10, 10)
+        control_panel.addWidget(self.priority_spin)
+
+        # faststart и fragmented начинают воспроизводиться и загружаться сразу, hls можно смотреть во время рендера
+        control_panel.addWidget(QLabel("Container:"))
+        self.container_combo = QComboBox()
+        self.container_combo.addItems(list(CONTAINERS))
+        control_panel.addWidget(self.container_combo)
+
+        # Форматы вывода рендерятся за один проход декодирования
+        self.format_checks = {}
+        for name in OUTPUT_FORMATS:
+            check = QCheckBox(name)
+            check.setChecked(name == '9:16')
+            control_panel.addWidget(check)
+            self.format_checks[name] = check
+
+        self.preset_btn = QPushButton("Save Preset")
+        self.preset_btn.clicked.connect(self.save_preset)
+        self.preset_btn.setEnabled(False)
+        control_panel.addWidget(self.preset_btn)
 
         left_panel.addLayout(control_panel)
 
-        # Прогресс бар
-        self.progress = QProgressBar()
-        left_panel.addWidget(self.progress)
-
         # Правая панель - предпросмотр 9:16
         right_panel = QVBoxLayout()
         right_panel.setSpacing(10)
@@ -656,6 +1031,22 @@ class VideoEditorTab(QWidget):
         self.preview_canvas.setStyleSheet("background-color: black;")
         right_panel.addWidget(self.preview_canvas)
 
+        # Яркие моменты VOD: клик переходит к моменту, отмеченный можно поставить в очередь рендера
+        highlight_controls = QHBoxLayout()
+        self.highlight_btn = QPushButton("Find Highlights")
+        self.highlight_btn.clicked.connect(self.find_highlights)
+        self.highlight_btn.setEnabled(False)
+        highlight_controls.addWidget(self.highlight_btn)
+        self.queue_highlight_btn = QPushButton("Queue Highlight")
+        self.queue_highlight_btn.clicked.connect(self.queue_highlight)
+        self.queue_highlight_btn.setEnabled(False)
+        highlight_controls.addWidget(self.queue_highlight_btn)
+        right_panel.addLayout(highlight_controls)
+
+        self.highlight_list = QListWidget()
+        self.highlight_list.itemClicked.connect(self.jump_to_highlight)
+        right_panel.addWidget(self.highlight_list)
+
         # Добавляем панели в основной макет
         main_layout.addLayout(left_panel, 70)  # 70% ширины
         main_layout.addLayout(right_panel, 30)  # 30% ширины
@@ -663,6 +1054,9 @@ class VideoEditorTab(QWidget):
 
         # Подключаем сигналы изменения прямоугольников
         self.scene.selectionChanged.connect(self.update_preview)
+        self.scene.selectionChanged.connect(self.sync_overlay_check)
+        # Перемещение и изменение размера областей; лишние вызовы отсекает проверка в update_preview
+        self.scene.changed.connect(lambda _: self.update_preview())
 
     def detect_face_area(self, frame):
         mp_face = mp.solutions.face_detection
@@ -686,16 +1080,38 @@ class VideoEditorTab(QWidget):
         )
         if not path:
             return
-            
+        self.open_source(path)
+
+    def load_url(self):
+        url, ok = QInputDialog.getText(self, "Открыть по ссылке", "Ссылка на клип или прямая ссылка на видео:")
+        url = url.strip()
+        if not ok or not url:
+            return
+        if not is_remote(url):
+            QMessageBox.warning(self, "Внимание", "Нужна ссылка http:// или https://")
+            return
+        clip_id = None
+        if not is_direct_media(url):
+            clip_id = twitch_api.clip_id_from_url(url)
+            try:
+                url = twitch_api.resolve_direct_url(url)
+            except subprocess.CalledProcessError as e:
+                QMessageBox.critical(self, "Ошибка", f"Не удалось получить ссылку на видео:\n{e.stderr}")
+                return
+        self.open_source(url, clip_id)
+
+    def open_source(self, path, clip_id=None):
         self.video_path = path
+        self.clip_id = clip_id
+        self.playback_path = path
         self.cap = cv2.VideoCapture(path)
         
-        # Устанавливаем видео в QMediaPlayer
+        # QMediaPlayer воспроизводит только звук, видео декодирует FrameDecoderThread
+        self.stop_playback()
         self.media_player = QMediaPlayer()
         self.audio_output = QAudioOutput()
         self.media_player.setAudioOutput(self.audio_output)
-        self.media_player.setVideoOutput(self.video_item)
-        self.media_player.setSource(QUrl.fromLocalFile(path))
+        self.media_player.setSource(QUrl(path) if is_remote(path) else QUrl.fromLocalFile(path))
         
         # Получаем первый кадр для обработки
         ret, frame = self.cap.read()
@@ -703,14 +1119,38 @@ class VideoEditorTab(QWidget):
             QMessageBox.critical(self, "Ошибка", "Не удалось прочитать видео")
             return
             
+        if self.frame is None or self.frame.shape != frame.shape:
+            # Буфер и план компоновки предпросмотра рассчитаны на размер кадра прежнего видео
+            self.preview_engine = None
+            self.preview_buffer = None
+            self.preview_key = None
+            self.preview_frame = None
         self.frame = frame
         self.show_frame_on_canvas(frame)
+
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if self.scrub_reader:
+            self.scrub_reader.close()
+        self.scrub_reader = ScrubReader(path, self.fps, self.frame_count, cap=self.cap)
+        self.scrub_reader.cache.put(0, frame)
+        self.keyframes = [[] for _ in self.area_items]
+        self.timeline.blockSignals(True)
+        self.timeline.setRange(0, max(0, self.frame_count - 1))
+        self.timeline.setValue(0)
+        self.timeline.blockSignals(False)
+        self.timeline.setEnabled(True)
+        self.keyframe_btn.setEnabled(True)
         
         # Автоматически определяем положение лица
         face_rect = self.detect_face_area(frame)
         if face_rect:
-            x, y, w, h = face_rect
-            self.area1_item.setRect(QRectF(x, y, w, h))
+            self.set_frame_rect(self.area1_item, face_rect)
+        if self.auto_framer:
+            self.auto_framer.close()
+            self.auto_framer = None
+        if self.auto_frame_check.isChecked():
+            self.toggle_auto_frame(True)
             
         # Устанавливаем красную область по центру
         self.set_red_area_center()
@@ -718,40 +1158,239 @@ class VideoEditorTab(QWidget):
         self.save_btn.setEnabled(True)
         self.play_btn.setEnabled(True)
         self.start_btn.setEnabled(True)
-        self.progress.setValue(0)
+        self.preset_btn.setEnabled(True)
+        self.highlight_btn.setEnabled(True)
+        self.reset_highlights()
+
+        self.start_proxy(path, frame.shape[0])
+
+    def start_proxy(self, path, frame_height):
+        # Для потока прокси означал бы полное скачивание, которого открытие по ссылке и избегает
+        if frame_height <= PROXY_HEIGHT or is_remote(path):
+            return
+        proxy_path = proxy_path_for(path)
+        if os.path.exists(proxy_path):
+            self.use_proxy(path, proxy_path)
+            return
+        # Потоки держим до завершения, даже если пользователь уже открыл другое видео
+        self.proxy_threads = [thread for thread in self.proxy_threads if thread.isRunning()]
+        thread = ProxyBuildThread(path, proxy_path)
+        thread.proxy_ready.connect(self.use_proxy)
+        self.proxy_threads.append(thread)
+        thread.start()
+
+    def use_proxy(self, source_path, proxy_path):
+        if source_path != self.video_path:
+            return
+        cap = cv2.VideoCapture(proxy_path)
+        if not cap.isOpened():
+            logger.warning(f"Не удалось открыть прокси: {proxy_path}")
+            return
+
+        was_playing = self.playing
+        self.stop_playback()
+        frame_number = self.timeline.value()
+        proxy_w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        proxy_h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+        # Ключевые кадры хранятся в координатах текущего кадра - переводим в координаты прокси
+        frame_h, frame_w = self.frame.shape[:2]
+        for keyframes in self.keyframes:
+            for keyframe in keyframes:
+                keyframe[1] = scale_rect_list(keyframe[1], proxy_w / frame_w, proxy_h / frame_h)
+
+        self.scrub_reader.close()
+        self.cap.release()
+        self.cap = cap
+        self.scrub_reader = ScrubReader(proxy_path, self.fps, self.frame_count, cap=cap)
+        self.playback_path = proxy_path
+        if self.auto_framer:
+            self.auto_framer.reset()
+        logger.info(f"Редактор переключён на прокси: {proxy_path}")
+
+        frame = self.scrub_reader.get(frame_number)
+        if frame is not None:
+            self.frame = frame
+            self.show_frame_on_canvas(frame)
+            self.update_preview()
+        if was_playing:
+            self.toggle_playback()
         
     def toggle_playback(self):
         if not self.playing:
+            start_frame = self.timeline.value()
+            self.ring_buffer = FrameRingBuffer()
+            self.decoder = FrameDecoderThread(self.playback_path, start_frame, self.ring_buffer)
+            self.decoder.start()
+            # Часы воспроизведения привязываются к pts первого полученного кадра
+            self.clock_origin = None
+            self.media_player.setPosition(int(start_frame * 1000 / self.fps))
             self.media_player.play()
-            self.timer.start(30)  # обновление каждые 30 мс
+            # Таймер опрашивает буфер с удвоенной частотой кадров исходника
+            self.timer.start(max(1, int(500 / self.fps)))
             self.play_btn.setText("⏸")
             self.playing = True
         else:
+            self.stop_playback()
+
+    def stop_playback(self):
+        self.timer.stop()
+        if self.decoder:
+            self.decoder.stop()
+            self.decoder.wait()
+            self.decoder = None
+        self.ring_buffer = None
+        self.pending_seek = None
+        if self.media_player:
             self.media_player.pause()
-            self.timer.stop()
-            self.play_btn.setText("▶")
-            self.playing = False
+        self.play_btn.setText("▶")
+        self.playing = False
 
     def update_frame(self):
-        if self.cap:
-            ret, frame = self.cap.read()
-            if ret:
-                self.frame = frame
-                self.show_frame_on_canvas(frame)
-                self.update_preview()
-            else:
+        if self.ring_buffer is None:
+            return
+
+        if self.clock_origin is None:
+            first = self.ring_buffer.peek()
+            if first is None:
+                return
+            self.clock_origin = (time.perf_counter(), first[1])
+
+        wall_start, pts_start = self.clock_origin
+        item = self.ring_buffer.pop_due(pts_start + time.perf_counter() - wall_start)
+        if item is None:
+            if self.decoder.eof and not len(self.ring_buffer):
                 # Достигнут конец видео
-                self.timer.stop()
-                self.play_btn.setText("▶")
-                self.playing = False
-                self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)  # Перемотка в начало
+                self.stop_playback()
+                self.set_timeline_position(0)
+            return
+
+        frame_number, _, frame = item
+        self.frame = frame
+        self.show_frame_on_canvas(frame)
+        self.set_timeline_position(frame_number)
+        self.apply_keyframes(frame_number / self.fps)
+        self.apply_auto_frame(frame)
+        self.update_preview()
+
+    def shutdown(self):
+        """Останавливает потоки редактора при закрытии приложения"""
+        self.stop_playback()
+        if self.scrub_reader:
+            self.scrub_reader.close()
+        threads = self.proxy_threads + list(self.highlight_threads)
+        for thread in threads:
+            thread.stop()
+        for thread in threads:
+            thread.wait()
+
+    def set_timeline_position(self, frame_number):
+        self.timeline.blockSignals(True)
+        self.timeline.setValue(frame_number)
+        self.timeline.blockSignals(False)
+        self.time_label.setText(f"{frame_number / self.fps:.2f} s")
+
+    def seek_to_frame(self, frame_number):
+        if self.scrub_reader is None or self.playing:
+            return
+        # При перетаскивании события сливаются: декодируется только последняя позиция
+        if self.pending_seek is None:
+            QTimer.singleShot(0, self.flush_seek)
+        self.pending_seek = frame_number
+
+    def flush_seek(self):
+        frame_number, self.pending_seek = self.pending_seek, None
+        if frame_number is None or self.scrub_reader is None or self.playing:
+            return
+        frame = self.scrub_reader.get(frame_number)
+        if frame is None:
+            return
+        self.frame = frame
+        self.show_frame_on_canvas(frame)
+        self.time_label.setText(f"{frame_number / self.fps:.2f} s")
+        if self.media_player:
+            self.media_player.setPosition(int(frame_number * 1000 / self.fps))
+        self.apply_keyframes(frame_number / self.fps)
+        # После перемотки трекер не знает, где лицо: рамка ищется заново детектором
+        if self.auto_framer:
+            self.auto_framer.reset()
+        self.apply_auto_frame(frame)
+        self.update_preview()
+
+    def apply_keyframes(self, seconds):
+        """Ставит анимированные области в положение на момент seconds по их ключевым кадрам"""
+        if self.frame is None:
+            return
+        for item, keyframes in zip(self.area_items, self.keyframes):
+            if not keyframes:
+                continue
+            self.set_frame_rect(item, RectTrack(keyframes).sample([seconds])[0])
+
+    def set_frame_rect(self, item, rect):
+        """Ставит область по прямоугольнику (x, y, w, h) в координатах кадра"""
+        frame_h, frame_w = self.frame.shape[:2]
+        scale_w = self.canvas_view.width() / frame_w
+        scale_h = self.canvas_view.height() / frame_h
+        x, y, w, h = rect
+        item.setPos(0, 0)
+        item.setRect(QRectF(x * scale_w, y * scale_h, w * scale_w, h * scale_h))
+
+    def toggle_auto_frame(self, enabled):
+        if not enabled:
+            self.auto_frame_label.setText("")
+            return
+        if self.frame is None:
+            return
+        if self.auto_framer is None:
+            self.auto_framer = AutoFramer(self.fps)
+        # Соотношение сторон зелёной области фиксируется на момент включения
+        _, _, w, h = self.region_rects()[0]
+        self.auto_frame_aspect = w / h if w and h else 1.0
+        self.auto_framer.reset()
+        self.apply_auto_frame(self.frame)
+        self.update_preview()
+
+    def apply_auto_frame(self, frame):
+        if self.auto_framer is None or not self.auto_frame_check.isChecked():
+            return
+        rect = self.auto_framer.update(frame, self.auto_frame_aspect)
+        framer = self.auto_framer
+        self.auto_frame_label.setText(
+            f"{framer.last_ms:.1f} ms (avg {framer.cost_ms:.1f}, det {framer.detect_ms:.1f} / {framer.interval} fr)"
+            f" · budget {framer.budget_ms:.1f} ms"
+        )
+        if rect is not None:
+            self.set_frame_rect(self.area1_item, rect)
+
+    def add_keyframe(self):
+        if self.frame is None:
+            return
+        time = self.timeline.value() / self.fps
+        easing = self.easing_combo.currentText()
+        # Ключевой кадр в тот же момент времени заменяется
+        tolerance = 0.5 / self.fps
+        for keyframes, rect in zip(self.keyframes, self.region_rects()):
+            keyframes[:] = [keyframe for keyframe in keyframes if abs(keyframe[0] - time) > tolerance]
+            keyframes.append([time, list(rect), easing])
+            keyframes.sort(key=lambda keyframe: keyframe[0])
+        logger.info(f"Ключевой кадр добавлен: {time:.2f} сек ({easing})")
+
+    def clear_keyframes(self):
+        self.keyframes = [[] for _ in self.area_items]
+        logger.info("Ключевые кадры удалены")
 
     def show_frame_on_canvas(self, frame):
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        h, w, ch = rgb_frame.shape
+        canvas_w = self.canvas_view.width()
+        canvas_h = self.canvas_view.height()
+        if self.canvas_buffer is None or self.canvas_buffer.shape[:2] != (canvas_h, canvas_w):
+            self.canvas_buffer = np.empty((canvas_h, canvas_w, 3), np.uint8)
+        small = cv2.resize(frame, (canvas_w, canvas_h), dst=self.canvas_buffer, interpolation=cv2.INTER_AREA)
+        # Qt читает BGR напрямую, преобразование цвета не нужно
+        h, w, ch = small.shape
         bytes_per_line = ch * w
-        qt_image = QImage(rgb_frame.data, w, h, bytes_per_line, QImage.Format.Format_RGB888)
+        qt_image = QImage(small.data, w, h, bytes_per_line, QImage.Format.Format_BGR888)
         self.frame_for_display = qt_image
+        self.frame_item.setPixmap(QPixmap.fromImage(qt_image))
     
     def set_red_area_center(self):
         """Устанавливает красную область по центру с соотношением 9:16"""
@@ -769,63 +1408,90 @@ class VideoEditorTab(QWidget):
         self.area2_item.setRect(QRectF(x, y, area_width, area_height))
         self.update_preview()
 
+    def add_region(self):
+        if len(self.area_items) >= len(self.REGION_COLORS):
+            return
+        r, g, b = self.REGION_COLORS[len(self.area_items)]
+        item = self.scene.addRect(
+            QRectF(20, 20, 240, 135),
+            QPen(QColor(r, g, b, 180), 2),
+            QBrush(QColor(r, g, b, 60))
+        )
+        item.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsMovable)
+        item.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsSelectable)
+        self.area_items.append(item)
+        self.keyframes.append([])
+        self.region_overlay.append(False)
+        self.add_region_btn.setEnabled(len(self.area_items) < len(self.REGION_COLORS))
+        self.update_preview()
+
+    def selected_regions(self):
+        return [index for index, item in enumerate(self.area_items) if item.isSelected()]
+
+    def sync_overlay_check(self):
+        selected = self.selected_regions()
+        self.overlay_check.blockSignals(True)
+        self.overlay_check.setEnabled(bool(selected))
+        self.overlay_check.setChecked(bool(selected) and all(self.region_overlay[index] for index in selected))
+        self.overlay_check.blockSignals(False)
+
+    def toggle_overlay(self, enabled):
+        for index in self.selected_regions():
+            self.region_overlay[index] = enabled
+            item = self.area_items[index]
+            pen = item.pen()
+            pen.setStyle(Qt.PenStyle.DashLine if enabled else Qt.PenStyle.SolidLine)
+            item.setPen(pen)
+        self.update_preview()
+
+    def split_regions(self, rects, out_size):
+        """Области стека и наложения со слотами в выходном кадре out_size - так же их получит рендер"""
+        stacked = [list(rect) for rect, overlay in zip(rects, self.region_overlay) if not overlay]
+        overlays = [
+            {'src': list(rect), 'dst': overlay_slot(rect, out_size)}
+            for rect, overlay in zip(rects, self.region_overlay) if overlay
+        ]
+        return stacked, overlays
+
+    def region_rects(self):
+        """Координаты всех областей в пикселях исходного кадра"""
+        frame_h, frame_w = self.frame.shape[:2]
+        scale_w = frame_w / self.canvas_view.width()
+        scale_h = frame_h / self.canvas_view.height()
+        rects = []
+        for item in self.area_items:
+            rect = item.mapRectToScene(item.rect())
+            rects.append((
+                int(rect.x() * scale_w),
+                int(rect.y() * scale_h),
+                int(rect.width() * scale_w),
+                int(rect.height() * scale_h),
+            ))
+        return rects
+
     def update_preview(self):
         if self.frame is None:
             return
-            
-        frame_h, frame_w = self.frame.shape[:2]
-        canvas_w = self.canvas_view.width()
-        canvas_h = self.canvas_view.height()
-        
-        # Масштабируем координаты прямоугольников к размеру исходного кадра
-        def scale_rect(rect):
-            x = rect.x() * frame_w / canvas_w
-            y = rect.y() * frame_h / canvas_h
-            w = rect.width() * frame_w / canvas_w
-            h = rect.height() * frame_h / canvas_h
-            return QRect(int(x), int(y), int(w), int(h))
-            
-        rect1 = scale_rect(self.area1_item.rect())
-        rect2 = scale_rect(self.area2_item.rect())
-        
-        # Определяем порядок - меньший по высоте сверху
-        if rect1.height() < rect2.height():
-            top_rect, bottom_rect = rect1, rect2
-        else:
-            top_rect, bottom_rect = rect2, rect1
-            
-        # Вырезаем и масштабируем области
-        def crop_and_resize(rect, target_w, target_h):
-            x, y, w, h = rect.x(), rect.y(), rect.width(), rect.height()
-            crop = self.frame[y:y+h, x:x+w]
-            return cv2.resize(crop, (target_w, target_h), interpolation=cv2.INTER_AREA)
-            
-        preview_w = self.preview_canvas.width()
-        total_h = top_rect.height() + bottom_rect.height()
-        
-        if total_h == 0:
+
+        # Пересчёт только при смене кадра, областей или размера предпросмотра
+        preview_w, preview_h = self.preview_canvas.width(), self.preview_canvas.height()
+        preview_key = (tuple(self.region_rects()), tuple(self.region_overlay), preview_w, preview_h)
+        if self.frame is self.preview_frame and preview_key == self.preview_key:
             return
-            
-        top_h = int(preview_w * (top_rect.height() / top_rect.width()))
-        bottom_h = int(preview_w * (bottom_rect.height() / bottom_rect.width()))
-        
-        # Если суммарная высота больше доступной, масштабируем
-        if (top_h + bottom_h) > self.preview_canvas.height():
-            scale_factor = self.preview_canvas.height() / (top_h + bottom_h)
-            top_h = int(top_h * scale_factor)
-            bottom_h = int(bottom_h * scale_factor)
-            
-        top_img = crop_and_resize(top_rect, preview_w, top_h)
-        bottom_img = crop_and_resize(bottom_rect, preview_w, bottom_h)
-        
-        # Объединяем изображения
-        combined = np.vstack((top_img, bottom_img))
-        combined_rgb = cv2.cvtColor(combined, cv2.COLOR_BGR2RGB)
-        
-        # Отображаем в QLabel
-        h, w, ch = combined_rgb.shape
+
+        # Предпросмотр собирается тем же компоновщиком, что и рендер
+        if preview_key != self.preview_key:
+            stacked, overlays = self.split_regions(preview_key[0], (preview_w, preview_h))
+            self.preview_engine = LayoutEngine.stacked(stacked, (preview_w, preview_h), overlays=overlays)
+            self.preview_buffer = np.empty((preview_h, preview_w, 3), np.uint8)
+            self.preview_key = preview_key
+        self.preview_frame = self.frame
+        combined = self.preview_engine.compose(self.frame, out=self.preview_buffer)
+
+        # Отображаем в QLabel без преобразования цвета
+        h, w, ch = combined.shape
         bytes_per_line = ch * w
-        qimg = QImage(combined_rgb.data, w, h, bytes_per_line, QImage.Format.Format_RGB888)
+        qimg = QImage(combined.data, w, h, bytes_per_line, QImage.Format.Format_BGR888)
         self.preview_canvas.setPixmap(QPixmap.fromImage(qimg))
 
     def selectSaveFolder(self):
@@ -911,22 +1577,19 @@ class VideoEditorTab(QWidget):
 
         self.preview_canvas.setPixmap(QPixmap.fromImage(qimg))
 
-    def startCutting(self):
-        if not self.video_path or not self.save_folder:
-            QMessageBox.warning(self, "Внимание", "Выберите видео и папку для сохранения")
-            return
-
+    def layout_formats(self):
+        """Раскладка регионов по выбранным форматам в координатах кадра; None, если собрать её нельзя"""
         if self.frame is None:
             QMessageBox.warning(self, "Внимание", "Кадр видео не загружен")
-            return
+            return None
 
         frame_h, frame_w = self.frame.shape[:2]
-        disp_w = self.canvas.width()
-        disp_h = self.canvas.height()
+        disp_w = self.canvas_view.width()
+        disp_h = self.canvas_view.height()
 
         if disp_w == 0 or disp_h == 0:
             QMessageBox.warning(self, "Внимание", "Размер холста не может быть нулевым")
-            return
+            return None
 
         scale_w = frame_w / disp_w
         scale_h = frame_h / disp_h
@@ -946,43 +1609,126 @@ class VideoEditorTab(QWidget):
 
             return QRect(left, top, width, height)
 
-        real_rect1 = scaled_rect(self.current_rect1)
-        real_rect2 = scaled_rect(self.current_rect2)
+        # Прямоугольники перемещаются как элементы сцены, поэтому берём их координаты на сцене
+        real_rects = [rect_to_list(scaled_rect(item.mapRectToScene(item.rect()))) for item in self.area_items]
 
-        self.start_btn.setEnabled(False)
-        self.stop_btn.setEnabled(True)
-        self.load_btn.setEnabled(False)
-        self.save_btn.setEnabled(False)
+        # Наложения в рендере неподвижны, ключевые кадры сохраняются только для областей стека
+        keyframes = [keyframes or None for keyframes, overlay in zip(self.keyframes, self.region_overlay) if not overlay]
+        formats = []
+        for name, size in OUTPUT_FORMATS.items():
+            if not self.format_checks[name].isChecked():
+                continue
+            stacked, overlays = self.split_regions(real_rects, size)
+            formats.append({
+                'name': name.replace(':', 'x'),
+                'rects': stacked,
+                'overlays': overlays,
+                'keyframes': keyframes,
+                'size': size,
+            })
+        if not formats:
+            QMessageBox.warning(self, "Внимание", "Выберите хотя бы один формат")
+            return None
+        # Единственный формат сохраняется прямо в папку вывода, как раньше
+        if len(formats) == 1:
+            formats[0]['name'] = ''
+        return formats, (frame_w, frame_h)
+
+    def startCutting(self):
+        self.queue_render()
 
-        self.cutting_thread = VideoCuttingThread(
+    def queue_render(self, segment=None, folder=None):
+        if not self.video_path or not self.save_folder:
+            QMessageBox.warning(self, "Внимание", "Выберите видео и папку для сохранения")
+            return
+
+        layout = self.layout_formats()
+        if layout is None:
+            return
+        formats, rect_space = layout
+
+        self.queue_tab.add_job(
             self.video_path,
-            self.save_folder,
-            real_rect1,
-            real_rect2
+            folder or self.save_folder,
+            formats,
+            encoder={'fourcc': 'mp4v', 'part_duration': 180, 'container': self.container_combo.currentText()},
+            priority=self.priority_spin.value(),
+            rect_space=rect_space,
+            segment=segment,
+            clip_id=self.clip_id
         )
-        self.cutting_thread.progress_update.connect(self.progress.setValue)
-        self.cutting_thread.finished.connect(self.cuttingFinished)
-        self.cutting_thread.start()
-        logger.info("Начата нарезка видео")
-
-
-    def stopCutting(self):
-        if self.cutting_thread and self.cutting_thread.isRunning():
-            self.cutting_thread.terminate()
-            self.cutting_thread.wait()
-            logger.info("Нарезка видео остановлена пользователем")
-            self.start_btn.setEnabled(True)
-            self.stop_btn.setEnabled(False)
-            self.load_btn.setEnabled(True)
-            self.save_btn.setEnabled(True)
-
-    def cuttingFinished(self):
-        QMessageBox.information(self, "Готово", "Нарезка видео завершена!")
-        self.start_btn.setEnabled(True)
-        self.stop_btn.setEnabled(False)
-        self.load_btn.setEnabled(True)
-        self.save_btn.setEnabled(True)
-        self.progress.setValue(100)
+
+    def reset_highlights(self):
+        if self.highlight_thread:
+            self.highlight_thread.stop()
+            self.highlight_thread = None
+        self.highlight_list.clear()
+        self.highlight_btn.setText("Find Highlights")
+        self.queue_highlight_btn.setEnabled(False)
+
+    def find_highlights(self):
+        if not self.video_path:
+            return
+        self.reset_highlights()
+        self.highlight_btn.setEnabled(False)
+        thread = HighlightThread(self.video_path)
+        thread.progress_update.connect(
+            lambda percent: self.highlight_btn.setText(f"Searching... {percent}%") if thread is self.highlight_thread else None
+        )
+        thread.highlights_ready.connect(lambda highlights: self.show_highlights(thread, highlights))
+        # Ссылка держится до завершения: поток, прерванный сменой видео, не должен быть удалён на ходу
+        self.highlight_threads.append(thread)
+        thread.finished.connect(lambda: self.highlight_threads.remove(thread))
+        self.highlight_thread = thread
+        thread.start()
+
+    def show_highlights(self, thread, highlights):
+        if thread is not self.highlight_thread:
+            return
+        self.highlight_thread = None
+        self.highlight_btn.setText("Find Highlights")
+        self.highlight_btn.setEnabled(True)
+        for highlight in highlights:
+            item = QListWidgetItem(
+                f"{time.strftime('%H:%M:%S', time.gmtime(highlight['start']))}–"
+                f"{time.strftime('%H:%M:%S', time.gmtime(highlight['end']))}  score {highlight['score']:.1f}"
+            )
+            item.setData(Qt.ItemDataRole.UserRole, highlight)
+            self.highlight_list.addItem(item)
+        logger.info(f"Найдено ярких моментов: {len(highlights)}")
+
+    def jump_to_highlight(self, item):
+        highlight = item.data(Qt.ItemDataRole.UserRole)
+        if self.playing:
+            self.stop_playback()
+        self.timeline.setValue(int(highlight['start'] * self.fps))
+        self.queue_highlight_btn.setEnabled(True)
+
+    def queue_highlight(self):
+        item = self.highlight_list.currentItem()
+        if item is None or not self.save_folder:
+            QMessageBox.warning(self, "Внимание", "Выберите момент и папку для сохранения")
+            return
+        highlight = item.data(Qt.ItemDataRole.UserRole)
+        # Каждый момент рендерится в свою подпапку, чтобы части разных моментов не перезаписывали друг друга
+        folder = os.path.join(self.save_folder, f"highlight_{int(highlight['start'])}s")
+        os.makedirs(folder, exist_ok=True)
+        self.queue_render(segment=(highlight['start'], highlight['end']), folder=folder)
+
+    def save_preset(self):
+        # Пресет раскладки для режима наблюдения за папкой (python cli.py watch ... --preset)
+        layout = self.layout_formats()
+        if layout is None:
+            return
+        formats, rect_space = layout
+        path, _ = QFileDialog.getSaveFileName(self, "Сохранить пресет раскладки", "layout_preset.json", "JSON (*.json)")
+        if not path:
+            return
+        # Ключевые кадры привязаны ко времени конкретного клипа, в пресет попадают только регионы
+        for fmt in formats:
+            fmt['keyframes'] = None
+        save_layout_preset(path, formats, rect_space)
+        logger.info(f"Пресет раскладки сохранён: {path}")
 
 class DraggableRect(QWidget):
     def __init__(self, parent, rect: QRect, controller=None, color=QColor(0, 255, 0, 120)):
@@ -1076,18 +1822,43 @@ class DraggableRect(QWidget):
 
 class VideoCuttingThread(QThread):
     progress_update = pyqtSignal(int)
+    # Снимок RenderStats: скорость, ETA и время по этапам
+    stats_update = pyqtSignal(dict)
     
-    def __init__(self, video_path, save_folder, rect1, rect2):
+    def __init__(self, video_path, save_folder, rect1, rect2, formats=None, rect_space=None, encoder=None, job_id=None,
+                 segment=None, clip_id=None):
         super().__init__()
-        self.video_path = None
-        self.save_folder = save_folder
-        self.rect1 = rect1
-        self.rect2 = rect2
-        self.running = True
-        self.part_duration = 180
+        formats = formats or [{'name': '', 'rects': [rect1, rect2], 'size': OUTPUT_FORMATS['9:16']}]
+        # Сам рендер живёт в render_core и не зависит от Qt
+        self.renderer = Renderer(
+            video_path,
+            save_folder,
+            formats,
+            rect_space=rect_space,
+            encoder=encoder,
+            on_progress=self.progress_update.emit,
+            on_stats=self.stats_update.emit,
+            job_id=job_id,
+            segment=segment,
+            clip_id=clip_id
+        )
+        # Остановленная задача очереди возвращается в очередь, а не помечается остановленной
+        self.requeue = False
+
+    @property
+    def running(self):
+        return self.renderer.running
+
+    @property
+    def completed(self):
+        return self.renderer.completed
+
+    @property
+    def error(self):
+        return self.renderer.error
 
     @staticmethod
-    def split_video_ffmpeg_only(input_path, chunk_duration=180):
+    def split_video_ffmpeg_only(input_path, chunk_duration=180, tolerance=20):
 
         try:
             result = subprocess.run(
@@ -1102,18 +1873,20 @@ class VideoCuttingThread(QThread):
             print(f"Не удалось получить длительность: {e}")
             return
 
-        num_parts = math.ceil(duration / chunk_duration)
+        # Кадры здесь не декодируются, поэтому границы выбираются только по паузам в звуке
+        cuts = plan_cuts(duration, chunk_duration, tolerance, detect_silences(input_path))
+        bounds = [0.0] + cuts + [duration]
         base_name, ext = os.path.splitext(input_path)
 
-        for i in range(num_parts):
-            start_time = i * chunk_duration
+        for i in range(len(bounds) - 1):
+            start_time = bounds[i]
             output_name = f"{base_name}_part_{i+1}{ext}"
             cmd = [
                 'ffmpeg',
                 '-y',
                 '-i', input_path,
                 '-ss', str(start_time),
-                '-t', str(chunk_duration),
+                '-t', str(bounds[i + 1] - start_time),
                 '-c:v', 'copy',
                 '-c:a', 'copy',
                 output_name
@@ -1123,142 +1896,268 @@ class VideoCuttingThread(QThread):
         os.remove(input_path) 
 
     def run(self):
-        cap = cv2.VideoCapture(self.video_path)
-        if not cap.isOpened():
-            logger.error("Не удалось открыть видео для нарезки")
-            return
-
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        duration = total_frames / fps
-        logger.info(f"Всего кадров: {total_frames}, длительность: {duration:.2f} сек")
-
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-
-        rect_w, rect_h = self.rect1.width(), self.rect1.height()
-
-        center_x = width // 2
-        center_y = height // 2
-
-        new_x = center_x - rect_w // 2
-        new_y = center_y - rect_h // 2
-
-        new_x = max(0, min(new_x, width - rect_w))
-        new_y = max(0, min(new_y, height - rect_h))
-
-        self.rect1 = QRect(new_x, new_y, rect_w, rect_h)
-
-        out_width, out_height = 1080, 1920
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-
-        if self.rect1.height() < self.rect2.height():
-            top_rect, bottom_rect = self.rect1, self.rect2
-        else:
-            top_rect, bottom_rect = self.rect2, self.rect1
+        # Исключение из QThread.run завершает всё приложение, а задача осталась бы 'running' и падала
+        # бы снова при каждом запуске; ошибка записывается в рендер, job_finished пометит задачу 'failed'
+        try:
+            self.renderer.run()
+        except Exception as e:
+            logger.error(f"Ошибка рендера {self.renderer.video_path}: {e}")
+            self.renderer.error = str(e)
 
-        frame_index = 0
-        part_number = 1
-        frames_per_part = int(self.part_duration * fps)
-        current_part_frames = 0
+    def stop(self):
+        self.renderer.stop()
+
+def format_render_stats(stats):
+    """Строка для интерфейса: скорость, оставшееся время и доли этапов рендера"""
+    eta = stats.get('eta')
+    eta_text = time.strftime('%H:%M:%S', time.gmtime(eta)) if eta is not None else "--:--:--"
+    # Ожидание в очереди не входит в доли этапов, показывается отдельно
+    work = {stage: seconds for stage, seconds in stats['stages'].items() if stage != 'queue_wait' and seconds}
+    total = sum(work.values())
+    stages = " · ".join(f"{stage} {seconds / total:.0%}" for stage, seconds in work.items())
+    return f"{stats['fps']:.1f} fps, ETA {eta_text}, в очереди {stats['stages']['queue_wait']:.0f} с | {stages}"
+
+class RenderQueueTab(QWidget):
+    COLUMNS = ["Source", "Output", "Formats", "Priority", "Status", "Progress"]
+
+    def __init__(self, queue_path=RENDER_QUEUE_PATH):
+        super().__init__()
+        self.queue = RenderQueue(queue_path)
+        self.threads = {}
+        # job_id -> последний снимок статистики работающей задачи
+        self.job_stats = {}
+        self.setup_ui()
+        self.refresh_table()
+        # После перезапуска незавершённые задачи продолжаются автоматически
+        QTimer.singleShot(0, self.schedule)
 
-        temp_folder = os.path.join(self.save_folder, "temp_parts")
-        os.makedirs(temp_folder, exist_ok=True)
+    def setup_ui(self):
+        layout = QVBoxLayout()
+        layout.setContentsMargins(10, 10, 10, 10)
+        layout.setSpacing(15)
 
-        out_path = os.path.join(temp_folder, f"part_{part_number}.mp4")
-        out = cv2.VideoWriter(out_path, fourcc, fps, (out_width, out_height))
+        controls = QHBoxLayout()
+        self.run_btn = QPushButton()
+        self.run_btn.clicked.connect(self.toggle_queue)
+        controls.addWidget(self.run_btn)
 
-        while self.running:
-            ret, frame = cap.read()
-            if not ret:
-                break
+        self.stop_job_btn = QPushButton("Stop Job")
+        self.stop_job_btn.setIcon(QIcon.fromTheme("media-playback-stop"))
+        self.stop_job_btn.clicked.connect(self.stop_selected)
+        controls.addWidget(self.stop_job_btn)
 
-            def safe_crop(rect):
-                x, y, w, h = rect.left(), rect.top(), rect.width(), rect.height()
-                x = max(0, x)
-                y = max(0, y)
-                w = max(1, w)
-                h = max(1, h)
-                x2 = min(frame.shape[1], x + w)
-                y2 = min(frame.shape[0], y + h)
-                return frame[y:y2, x:x2]
-
-            crop_top = safe_crop(top_rect)
-            crop_bottom = safe_crop(bottom_rect)
-
-            total_h = crop_top.shape[0] + crop_bottom.shape[0]
-            if total_h == 0:
-                continue
+        self.retry_btn = QPushButton("Retry")
+        self.retry_btn.clicked.connect(self.retry_selected)
+        controls.addWidget(self.retry_btn)
 
-            top_scaled_height = int(out_height * (crop_top.shape[0] / total_h))
-            bottom_scaled_height = out_height - top_scaled_height
+        self.remove_btn = QPushButton("Remove")
+        self.remove_btn.setIcon(QIcon.fromTheme("edit-delete"))
+        self.remove_btn.clicked.connect(self.remove_selected)
+        controls.addWidget(self.remove_btn)
 
-            top_resized = cv2.resize(crop_top, (out_width, top_scaled_height), interpolation=cv2.INTER_AREA)
-            bottom_resized = cv2.resize(crop_bottom, (out_width, bottom_scaled_height), interpolation=cv2.INTER_AREA)
+        self.priority_up_btn = QPushButton("Priority +")
+        self.priority_up_btn.clicked.connect(lambda: self.change_priority(1))
+        controls.addWidget(self.priority_up_btn)
 
-            combined_frame = np.vstack((top_resized, bottom_resized))
-            out.write(combined_frame)
+        self.priority_down_btn = QPushButton("Priority -")
+        self.priority_down_btn.clicked.connect(lambda: self.change_priority(-1))
+        controls.addWidget(self.priority_down_btn)
 
-            current_part_frames += 1
-            frame_index += 1
+        controls.addWidget(QLabel("CPU budget:"))
+        self.budget_spin = QSpinBox()
+        self.budget_spin.setRange(1, max(64, os.cpu_count() or 1))
+        self.budget_spin.setValue(self.queue.cpu_budget)
+        self.budget_spin.valueChanged.connect(self.set_cpu_budget)
+        controls.addWidget(self.budget_spin)
 
-            if current_part_frames >= frames_per_part or frame_index == total_frames:
-                out.release()
-                logger.info(f"Часть {part_number} сохранена: {out_path}")
+        layout.addLayout(controls)
 
-                final_part_path = os.path.join(self.save_folder, f"part_{part_number}.mp4")
-                start_time = (part_number - 1) * self.part_duration
-                self.add_audio_to_video(out_path, final_part_path, start_time)
-                os.remove(out_path)
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        layout.addWidget(self.table)
 
-                if frame_index < total_frames:
-                    part_number += 1
-                    current_part_frames = 0
-                    out_path = os.path.join(temp_folder, f"part_{part_number}.mp4")
-                    out = cv2.VideoWriter(out_path, fourcc, fps, (out_width, out_height))
+        # Разбивка по этапам для работающих задач: видно, что тормозит - декодер, компоновка, энкодер или ffmpeg
+        self.stats_label = QLabel()
+        self.stats_label.setWordWrap(True)
+        layout.addWidget(self.stats_label)
 
-            progress_percent = int(frame_index / total_frames * 100)
-            self.progress_update.emit(progress_percent)
+        self.setLayout(layout)
+        self.update_run_button()
 
-        cap.release()
+    def update_run_button(self):
+        self.run_btn.setText("Pause Queue" if self.queue.active else "Start Queue")
 
-        try:
-            for f in os.listdir(temp_folder):
-                os.remove(os.path.join(temp_folder, f))
-            os.rmdir(temp_folder)
-            logger.info("Временные файлы удалены")
-        except Exception as e:
-            logger.warning(f"Не удалось удалить временные файлы: {e}")
+    def refresh_table(self):
+        self.table.setRowCount(0)
+        self.progress_bars = {}
+        for job in self.queue.jobs:
+            row = self.table.rowCount()
+            self.table.insertRow(row)
+            source_item = QTableWidgetItem(os.path.basename(job['source']))
+            source_item.setData(Qt.ItemDataRole.UserRole, job['id'])
+            self.table.setItem(row, 0, source_item)
+            self.table.setItem(row, 1, QTableWidgetItem(job['output']))
+            names = [fmt['name'] or '9x16' for fmt in job['formats']]
+            self.table.setItem(row, 2, QTableWidgetItem(", ".join(names)))
+            self.table.setItem(row, 3, QTableWidgetItem(str(job['priority'])))
+            self.table.setItem(row, 4, QTableWidgetItem(job['status']))
+            progress = QProgressBar()
+            progress.setValue(job.get('progress', 0))
+            self.table.setCellWidget(row, 5, progress)
+            self.progress_bars[job['id']] = progress
+        self.update_stats_label()
+
+    def selected_job_ids(self):
+        rows = {index.row() for index in self.table.selectionModel().selectedRows()}
+        return [self.table.item(row, 0).data(Qt.ItemDataRole.UserRole) for row in sorted(rows)]
+
+    def add_job(self, source, output, formats, encoder=None, priority=0, rect_space=None, segment=None, clip_id=None):
+        job = self.queue.add(source, output, formats, encoder=encoder, priority=priority, rect_space=rect_space,
+                             segment=segment, clip_id=clip_id)
+        logger.info(f"Задача {job['id']} добавлена в очередь: {source}")
+        self.refresh_table()
+        self.schedule()
+        return job
+
+    def schedule(self):
+        if not self.queue.active:
+            return
+        for job in self.queue.next_jobs():
+            self.start_job(job)
+        self.refresh_table()
 
-        self.progress_update.emit(100)
-        logger.info("Нарезка видео на части завершена")
-        
-    def add_audio_to_video(self, input_video_path, output_video_path, start_time):
-        command = [
-            'ffmpeg',
-            '-y',
-            '-i', input_video_path,
-            '-ss', str(start_time),
-            '-i', self.video_path,
-            '-t', str(self.part_duration),
-            '-c:v', 'copy',
-            '-c:a', 'aac',
-            '-map', '0:v:0',
-            '-map', '1:a:0',
-            '-shortest',
-            output_video_path
-        ]
-        logger.info(f"Добавление аудио к видео: {output_video_path} (время начала: {start_time} сек)")
+    def start_job(self, job):
+        job_id = job['id']
         try:
-            subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            logger.info("Аудио успешно добавлено")
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Ошибка при добавлении аудио: {e.stderr.decode()}")
-                   
+            thread = VideoCuttingThread(
+                job['source'],
+                job['output'],
+                None,
+                None,
+                formats=job['formats'],
+                rect_space=job['rect_space'],
+                encoder=job['encoder'],
+                job_id=job_id,
+                segment=job.get('segment'),
+                clip_id=job.get('clip_id')
+            )
+        except ValueError as e:
+            # Неверные настройки задачи (например, неизвестный контейнер) - задача не запускается
+            logger.error(f"Задача {job_id} не запущена: {e}")
+            self.queue.update(job_id, status='failed', error=str(e))
+            return
+        queued_at = job.get('queued_at', job['created'])
+        thread.renderer.stats.add('queue_wait', max(0.0, time.time() - queued_at))
+        tracer.add_span('queue_wait', queued_at, category='queue', job_id=job_id, clip_id=job.get('clip_id'),
+                        source=job['source'])
+        thread.progress_update.connect(lambda value, job_id=job_id: self.job_progress(job_id, value))
+        thread.stats_update.connect(lambda stats, job_id=job_id: self.job_stats_update(job_id, stats))
+        thread.finished.connect(lambda job_id=job_id: self.job_finished(job_id))
+        self.threads[job_id] = thread
+        self.queue.update(job_id, status='running')
+        thread.start()
+        logger.info(f"Задача {job_id} запущена")
+
+    def job_progress(self, job_id, value):
+        job = self.queue.get(job_id)
+        if job is not None:
+            # Прогресс хранится в памяти, на диск он попадает вместе со сменой статуса
+            job['progress'] = value
+        progress = self.progress_bars.get(job_id)
+        if progress is not None:
+            progress.setValue(value)
+
+    def job_stats_update(self, job_id, stats):
+        self.job_stats[job_id] = stats
+        progress = self.progress_bars.get(job_id)
+        if progress is not None:
+            progress.setToolTip(format_render_stats(stats))
+        self.update_stats_label()
+
+    def update_stats_label(self):
+        lines = []
+        for job_id, stats in self.job_stats.items():
+            job = self.queue.get(job_id)
+            if job is not None:
+                lines.append(f"{os.path.basename(job['source'])}: {format_render_stats(stats)}")
+        self.stats_label.setText("\n".join(lines))
+
+    def job_finished(self, job_id):
+        thread = self.threads.pop(job_id, None)
+        if thread is None:
+            return
+        thread.wait()
+        self.job_stats.pop(job_id, None)
+        if thread.completed:
+            status = 'done'
+        elif not thread.running:
+            # Остановленная задача продолжится с манифеста после повторного запуска
+            status = 'queued' if thread.requeue else 'stopped'
+        else:
+            status = 'failed'
+        if self.queue.get(job_id) is not None:
+            self.queue.update(job_id, status=status, error=thread.error, queued_at=time.time())
+        logger.info(f"Задача {job_id}: {status}")
+        self.refresh_table()
+        self.schedule()
+
+    def toggle_queue(self):
+        self.queue.active = not self.queue.active
+        self.queue.save()
+        self.update_run_button()
+        if self.queue.active:
+            self.schedule()
+        else:
+            # Пауза очереди останавливает текущие задачи на границе кадра, они остаются в очереди
+            for thread in self.threads.values():
+                thread.requeue = True
+                thread.stop()
+
+    def stop_selected(self):
+        for job_id in self.selected_job_ids():
+            thread = self.threads.get(job_id)
+            if thread:
+                thread.stop()
+
+    def retry_selected(self):
+        for job_id in self.selected_job_ids():
+            job = self.queue.get(job_id)
+            if job and job['status'] in ('failed', 'stopped', 'done'):
+                self.queue.update(job_id, status='queued', progress=0, queued_at=time.time())
+        self.refresh_table()
+        self.schedule()
+
+    def remove_selected(self):
+        for job_id in self.selected_job_ids():
+            thread = self.threads.get(job_id)
+            if thread:
+                thread.stop()
+            self.queue.remove(job_id)
+        self.refresh_table()
+
+    def change_priority(self, delta):
+        for job_id in self.selected_job_ids():
+            job = self.queue.get(job_id)
+            if job:
+                self.queue.update(job_id, priority=job['priority'] + delta)
+        self.refresh_table()
+
+    def set_cpu_budget(self, value):
+        self.queue.cpu_budget = value
+        self.queue.save()
+        self.schedule()
+
+    def shutdown(self):
+        """Останавливает задачи при закрытии приложения; они продолжатся при следующем запуске"""
+        for thread in list(self.threads.values()):
+            thread.requeue = True
+            thread.stop()
+        for thread in list(self.threads.values()):
+            thread.wait()
 
-    def stop(self):
-        self.running = False    
-        
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     
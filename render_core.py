@@ -0,0 +1,1417 @@
+import os
+import json
+import math
+import hashlib
+import subprocess
+import logging
+import time
+import uuid
+import socket
+import bisect
+import threading
+from collections import deque, OrderedDict
+
+import cv2
+import numpy as np
+
+from tracing import tracer
+from scene_cuts import SceneCutter, detect_silences
+from stream_source import StreamCapture, is_remote, source_name
+
+# Ядро рендера без зависимостей от Qt: его используют интерфейс redy.py и консольный cli.py
+logger = logging.getLogger("TwitchVideoSuite")
+
+# Папка данных приложения: кэш прокси, очередь рендера
+APP_DATA_DIR = os.getenv('APP_DATA_DIR', os.path.join(os.path.expanduser('~'), '.twitch_video_suite'))
+RENDER_QUEUE_PATH = os.getenv('RENDER_QUEUE_PATH', os.path.join(APP_DATA_DIR, 'render_queue.json'))
+
+# Прокси для редактора: высота кадра и папка кэша
+PROXY_HEIGHT = 540
+PROXY_CACHE_DIR = os.getenv('PROXY_CACHE_DIR', os.path.join(APP_DATA_DIR, 'proxies'))
+
+# Громкость частей по EBU R128: замер исходника кэшируется по его хешу
+LOUDNESS_CACHE_DIR = os.getenv('LOUDNESS_CACHE_DIR', os.path.join(APP_DATA_DIR, 'loudness'))
+# Целевая интегральная громкость, LUFS, и потолок истинного пика, dBTP
+LOUDNESS_TARGET = -16.0
+TRUE_PEAK_LIMIT = -1.5
+# Тихий исходник не усиливается больше, чем на столько дБ, чтобы не поднимать шум
+LOUDNESS_MAX_GAIN = 20.0
+
+# Метрики рендеров: по JSON-файлу на рендер, папку удобно собирать со всех машин
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(APP_DATA_DIR, 'metrics'))
+
+# Контейнер частей: faststart - moov в начале файла (место под него резервируется при муксе, без второго
+# прохода по файлу), mp4 - moov в конце, fragmented - фрагментированный MP4, hls - сегменты fMP4 с плейлистом
+CONTAINERS = ('faststart', 'mp4', 'fragmented', 'hls')
+HLS_SEGMENT_SECONDS = 4
+# Фрагменты fMP4 начинаются с ключевого кадра, но не чаще, чем раз в столько микросекунд
+FRAGMENT_MIN_DURATION = 2000000
+
+# Выходные форматы рендера: имя -> размер кадра
+OUTPUT_FORMATS = {
+    '9:16': (1080, 1920),
+    '1:1': (1080, 1080),
+    '4:5': (1080, 1350),
+}
+# Область-наложение (вебкамера поверх стека): доля ширины выходного кадра и отступ от края
+OVERLAY_WIDTH = 0.35
+OVERLAY_MARGIN = 0.03
+
+def file_fingerprint(path, chunk_size=1024 * 1024):
+    """Быстрый хеш файла: размер плюс первый и последний мегабайт"""
+    if is_remote(path):
+        # Поток не скачивается ради хеша; подписи в параметрах ссылки меняются, поэтому они не учитываются
+        return hashlib.sha1(source_name(path).encode('utf-8')).hexdigest()
+    size = os.path.getsize(path)
+    digest = hashlib.sha1(str(size).encode())
+    with open(path, 'rb') as f:
+        digest.update(f.read(chunk_size))
+        if size > chunk_size:
+            f.seek(max(chunk_size, size - chunk_size))
+            digest.update(f.read(chunk_size))
+    return digest.hexdigest()
+
+def reserved_moov_size(frame_count, duration, audio_sample_rate=None):
+    """Место под moov в начале файла, байт: таблицы сэмплов видео и звука AAC с запасом на заголовки"""
+    audio_frames = int(duration * audio_sample_rate / 1024) + 1 if audio_sample_rate else 0
+    # Худший случай - отдельный чанк на сэмпл: stsz, stco/co64, stsc и stss
+    return (frame_count * 28 + audio_frames * 24) * 5 // 4 + 16384
+
+def write_stream_playlist(folder, part_numbers, complete=False):
+    """Общий HLS-плейлист формата из плейлистов готовых частей; его можно смотреть, пока рендер идёт"""
+    lines = []
+    target = HLS_SEGMENT_SECONDS
+    for part_number in sorted(part_numbers):
+        try:
+            with open(os.path.join(folder, f"part_{part_number}", "index.m3u8"), 'r', encoding='utf-8') as f:
+                part_lines = f.read().splitlines()
+        except OSError:
+            continue
+        # У каждой части свой init-сегмент и своя временная шкала
+        if lines:
+            lines.append('#EXT-X-DISCONTINUITY')
+        lines.append(f'#EXT-X-MAP:URI="part_{part_number}/init.mp4"')
+        for line in part_lines:
+            if line.startswith('#EXTINF:'):
+                target = max(target, math.ceil(float(line[8:].split(',')[0])))
+                lines.append(line)
+            elif line and not line.startswith('#'):
+                lines.append(f"part_{part_number}/{line}")
+    header = [
+        '#EXTM3U',
+        '#EXT-X-VERSION:7',
+        f'#EXT-X-TARGETDURATION:{target}',
+        '#EXT-X-MEDIA-SEQUENCE:0',
+        '#EXT-X-PLAYLIST-TYPE:EVENT',
+    ]
+    if complete:
+        lines.append('#EXT-X-ENDLIST')
+    path = os.path.join(folder, 'stream.m3u8')
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(header + lines) + '\n')
+    os.replace(tmp_path, path)
+    return path
+
+def parse_loudnorm(stderr):
+    """Замер фильтра loudnorm (print_format=json) из вывода ffmpeg; None, если замера нет"""
+    text = stderr.decode('utf-8', 'replace') if isinstance(stderr, bytes) else stderr
+    start = text.rfind('{', 0, text.rfind('"input_i"') + 1)
+    end = text.find('}', start)
+    if start < 0 or end < 0:
+        return None
+    try:
+        data = json.loads(text[start:end + 1])
+        return {key: float(data[key]) for key in ('input_i', 'input_tp', 'input_lra', 'input_thresh')}
+    except (ValueError, KeyError):
+        return None
+
+def load_loudness(source_hash):
+    try:
+        with open(os.path.join(LOUDNESS_CACHE_DIR, f"{source_hash}.json"), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_loudness(source_hash, measured):
+    path = os.path.join(LOUDNESS_CACHE_DIR, f"{source_hash}.json")
+    try:
+        os.makedirs(LOUDNESS_CACHE_DIR, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(measured, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Не удалось сохранить замер громкости: {e}")
+
+def loudness_gain(measured, target=LOUDNESS_TARGET, true_peak=TRUE_PEAK_LIMIT):
+    """Постоянное усиление, дБ, для всего исходника: до целевой громкости, но без превышения пика.
+
+    Одно и то же усиление для всех частей даёт одинаковую громкость между ними; None - нормализовать нечего.
+    """
+    if not measured or not math.isfinite(measured['input_i']) or not math.isfinite(measured['input_tp']):
+        return None
+    gain = min(target - measured['input_i'], true_peak - measured['input_tp'], LOUDNESS_MAX_GAIN)
+    return round(gain, 2)
+
+def rect_to_list(rect):
+    if isinstance(rect, (list, tuple)):
+        return [int(v) for v in rect]
+    return [rect.left(), rect.top(), rect.width(), rect.height()]
+
+def scale_rect_list(rect, scale_x, scale_y):
+    x, y, w, h = rect
+    return [int(round(x * scale_x)), int(round(y * scale_y)), int(round(w * scale_x)), int(round(h * scale_y))]
+
+def overlay_slot(rect, out_size, width=OVERLAY_WIDTH, margin=OVERLAY_MARGIN):
+    """Слот наложения для области (x, y, w, h): правый верхний угол выходного кадра, пропорции области"""
+    _, _, rect_w, rect_h = rect
+    out_w, out_h = out_size
+    slot_w = max(1, int(out_w * width))
+    slot_h = max(1, min(out_h, int(slot_w * rect_h / max(rect_w, 1))))
+    pad = int(out_w * margin)
+    return [out_w - slot_w - pad, pad, slot_w, slot_h]
+
+def clip_rect(rect, width, height):
+    """Обрезает область (x, y, w, h) по границам кадра, возвращает None для пустой области"""
+    x, y, w, h = (int(v) for v in rect)
+    x = max(0, min(x, width - 1))
+    y = max(0, min(y, height - 1))
+    w = min(max(1, w), width - x)
+    h = min(max(1, h), height - y)
+    if w <= 0 or h <= 0:
+        return None
+    return x, y, w, h
+
+def save_layout_preset(path, formats, rect_space, encoder=None):
+    """Пресет раскладки: форматы из редактора и размер кадра, в котором заданы регионы"""
+    data = {'formats': formats, 'rect_space': list(rect_space) if rect_space else None, 'encoder': encoder}
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+def load_layout_preset(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if not data.get('formats'):
+        raise ValueError(f"В пресете {path} нет форматов")
+    return data
+
+# Функции сглаживания для анимации областей, работают с массивами NumPy
+EASINGS = {
+    'linear': lambda u: u,
+    'ease_in': lambda u: u * u,
+    'ease_out': lambda u: 1 - (1 - u) ** 2,
+    'ease_in_out': lambda u: u * u * (3 - 2 * u),
+    'hold': lambda u: np.zeros_like(u),
+}
+
+class RectTrack:
+    """Анимация области по ключевым кадрам [время в секундах, (x, y, w, h), сглаживание].
+
+    Сглаживание ключевого кадра действует на отрезке до следующего ключевого кадра.
+    """
+
+    def __init__(self, keyframes):
+        keyframes = sorted(keyframes, key=lambda keyframe: keyframe[0])
+        self.times = np.array([keyframe[0] for keyframe in keyframes], np.float64)
+        self.rects = np.array([keyframe[1] for keyframe in keyframes], np.float64)
+        easing_names = list(EASINGS)
+        self.easings = np.array([
+            easing_names.index(keyframe[2] if len(keyframe) > 2 else 'linear')
+            for keyframe in keyframes
+        ])
+
+    def sample(self, times):
+        """Возвращает массив (N, 4) координат области для массива моментов времени"""
+        times = np.asarray(times, np.float64)
+        if len(self.times) == 1:
+            return np.repeat(self.rects, len(times), axis=0)
+
+        segment = np.clip(np.searchsorted(self.times, times, side='right') - 1, 0, len(self.times) - 2)
+        t0 = self.times[segment]
+        t1 = self.times[segment + 1]
+        u = np.clip((times - t0) / np.maximum(t1 - t0, 1e-9), 0, 1)
+
+        eased = np.empty_like(u)
+        segment_easing = self.easings[segment]
+        for index, easing in enumerate(EASINGS.values()):
+            mask = segment_easing == index
+            if mask.any():
+                eased[mask] = easing(u[mask])
+
+        start = self.rects[segment]
+        return start + (self.rects[segment + 1] - start) * eased[:, None]
+
+    def sample_frames(self, frame_count, fps, width, height):
+        """Координаты области для каждого кадра, обрезанные по границам кадра"""
+        rects = np.rint(self.sample(np.arange(frame_count) / fps)).astype(np.int32)
+        rects[:, 0] = np.clip(rects[:, 0], 0, width - 1)
+        rects[:, 1] = np.clip(rects[:, 1], 0, height - 1)
+        rects[:, 2] = np.clip(rects[:, 2], 1, width - rects[:, 0])
+        rects[:, 3] = np.clip(rects[:, 3], 1, height - rects[:, 1])
+        return rects
+
+class LayoutEngine:
+    """Компоновщик N областей исходного кадра в выходной кадр.
+
+    Каждая область описывается словарём {'src': (x, y, w, h), 'dst': (x, y, w, h) или None}.
+    Области без 'dst' складываются в вертикальный стек на всю ширину (меньшая по высоте сверху),
+    области с 'dst' накладываются поверх стека в порядке описания. План компоновки и таблицы
+    cv2.remap рассчитываются один раз на размер кадра, сам кадр собирается за один проход.
+    Для анимированных областей в compose передаётся массив sources (N, 4) с координатами
+    областей на текущем кадре, слоты в выходном кадре при этом не меняются.
+    """
+
+    # При уменьшении сильнее этого порога remap даёт алиасинг, используем resize с INTER_AREA
+    REMAP_MAX_DOWNSCALE = 2.0
+
+    def __init__(self, regions, out_size, method='auto'):
+        self.regions = [dict(region) for region in regions]
+        self.out_size = (int(out_size[0]), int(out_size[1]))
+        self.method = method
+        self.frame_size = None
+        self.plan = []
+        self.use_remap = False
+        self.needs_clear = True
+        self.map1 = None
+        self.map2 = None
+
+    @classmethod
+    def stacked(cls, rects, out_size, overlays=None, method='auto'):
+        regions = [{'src': tuple(rect), 'dst': None} for rect in rects]
+        regions.extend(overlays or [])
+        return cls(regions, out_size, method)
+
+    def prepare(self, frame_w, frame_h):
+        if self.frame_size == (frame_w, frame_h):
+            return
+        out_w, out_h = self.out_size
+
+        stacked = []
+        overlays = []
+        for index, region in enumerate(self.regions):
+            src = clip_rect(region['src'], frame_w, frame_h)
+            if src is None:
+                continue
+            if region.get('dst') is None:
+                stacked.append((index, src))
+            else:
+                dst = clip_rect(region['dst'], out_w, out_h)
+                if dst is not None:
+                    overlays.append((index, src, dst))
+
+        # Меньшая по высоте область сверху, при равенстве - описанная позже
+        stacked.sort(key=lambda item: (item[1][3], -item[0]))
+        total_h = sum(src[3] for _, src in stacked)
+        plan = []
+        y = 0
+        for n, (index, src) in enumerate(stacked):
+            if n == len(stacked) - 1:
+                h = out_h - y
+            else:
+                h = int(out_h * (src[3] / total_h))
+            if h > 0:
+                plan.append((index, src, (0, y, out_w, h)))
+            y += h
+        self.needs_clear = not plan
+        plan.extend(overlays)
+        self.plan = plan
+
+        if self.method == 'auto':
+            self.use_remap = all(
+                sw / dw <= self.REMAP_MAX_DOWNSCALE and sh / dh <= self.REMAP_MAX_DOWNSCALE
+                for _, (_, _, sw, sh), (_, _, dw, dh) in plan
+            )
+        else:
+            self.use_remap = self.method == 'remap'
+
+        if self.use_remap:
+            # Непокрытые пиксели указывают за пределы кадра и заливаются чёрным
+            map_x = np.full((out_h, out_w), -16, np.float32)
+            map_y = np.full((out_h, out_w), -16, np.float32)
+            for _, (sx, sy, sw, sh), (dx, dy, dw, dh) in plan:
+                xs = sx + (np.arange(dw, dtype=np.float32) + 0.5) * (sw / dw) - 0.5
+                ys = sy + (np.arange(dh, dtype=np.float32) + 0.5) * (sh / dh) - 0.5
+                map_x[dy:dy + dh, dx:dx + dw] = np.clip(xs, sx, sx + sw - 1)[None, :]
+                map_y[dy:dy + dh, dx:dx + dw] = np.clip(ys, sy, sy + sh - 1)[:, None]
+            self.map1, self.map2 = cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+        else:
+            self.map1 = self.map2 = None
+
+        self.frame_size = (frame_w, frame_h)
+
+    def compose(self, frame, out=None, sources=None):
+        frame_h, frame_w = frame.shape[:2]
+        self.prepare(frame_w, frame_h)
+        out_w, out_h = self.out_size
+
+        if self.use_remap and sources is None:
+            return cv2.remap(frame, self.map1, self.map2, cv2.INTER_LINEAR,
+                             dst=out, borderMode=cv2.BORDER_CONSTANT)
+
+        if out is None:
+            out = np.zeros((out_h, out_w) + frame.shape[2:], frame.dtype)
+        elif self.needs_clear:
+            out.fill(0)
+        for index, (sx, sy, sw, sh), (dx, dy, dw, dh) in self.plan:
+            if sources is not None:
+                sx, sy, sw, sh = sources[index]
+            out[dy:dy + dh, dx:dx + dw] = cv2.resize(
+                frame[sy:sy + sh, sx:sx + sw], (dw, dh), interpolation=cv2.INTER_AREA
+            )
+        return out
+
+def load_keyframe_index(video_path, fps):
+    """Номера ключевых кадров видео; индекс строится ffprobe один раз и кэшируется рядом с файлом"""
+    if is_remote(video_path):
+        # Индекс по заголовкам пакетов потребовал бы прочитать весь поток по сети
+        return None
+    index_path = video_path + '.keyframes.json'
+    source_hash = file_fingerprint(video_path)
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('source_hash') == source_hash:
+            return data['keyframes']
+    except (OSError, ValueError, KeyError):
+        pass
+
+    # Читаются только заголовки пакетов, без декодирования
+    try:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+             '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', video_path],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True
+        )
+    except OSError as e:
+        logger.warning(f"Не удалось построить индекс ключевых кадров: {e}")
+        return None
+    times = []
+    first_pts = None
+    for line in result.stdout.splitlines():
+        parts = line.strip().split(',')
+        if len(parts) < 2 or parts[0] in ('', 'N/A'):
+            continue
+        pts = float(parts[0])
+        first_pts = pts if first_pts is None else min(first_pts, pts)
+        if 'K' in parts[1]:
+            times.append(pts)
+    keyframes = sorted({round((pts - first_pts) * fps) for pts in times})
+    if not keyframes or keyframes[0] != 0:
+        keyframes.insert(0, 0)
+
+    try:
+        with open(index_path, 'w', encoding='utf-8') as f:
+            json.dump({'source_hash': source_hash, 'keyframes': keyframes}, f)
+    except OSError as e:
+        logger.warning(f"Не удалось сохранить индекс ключевых кадров: {e}")
+    return keyframes
+
+def proxy_path_for(video_path):
+    """Путь к прокси-файлу в кэше, ключ - хеш исходника"""
+    return os.path.join(PROXY_CACHE_DIR, f"{file_fingerprint(video_path)}_{PROXY_HEIGHT}p.mp4")
+
+def build_proxy(video_path, proxy_path, stop_event=None):
+    """Собирает прокси низкого разрешения, где каждый кадр ключевой, для быстрой перемотки"""
+    os.makedirs(os.path.dirname(proxy_path), exist_ok=True)
+    tmp_path = proxy_path + '.part.mp4'
+    command = [
+        'ffmpeg',
+        '-y',
+        '-i', video_path,
+        '-map', '0:v:0',
+        '-an',
+        '-vf', f'scale=-2:{PROXY_HEIGHT}',
+        '-fps_mode', 'passthrough',
+        '-c:v', 'libx264',
+        '-preset', 'ultrafast',
+        '-tune', 'fastdecode',
+        '-g', '1',
+        '-crf', '26',
+        '-pix_fmt', 'yuv420p',
+        tmp_path
+    ]
+    logger.info(f"Создание прокси: {proxy_path}")
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    stderr = b''
+    # Ожидание короткими шагами, чтобы закрытие приложения не ждало конца кодирования
+    while True:
+        try:
+            _, stderr = process.communicate(timeout=0.2)
+            break
+        except subprocess.TimeoutExpired:
+            if stop_event is not None and stop_event.is_set():
+                process.kill()
+                process.communicate()
+                logger.info(f"Создание прокси остановлено: {proxy_path}")
+                break
+    if process.returncode != 0:
+        if stderr:
+            logger.error(f"Ошибка при создании прокси: {stderr.decode(errors='replace')}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+    os.replace(tmp_path, proxy_path)
+    return proxy_path
+
+class FrameCache:
+    """LRU декодированных кадров с ограничением по занимаемой памяти"""
+
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.frames = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def __contains__(self, frame_number):
+        with self.lock:
+            return frame_number in self.frames
+
+    def get(self, frame_number):
+        with self.lock:
+            frame = self.frames.get(frame_number)
+            if frame is not None:
+                self.frames.move_to_end(frame_number)
+            return frame
+
+    def put(self, frame_number, frame):
+        with self.lock:
+            if frame_number in self.frames:
+                self.frames.move_to_end(frame_number)
+                return
+            self.frames[frame_number] = frame
+            self.size += frame.nbytes
+            while self.size > self.max_bytes and len(self.frames) > 1:
+                _, old = self.frames.popitem(last=False)
+                self.size -= old.nbytes
+
+    def clear(self):
+        with self.lock:
+            self.frames.clear()
+            self.size = 0
+
+class ScrubReader:
+    """Произвольный доступ к кадрам для таймлайна.
+
+    Поиск идёт от ближайшего предшествующего ключевого кадра, а если текущая позиция декодера
+    уже внутри нужной группы кадров - декодирование продолжается без поиска. Кадры вокруг
+    курсора хранятся в LRU, фоновый поток заранее декодирует кадры в направлении перемотки.
+    """
+
+    PREFETCH_FRAMES = 12
+
+    def __init__(self, video_path, fps, frame_count, cap=None, cache_bytes=512 * 1024 * 1024):
+        self.video_path = video_path
+        self.fps = fps
+        self.frame_count = frame_count
+        self.cap = cap or cv2.VideoCapture(video_path)
+        self.position = int(self.cap.get(cv2.CAP_PROP_POS_FRAMES))
+        self.cache = FrameCache(cache_bytes)
+        self.keyframes = None
+        self.last_request = 0
+        self.prefetch_request = None
+        self.prefetch_event = threading.Event()
+        self.closed = False
+        self.prefetch_thread = threading.Thread(target=self._prefetch_loop, daemon=True)
+        self.prefetch_thread.start()
+
+    def keyframe_before(self, frame_number):
+        if not self.keyframes:
+            return None
+        return self.keyframes[max(0, bisect.bisect_right(self.keyframes, frame_number) - 1)]
+
+    def _decode_range(self, cap, position, start, end, abort=None):
+        """Декодирует кадры start..end в кэш, возвращает новую позицию декодера"""
+        keyframe = self.keyframe_before(start)
+        if keyframe is None:
+            # Индекс ещё строится - полагаемся на поиск OpenCV
+            if position != start:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+                position = start
+        elif not keyframe <= position <= start:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, keyframe)
+            position = keyframe
+
+        while position <= end:
+            if abort is not None and abort():
+                break
+            if position < start or position in self.cache:
+                ok = cap.grab()
+            else:
+                ok, frame = cap.read()
+                if ok:
+                    self.cache.put(position, frame)
+            if not ok:
+                break
+            position += 1
+        return position
+
+    def get(self, frame_number):
+        frame = self.cache.get(frame_number)
+        if frame is None:
+            self.position = self._decode_range(self.cap, self.position, frame_number, frame_number)
+            frame = self.cache.get(frame_number)
+
+        direction = 1 if frame_number >= self.last_request else -1
+        self.last_request = frame_number
+        self.prefetch_request = (frame_number, direction)
+        self.prefetch_event.set()
+        return frame
+
+    def _prefetch_loop(self):
+        self.keyframes = load_keyframe_index(self.video_path, self.fps)
+        cap = cv2.VideoCapture(self.video_path)
+        position = 0
+        while not self.closed:
+            self.prefetch_event.wait()
+            self.prefetch_event.clear()
+            if self.closed or self.prefetch_request is None:
+                continue
+
+            frame_number, direction = self.prefetch_request
+            if direction > 0:
+                start, end = frame_number + 1, frame_number + self.PREFETCH_FRAMES
+            else:
+                start, end = frame_number - self.PREFETCH_FRAMES, frame_number - 1
+            start = max(0, start)
+            end = min(end, self.frame_count - 1)
+            missing = [n for n in range(start, end + 1) if n not in self.cache]
+            if not missing:
+                continue
+            # Новый запрос от таймлайна прерывает устаревшее упреждающее чтение
+            position = self._decode_range(cap, position, missing[0], end, abort=self.prefetch_event.is_set)
+        cap.release()
+
+    def close(self):
+        self.closed = True
+        self.prefetch_event.set()
+
+class FrameRingBuffer:
+    """Ограниченный буфер декодированных кадров (номер, pts в секундах, кадр) между декодером и интерфейсом"""
+
+    def __init__(self, capacity=8):
+        self.capacity = capacity
+        self.frames = deque()
+        self.condition = threading.Condition()
+        self.closed = False
+
+    def __len__(self):
+        with self.condition:
+            return len(self.frames)
+
+    def put(self, item):
+        # Декодер ждёт, пока интерфейс не заберёт кадры, чтобы не забегать вперёд
+        with self.condition:
+            while len(self.frames) >= self.capacity and not self.closed:
+                self.condition.wait()
+            if self.closed:
+                return False
+            self.frames.append(item)
+            self.condition.notify_all()
+            return True
+
+    def peek(self):
+        with self.condition:
+            return self.frames[0] if self.frames else None
+
+    def pop_due(self, clock):
+        """Возвращает последний кадр с pts <= clock, опоздавшие кадры отбрасываются"""
+        with self.condition:
+            due = None
+            while self.frames and self.frames[0][1] <= clock:
+                due = self.frames.popleft()
+            if due is not None:
+                self.condition.notify_all()
+            return due
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.frames.clear()
+            self.condition.notify_all()
+
+class RenderStats:
+    """Накопительные таймеры этапов рендера: на кадр несколько вызовов perf_counter и сложений"""
+
+    STAGES = ('queue_wait', 'audio_extract', 'decode', 'cut_detect', 'compose', 'encode', 'mux')
+
+    def __init__(self):
+        self.stages = dict.fromkeys(self.STAGES, 0.0)
+        self.frames = 0
+        self.position = 0
+        self.total_frames = 0
+        self.started = None
+        self.window_time = None
+        self.window_frames = 0
+        self.fps = 0.0
+
+    def start(self, total_frames):
+        self.total_frames = total_frames
+        self.started = self.window_time = time.perf_counter()
+
+    def add(self, stage, seconds):
+        self.stages[stage] += seconds
+
+    def snapshot(self):
+        now = time.perf_counter()
+        elapsed = now - self.started if self.started else 0.0
+        # Текущая скорость - по кадрам с прошлого снимка, со сглаживанием
+        if self.window_time and now - self.window_time > 0:
+            recent = (self.frames - self.window_frames) / (now - self.window_time)
+            self.fps = recent if not self.fps else 0.7 * self.fps + 0.3 * recent
+            self.window_time, self.window_frames = now, self.frames
+        remaining = max(0, self.total_frames - self.position)
+        return {
+            'frames': self.frames,
+            'position': self.position,
+            'total_frames': self.total_frames,
+            'elapsed': round(elapsed, 3),
+            'fps': round(self.fps, 2),
+            'average_fps': round(self.frames / elapsed, 2) if elapsed > 0 else 0.0,
+            'eta': round(remaining / self.fps, 1) if self.fps > 0 else None,
+            'stages': {stage: round(seconds, 3) for stage, seconds in self.stages.items()},
+        }
+
+class Renderer:
+    """Рендер вертикальных частей без Qt: используется VideoCuttingThread, очередью и CLI.
+
+    formats - список вида {'name': '1x1', 'rects': [...], 'keyframes': [...], 'overlays': [...], 'size': (w, h)}.
+    """
+
+    MANIFEST_NAME = "render_manifest.json"
+    # Как часто вызывается on_stats, секунд
+    STATS_INTERVAL = 0.5
+
+    def __init__(self, video_path, save_folder, formats, rect_space=None, encoder=None, on_progress=None,
+                 on_frame=None, on_stats=None, metrics_dir=METRICS_DIR, job_id=None, segment=None, clip_id=None):
+        self.video_path = video_path
+        # Идентификатор задачи для трассировки (очередь, CLI, наблюдение за папкой)
+        self.job_id = job_id
+        # Идентификатор клипа Helix: связывает интервалы рендера с поиском и загрузкой клипа
+        self.clip_id = clip_id
+        self.save_folder = save_folder
+        self.formats = formats
+        # Отрезок исходника (начало, конец) в секундах, например найденный яркий момент; None - всё видео
+        self.segment = segment
+        # Размер кадра (w, h), в координатах которого заданы области; None - координаты оригинала
+        self.rect_space = rect_space
+        self.on_progress = on_progress
+        # Вызывается после записи каждого кадра во все форматы (замеры бенчмарка)
+        self.on_frame = on_frame
+        self.on_stats = on_stats
+        # None отключает запись файла метрик
+        self.metrics_dir = metrics_dir
+        # Ожидание в очереди добавляет вызывающий код до запуска: stats.add('queue_wait', ...)
+        self.stats = RenderStats()
+        self.running = True
+        self.completed = False
+        self.error = None
+        encoder = encoder or {}
+        self.part_duration = encoder.get('part_duration', 180)
+        # 'scene' - граница части на смене сцены или паузе в пределах допуска, 'fixed' - ровно part_duration
+        self.cut_mode = encoder.get('cut', 'scene')
+        self.cut_tolerance = encoder.get('cut_tolerance', 20)
+        self.fourcc_code = encoder.get('fourcc', 'mp4v')
+        self.container = encoder.get('container', 'faststart')
+        if self.container not in CONTAINERS:
+            raise ValueError(f"Неизвестный контейнер: {self.container}")
+        # Целевая громкость частей, LUFS; None - звук копируется без изменений
+        self.loudness_target = encoder.get('loudness', LOUDNESS_TARGET)
+        self.audio_gain = None
+        self.audio_path = None
+        self.audio_sample_rate = None
+        # StreamCapture HTTP-источника: звук пишется тем же процессом ffmpeg, что декодирует кадры
+        self.audio_stream = None
+
+    def report_progress(self, percent):
+        if self.on_progress:
+            self.on_progress(percent)
+
+    def report_stats(self):
+        if self.on_stats:
+            self.on_stats(self.stats.snapshot())
+
+    def run(self):
+        try:
+            with tracer.span('render', 'render', job_id=self.job_id, clip_id=self.clip_id,
+                             source=self.video_path) as args:
+                self.render_parts()
+                args['frames'] = self.stats.frames
+        finally:
+            self.report_stats()
+            if self.metrics_dir:
+                self.write_metrics()
+
+    def render_parts(self):
+        stats = self.stats
+        stages = stats.stages
+        # HTTP-источник читается по мере рендера, без предварительного скачивания
+        cap = StreamCapture(self.video_path) if is_remote(self.video_path) else cv2.VideoCapture(self.video_path)
+        if not cap.isOpened():
+            logger.error("Не удалось открыть видео для нарезки")
+            self.error = "Не удалось открыть видео"
+            return
+
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        duration = total_frames / fps
+        logger.info(f"Всего кадров: {total_frames}, длительность: {duration:.2f} сек")
+
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+        # Для отрезка total_frames становится концом отрезка, номера кадров остаются абсолютными
+        first_frame = 0
+        if self.segment:
+            first_frame = min(total_frames, max(0, int(round(self.segment[0] * fps))))
+            total_frames = max(first_frame, min(total_frames, int(round(self.segment[1] * fps))))
+            logger.info(f"Рендер отрезка: кадры {first_frame}-{total_frames}")
+        stats.start(total_frames - first_frame)
+
+        fourcc_code = self.fourcc_code
+        fourcc = cv2.VideoWriter_fourcc(*fourcc_code)
+
+        # Области могли быть размечены на прокси - переводим их в координаты оригинала
+        scale_x = scale_y = 1.0
+        if self.rect_space:
+            scale_x = width / self.rect_space[0]
+            scale_y = height / self.rect_space[1]
+
+        # Каждый формат получает свой компоновщик и энкодер, кадр декодируется один раз
+        outputs = []
+        for fmt in self.formats:
+            rects = [scale_rect_list(rect_to_list(rect), scale_x, scale_y) for rect in fmt['rects']]
+            keyframes = [
+                [[t, scale_rect_list(rect, scale_x, scale_y)] + list(rest) for t, rect, *rest in track] if track else None
+                for track in (fmt.get('keyframes') or [])
+            ]
+            keyframes += [None] * (len(rects) - len(keyframes))
+            overlays = [
+                dict(overlay, src=scale_rect_list(rect_to_list(overlay['src']), scale_x, scale_y))
+                for overlay in (fmt.get('overlays') or [])
+            ]
+
+            # Координаты анимированных областей на каждом кадре рассчитываются заранее одним массивом
+            geometry = None
+            if any(keyframes):
+                geometry = np.empty((max(total_frames, 1), len(rects) + len(overlays), 4), np.int32)
+                for index, rect in enumerate(rects):
+                    if keyframes[index]:
+                        track = RectTrack(keyframes[index])
+                        geometry[:, index] = track.sample_frames(len(geometry), fps, width, height)
+                    else:
+                        geometry[:, index] = clip_rect(rect, width, height)
+                    rects[index] = geometry[0, index].tolist()
+                for index, overlay in enumerate(overlays, start=len(rects)):
+                    geometry[:, index] = clip_rect(overlay['src'], width, height)
+
+            folder = os.path.join(self.save_folder, fmt['name']) if fmt['name'] else self.save_folder
+            os.makedirs(folder, exist_ok=True)
+            outputs.append({
+                'name': fmt['name'],
+                'rects': rects,
+                'engine': LayoutEngine.stacked(rects, fmt['size'], overlays=overlays),
+                'geometry': geometry,
+                'keyframes': keyframes,
+                'overlays': overlays,
+                'size': tuple(fmt['size']),
+                'folder': folder,
+                'writer': None,
+                'temp_path': None,
+            })
+
+        frames_per_part = int(self.part_duration * fps)
+
+        temp_folder = os.path.join(self.save_folder, "temp_parts")
+        os.makedirs(temp_folder, exist_ok=True)
+
+        # Манифест описывает рендер; если он совпадает, продолжаем с первой незавершённой части
+        manifest_path = os.path.join(temp_folder, self.MANIFEST_NAME)
+        settings = {
+            'source': source_name(self.video_path),
+            'source_hash': file_fingerprint(self.video_path),
+            'formats': [
+                {
+                    'name': output['name'],
+                    'rects': output['rects'],
+                    'overlays': output['overlays'],
+                    'keyframes': output['keyframes'],
+                    'size': list(output['size']),
+                }
+                for output in outputs
+            ],
+            'encoder': {
+                'fourcc': fourcc_code,
+                'fps': fps,
+                'part_duration': self.part_duration,
+                'cut': self.cut_mode,
+                'cut_tolerance': self.cut_tolerance,
+                'container': self.container,
+                'loudness': self.loudness_target,
+            },
+            'segment': list(self.segment) if self.segment else None,
+        }
+        manifest = self.load_manifest(manifest_path, settings)
+        finished_parts = manifest['finished_parts']
+        # Часть, файл которой пропал после прошлого запуска, рендерится заново; части идут подряд,
+        # поэтому вместе с ней и все следующие
+        for part in sorted(finished_parts):
+            if not all(os.path.exists(self.part_output_path(output['folder'], part)) for output in outputs):
+                logger.warning(f"Файл части {part} не найден, рендер продолжится с неё")
+                finished_parts[:] = [number for number in finished_parts if number < part]
+                self.save_manifest(manifest_path, manifest)
+                break
+
+        # Звук исходника извлекается один раз, части нарезаются из него копированием потока.
+        # Громкость замеряется в том же проходе ffmpeg и кэшируется по хешу исходника
+        normalize = self.loudness_target is not None
+        measured = manifest.get('loudness') or (load_loudness(settings['source_hash']) if normalize else None)
+        if isinstance(cap, StreamCapture):
+            # Отдельное извлечение звука прочитало бы весь поток до начала рендера
+            self.audio_stream = cap
+            self.audio_path = cap.capture_audio(os.path.join(temp_folder, "stream_audio.pcm"))
+            self.audio_sample_rate = cap.audio_sample_rate
+            if normalize and not measured:
+                logger.info("Громкость потока ещё не замерялась, части остаются без нормализации")
+        elif manifest.get('audio_path') and os.path.exists(manifest['audio_path']):
+            self.audio_path = manifest['audio_path']
+            self.audio_sample_rate = manifest['audio_sample_rate']
+            self.audio_gain = manifest.get('audio_gain')
+        else:
+            # Усиление постоянно для всего исходника и вносится в звук один раз при извлечении,
+            # части режутся из него копированием потока
+            gain = loudness_gain(measured, self.loudness_target) if normalize and measured else None
+            started = time.perf_counter()
+            with tracer.span('audio_extract', 'render', job_id=self.job_id, clip_id=self.clip_id):
+                analyzed = self.extract_source_audio(temp_folder, analyze=normalize and not measured, gain=gain)
+                if analyzed:
+                    measured = analyzed
+                    save_loudness(settings['source_hash'], measured)
+                    gain = loudness_gain(measured, self.loudness_target)
+                    if gain:
+                        # Замер готов только после первого прохода - звук с усилением извлекается вторым
+                        plain = (self.audio_path, self.audio_sample_rate)
+                        self.extract_source_audio(temp_folder, gain=gain)
+                        if self.audio_path is None:
+                            self.audio_path, self.audio_sample_rate = plain
+                            gain = None
+            stats.add('audio_extract', time.perf_counter() - started)
+            self.audio_gain = gain if self.audio_path else None
+            manifest['audio_path'] = self.audio_path
+            manifest['audio_sample_rate'] = self.audio_sample_rate
+            manifest['audio_gain'] = self.audio_gain
+            self.save_manifest(manifest_path, manifest)
+        if normalize and self.audio_path and measured:
+            manifest['loudness'] = measured
+            if self.audio_stream is not None:
+                # Для потока усиление вносится при сведении каждой части
+                self.audio_gain = loudness_gain(measured, self.loudness_target)
+            logger.info(f"Громкость исходника {measured['input_i']:.1f} LUFS, пик {measured['input_tp']:.1f} dBTP, "
+                        f"усиление частей {self.audio_gain} дБ")
+
+        # Короткому исходнику резать нечего - анализ не нужен
+        cutter = None
+        if self.cut_mode == 'scene' and total_frames - first_frame > (self.part_duration + self.cut_tolerance) * fps:
+            if 'silences' not in manifest:
+                started = time.perf_counter()
+                with tracer.span('silence_detect', 'render', job_id=self.job_id, clip_id=self.clip_id):
+                    # Звук потока пишется по ходу рендера, для него границы ищутся только по смене сцены
+                    local_audio = self.audio_path and self.audio_stream is None
+                    manifest['silences'] = detect_silences(self.audio_path) if local_audio else []
+                stats.add('cut_detect', time.perf_counter() - started)
+                self.save_manifest(manifest_path, manifest)
+            cutter = SceneCutter(fps, self.part_duration, self.cut_tolerance, manifest['silences'])
+            # Дальше допуска часть не растёт, даже если подходящей границы не нашлось
+            frames_per_part = cutter.max_frames
+
+        # Границы готовых частей: при плавающей длине продолжение считается по ним, а не по part_duration
+        part_bounds = manifest.setdefault('part_bounds', {})
+        part_number = 1
+        while part_number in finished_parts:
+            part_number += 1
+        if str(part_number - 1) in part_bounds:
+            start, frames = part_bounds[str(part_number - 1)]
+            part_start_frame = start + frames
+        else:
+            part_start_frame = first_frame + (part_number - 1) * frames_per_part
+        if part_start_frame >= total_frames and finished_parts:
+            part_start_frame = total_frames
+        elif part_start_frame > 0:
+            if finished_parts:
+                logger.info(f"Продолжение рендера с части {part_number} (кадр {part_start_frame})")
+            cap.set(cv2.CAP_PROP_POS_FRAMES, part_start_frame)
+
+        frame_index = part_start_frame
+        current_part_frames = 0
+        stats.position = frame_index - first_frame
+        next_stats = time.perf_counter() + self.STATS_INTERVAL
+
+        def open_writers():
+            for output in outputs:
+                suffix = f"_{output['name']}" if output['name'] else ""
+                output['temp_path'] = os.path.join(temp_folder, f"part_{part_number}{suffix}.mp4")
+                output['writer'] = cv2.VideoWriter(output['temp_path'], fourcc, fps, output['size'])
+
+        def release_writers(discard=False):
+            for output in outputs:
+                if output['writer'] is not None:
+                    output['writer'].release()
+                    output['writer'] = None
+                if discard and output['temp_path'] and os.path.exists(output['temp_path']):
+                    os.remove(output['temp_path'])
+
+        def finish_part():
+            """Сводит часть со звуком; False, если сведение не удалось - часть не записывается в манифест"""
+            started = time.perf_counter()
+            release_writers()
+            stats.add('encode', time.perf_counter() - started)
+            tracer.add_span('render.part', part_started, category='render', job_id=self.job_id,
+                            clip_id=self.clip_id, part=part_number, frames=current_part_frames)
+            started = time.perf_counter()
+            muxed = True
+            for output in outputs:
+                logger.info(f"Часть {part_number} сохранена: {output['temp_path']}")
+                final_part_path = self.part_output_path(output['folder'], part_number)
+                with tracer.span('mux', 'render', job_id=self.job_id, clip_id=self.clip_id, part=part_number,
+                                 format=output['name']):
+                    ok = self.add_audio_to_video(output['temp_path'], final_part_path, part_start_frame,
+                                                 current_part_frames, fps)
+                # При ошибке временный файл остаётся для разбора, продолжение отрендерит часть заново
+                if ok and os.path.exists(output['temp_path']):
+                    os.remove(output['temp_path'])
+                muxed = muxed and ok
+
+            stats.add('mux', time.perf_counter() - started)
+            if not muxed:
+                self.error = f"Не удалось свести часть {part_number} со звуком"
+                return False
+
+            finished_parts.append(part_number)
+            part_bounds[str(part_number)] = [part_start_frame, current_part_frames]
+            self.save_manifest(manifest_path, manifest)
+            if self.container == 'hls':
+                for output in outputs:
+                    write_stream_playlist(output['folder'], finished_parts)
+            return True
+
+        def start_next_part():
+            nonlocal part_number, part_start_frame, current_part_frames, part_started
+            part_number += 1
+            part_start_frame = frame_index
+            current_part_frames = 0
+            open_writers()
+            part_started = time.time()
+
+        writing = frame_index < total_frames
+        if writing:
+            open_writers()
+            part_started = time.time()
+
+        while writing:
+            # Остановка проверяется на границе кадра, незавершённая часть отбрасывается
+            if not self.running:
+                release_writers(discard=True)
+                break
+
+            started = time.perf_counter()
+            ret, frame = cap.read()
+            decoded = time.perf_counter()
+            stages['decode'] += decoded - started
+            if not ret:
+                # Число кадров потока оценивается по длительности и может быть завышено: последняя часть
+                # закрывается там, где кончились кадры
+                if current_part_frames:
+                    total_frames = frame_index
+                    finish_part()
+                break
+
+            # Решение о границе принимается до записи кадра: новая сцена начинает новую часть
+            if cutter is not None and current_part_frames:
+                cut = cutter.should_cut(frame, frame_index, current_part_frames)
+                checked = time.perf_counter()
+                stages['cut_detect'] += checked - decoded
+                if cut:
+                    logger.info(f"Граница части {part_number} на кадре {frame_index} "
+                                f"({current_part_frames / fps:.1f} сек)")
+                    if not finish_part():
+                        break
+                    start_next_part()
+                    checked = time.perf_counter()
+                decoded = checked
+
+            for output in outputs:
+                sources = None
+                if output['geometry'] is not None:
+                    sources = output['geometry'][min(frame_index, len(output['geometry']) - 1)]
+                composed = output['engine'].compose(frame, sources=sources)
+                encoding = time.perf_counter()
+                stages['compose'] += encoding - decoded
+                output['writer'].write(composed)
+                decoded = time.perf_counter()
+                stages['encode'] += decoded - encoding
+
+            current_part_frames += 1
+            frame_index += 1
+            stats.frames += 1
+            stats.position = frame_index - first_frame
+            if self.on_frame:
+                self.on_frame(frame_index)
+
+            if current_part_frames >= frames_per_part or frame_index == total_frames:
+                if not finish_part():
+                    break
+                writing = frame_index < total_frames
+                if writing:
+                    start_next_part()
+
+            progress_percent = int((frame_index - first_frame) / (total_frames - first_frame) * 100)
+            self.report_progress(progress_percent)
+            if decoded >= next_stats:
+                next_stats = decoded + self.STATS_INTERVAL
+                self.report_stats()
+
+        release_writers()
+        cap.release()
+
+        if not self.running:
+            logger.info(f"Рендер остановлен, готово частей: {len(finished_parts)}")
+            return
+        if self.error:
+            logger.error(f"Рендер прерван: {self.error}, готово частей: {len(finished_parts)}")
+            return
+
+        try:
+            for f in os.listdir(temp_folder):
+                os.remove(os.path.join(temp_folder, f))
+            os.rmdir(temp_folder)
+            logger.info("Временные файлы удалены")
+        except Exception as e:
+            logger.warning(f"Не удалось удалить временные файлы: {e}")
+
+        self.completed = True
+        if self.container == 'hls':
+            for output in outputs:
+                write_stream_playlist(output['folder'], finished_parts, complete=True)
+        self.report_progress(100)
+        logger.info("Нарезка видео на части завершена")
+
+    def write_metrics(self):
+        """Сохраняет итог рендера с разбивкой по этапам в METRICS_DIR"""
+        if self.completed:
+            status = 'done'
+        elif not self.running:
+            status = 'stopped'
+        else:
+            status = 'failed'
+        snapshot = self.stats.snapshot()
+        host = socket.gethostname()
+        metrics = {
+            'host': host,
+            'source': source_name(self.video_path),
+            'output': os.path.abspath(self.save_folder),
+            'status': status,
+            'error': self.error,
+            'finished_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'formats': [{'name': fmt['name'], 'size': list(fmt['size'])} for fmt in self.formats],
+            'encoder': {'fourcc': self.fourcc_code, 'part_duration': self.part_duration, 'cut': self.cut_mode,
+                        'container': self.container, 'loudness': self.loudness_target},
+            'audio_gain_db': self.audio_gain,
+        }
+        metrics.update(snapshot)
+        stages = ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in snapshot['stages'].items() if seconds)
+        logger.info(f"Рендер {status}: {snapshot['frames']} кадров, {snapshot['average_fps']} fps; {stages}")
+
+        # Для ссылки basename включал бы параметры запроса; в имени файла остаются только безопасные символы
+        stem = os.path.splitext(os.path.basename(source_name(self.video_path)))[0]
+        stem = ''.join(c if c.isalnum() or c in '-_' else '_' for c in stem)[:80] or 'source'
+        path = os.path.join(self.metrics_dir, f"{time.strftime('%Y%m%d-%H%M%S')}_{host}_{stem}.json")
+        try:
+            os.makedirs(self.metrics_dir, exist_ok=True)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(metrics, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить метрики рендера: {e}")
+            return None
+        return path
+
+    def load_manifest(self, manifest_path, settings):
+        """Загружает манифест рендера, если он описывает тот же исходник, области и настройки"""
+        if os.path.exists(manifest_path):
+            try:
+                with open(manifest_path, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+                # Сравниваем в JSON-представлении, где кортежи становятся списками
+                settings = json.loads(json.dumps(settings))
+                if all(manifest.get(key) == value for key, value in settings.items()):
+                    return manifest
+                logger.info("Манифест относится к другому рендеру, начинаем заново")
+            except (OSError, ValueError) as e:
+                logger.warning(f"Не удалось прочитать манифест: {e}")
+
+        manifest = dict(settings)
+        manifest['finished_parts'] = []
+        self.save_manifest(manifest_path, manifest)
+        return manifest
+
+    @staticmethod
+    def save_manifest(manifest_path, manifest):
+        # Запись через временный файл, чтобы манифест не остался обрезанным
+        tmp_path = manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, manifest_path)
+
+    def extract_source_audio(self, temp_folder, analyze=False, gain=None):
+        """Перекодирует звуковую дорожку исходника в AAC один раз за рендер, с усилением gain дБ, если задано.
+
+        analyze=True добавляет в тот же процесс второй выход с замером EBU R128 (loudnorm) - звук
+        декодируется один раз; возвращается замер или None.
+        """
+        self.audio_path = None
+        self.audio_sample_rate = None
+        try:
+            result = subprocess.run(
+                ['ffprobe', '-v', 'error', '-select_streams', 'a:0',
+                 '-show_entries', 'stream=sample_rate', '-of',
+                 'default=noprint_wrappers=1:nokey=1', self.video_path],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                check=True
+            )
+            sample_rate = result.stdout.decode('utf-8').strip()
+        except (subprocess.CalledProcessError, OSError) as e:
+            logger.warning(f"Не удалось определить параметры аудио: {e}")
+            return None
+
+        if not sample_rate:
+            logger.info("В исходном видео нет аудиодорожки")
+            return None
+
+        audio_path = os.path.join(temp_folder, "source_audio_gain.m4a" if gain else "source_audio.m4a")
+        command = [
+            'ffmpeg',
+            '-y',
+            '-i', self.video_path,
+            '-vn',
+            '-map', '0:a:0',
+            *(['-af', f"volume={gain}dB"] if gain else []),
+            '-c:a', 'aac',
+            '-b:a', '192k',
+            '-movflags', '+faststart',
+            audio_path
+        ]
+        if analyze:
+            command += [
+                '-map', '0:a:0',
+                '-af', f"loudnorm=I={self.loudness_target}:TP={TRUE_PEAK_LIMIT}:LRA=11:print_format=json",
+                '-f', 'null', '-'
+            ]
+        logger.info(f"Извлечение аудио исходника: {audio_path}")
+        try:
+            result = subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except subprocess.CalledProcessError as e:
+            logger.error(f"Ошибка при извлечении аудио: {e.stderr.decode()}")
+            return None
+
+        self.audio_path = audio_path
+        self.audio_sample_rate = int(sample_rate)
+        if not analyze:
+            return None
+        measured = parse_loudnorm(result.stderr)
+        if measured is None:
+            logger.warning("Замер громкости не найден в выводе ffmpeg")
+        return measured
+
+    def audio_offset(self, frame_number, fps):
+        """Переводит номер кадра в смещение аудио, выровненное по сэмплам"""
+        if not self.audio_sample_rate:
+            return frame_number / fps
+        sample = round(frame_number * self.audio_sample_rate / fps)
+        return sample / self.audio_sample_rate
+
+    def part_output_path(self, folder, part_number):
+        """Файл готовой части; для HLS - плейлист в отдельной папке части рядом с её сегментами"""
+        if self.container == 'hls':
+            part_folder = os.path.join(folder, f"part_{part_number}")
+            os.makedirs(part_folder, exist_ok=True)
+            return os.path.join(part_folder, "index.m3u8")
+        return os.path.join(folder, f"part_{part_number}.mp4")
+
+    def container_args(self, output_video_path, frame_count, duration):
+        if self.container == 'faststart':
+            audio_sample_rate = self.audio_sample_rate if self.audio_path else None
+            return ['-moov_size', str(reserved_moov_size(frame_count, duration, audio_sample_rate))]
+        if self.container == 'fragmented':
+            return ['-movflags', '+frag_keyframe+empty_moov+default_base_moof',
+                    '-min_frag_duration', str(FRAGMENT_MIN_DURATION)]
+        if self.container == 'hls':
+            folder = os.path.dirname(output_video_path)
+            return ['-f', 'hls', '-hls_time', str(HLS_SEGMENT_SECONDS), '-hls_playlist_type', 'vod',
+                    '-hls_segment_type', 'fmp4', '-hls_fmp4_init_filename', 'init.mp4',
+                    '-hls_segment_filename', os.path.join(folder, 'seg_%05d.m4s')]
+        return []
+
+    def add_audio_to_video(self, input_video_path, output_video_path, start_frame, frame_count, fps):
+        """Сводит видео части со звуком в итоговый файл; False, если ffmpeg завершился с ошибкой"""
+        if not self.audio_path and self.container == 'mp4':
+            # Аудио нет - часть сохраняется без звука
+            os.replace(input_video_path, output_video_path)
+            return True
+
+        start_time = self.audio_offset(start_frame, fps)
+        duration = self.audio_offset(start_frame + frame_count, fps) - start_time
+        command = ['ffmpeg', '-y', '-i', input_video_path]
+        audio_args = []
+        if self.audio_path:
+            audio_input = ['-i', self.audio_path]
+            audio_codec = ['-c:a', 'copy']
+            if self.audio_stream is not None:
+                # Сырой PCM потока начинается с точки начала чтения и ещё дописывается
+                self.audio_stream.wait_audio(start_time + duration)
+                start_time -= self.audio_stream.start_time
+                audio_input = ['-f', 's16le', '-ar', str(self.audio_sample_rate), '-ac', '2', '-i', self.audio_path]
+                audio_codec = ['-c:a', 'aac', '-b:a', '192k']
+                if self.audio_gain:
+                    # Сырой PCM всё равно кодируется здесь - усиление в том же проходе, без лишнего поколения
+                    audio_codec = ['-af', f"volume={self.audio_gain}dB", *audio_codec]
+            command += ['-ss', f"{start_time:.6f}", '-t', f"{duration:.6f}", *audio_input]
+            audio_args = [*audio_codec, '-map', '1:a:0', '-shortest']
+        command += ['-c:v', 'copy', '-map', '0:v:0', *audio_args]
+        container_args = self.container_args(output_video_path, frame_count, frame_count / fps)
+
+        logger.info(f"Добавление аудио к видео: {output_video_path} (время начала: {start_time:.3f} сек)")
+        try:
+            subprocess.run(command + container_args + [output_video_path],
+                           check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            logger.info("Аудио успешно добавлено")
+            return True
+        except subprocess.CalledProcessError as e:
+            if self.container != 'faststart':
+                logger.error(f"Ошибка при добавлении аудио: {e.stderr.decode()}")
+                return False
+            # Оценка места под moov оказалась мала - переносим его в начало вторым проходом
+            logger.warning(f"Резерва под moov не хватило, перенос вторым проходом: {output_video_path}")
+            try:
+                subprocess.run(command + ['-movflags', '+faststart', output_video_path],
+                               check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                return True
+            except subprocess.CalledProcessError as e:
+                logger.error(f"Ошибка при добавлении аудио: {e.stderr.decode()}")
+                return False
+
+    def stop(self):
+        self.running = False
+
+class RenderQueue:
+    """Очередь задач рендера, сохраняемая на диск.
+
+    Задача - словарь с исходником, форматами (области, ключевые кадры, размер), папкой вывода,
+    настройками энкодера, приоритетом, стоимостью в ядрах CPU и статусом. Задачи, прерванные
+    закрытием приложения, при загрузке возвращаются в очередь и продолжаются с манифеста рендера.
+    """
+
+    STATUSES = ('queued', 'running', 'done', 'failed', 'stopped')
+
+    def __init__(self, path, cpu_budget=None):
+        self.path = path
+        self.jobs = []
+        self.active = True
+        self.cpu_budget = cpu_budget or os.cpu_count() or 1
+        self.lock = threading.RLock()
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось прочитать очередь рендера: {e}")
+            return
+        with self.lock:
+            self.jobs = data.get('jobs', [])
+            self.active = data.get('active', True)
+            self.cpu_budget = data.get('cpu_budget', self.cpu_budget)
+            for job in self.jobs:
+                if job['status'] == 'running':
+                    job['status'] = 'queued'
+
+    def save(self):
+        with self.lock:
+            data = {'active': self.active, 'cpu_budget': self.cpu_budget, 'jobs': self.jobs}
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+
+    def add(self, source, output, formats, encoder=None, priority=0, rect_space=None, cpu_cost=2, segment=None,
+            clip_id=None):
+        job = {
+            'id': uuid.uuid4().hex[:12],
+            'source': source if is_remote(source) else os.path.abspath(source),
+            'clip_id': clip_id,
+            'output': os.path.abspath(output),
+            # Копия через JSON отвязывает задачу от изменяемых структур редактора
+            'formats': json.loads(json.dumps(formats)),
+            'rect_space': list(rect_space) if rect_space else None,
+            'segment': list(segment) if segment else None,
+            'encoder': encoder or {'fourcc': 'mp4v', 'part_duration': 180},
+            'priority': priority,
+            'cpu_cost': cpu_cost,
+            'status': 'queued',
+            'progress': 0,
+            'created': time.time(),
+            'queued_at': time.time(),
+        }
+        with self.lock:
+            self.jobs.append(job)
+            self.save()
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return next((job for job in self.jobs if job['id'] == job_id), None)
+
+    def remove(self, job_id):
+        with self.lock:
+            self.jobs = [job for job in self.jobs if job['id'] != job_id]
+            self.save()
+
+    def update(self, job_id, **fields):
+        with self.lock:
+            job = self.get(job_id)
+            if job is not None:
+                job.update(fields)
+                self.save()
+            return job
+
+    def next_jobs(self):
+        """Задачи, которые можно запустить сейчас: по приоритету, в рамках бюджета CPU"""
+        with self.lock:
+            running = [job for job in self.jobs if job['status'] == 'running']
+            used = sum(job['cpu_cost'] for job in running)
+            # Две задачи с одной папкой вывода делили бы temp_parts и манифест
+            busy_outputs = {job['output'] for job in running}
+            queued = sorted(
+                (job for job in self.jobs if job['status'] == 'queued'),
+                key=lambda job: (-job['priority'], job['created'])
+            )
+            selected = []
+            for job in queued:
+                if job['output'] in busy_outputs:
+                    continue
+                if (running or selected) and used + job['cpu_cost'] > self.cpu_budget:
+                    continue
+                selected.append(job)
+                used += job['cpu_cost']
+                busy_outputs.add(job['output'])
+            return selected
@@ -0,0 +1,121 @@
+import re
+import logging
+import subprocess
+
+import cv2
+import numpy as np
+
+# Границы частей рендера по смене сцены и паузам в речи вместо жёстких 180 секунд.
+# Смена сцены считается по гистограммам уже декодированных рендером кадров, причём только в окне
+# допуска вокруг целевой длины части; паузы - один проход ffmpeg silencedetect по звуку.
+logger = logging.getLogger("TwitchVideoSuite")
+
+# Пауза в речи: тише порога, дБ, не короче min_duration секунд
+SILENCE_DB = -35.0
+SILENCE_MIN_DURATION = 0.4
+# Расстояние Бхаттачарьи между гистограммами соседних кадров, выше которого считается смена сцены
+SCENE_THRESHOLD = 0.35
+# Шаг прореживания кадра перед гистограммой: 1080p превращается в 240x135
+SIGNATURE_STEP = 8
+
+SILENCE_PATTERN = re.compile(r'silence_(start|end): (-?[\d.]+)')
+
+def detect_silences(path, noise_db=SILENCE_DB, min_duration=SILENCE_MIN_DURATION):
+    """Интервалы тишины (начало, конец) в секундах по первой звуковой дорожке; при ошибке - пустой список"""
+    command = [
+        'ffmpeg', '-v', 'info', '-nostats', '-i', path,
+        '-map', '0:a:0', '-vn', '-af', f"silencedetect=noise={noise_db}dB:d={min_duration}",
+        '-f', 'null', '-'
+    ]
+    try:
+        result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+    except (subprocess.CalledProcessError, OSError) as e:
+        logger.warning(f"Не удалось найти паузы в звуке {path}: {e}")
+        return []
+
+    silences = []
+    start = None
+    for kind, value in SILENCE_PATTERN.findall(result.stderr.decode('utf-8', 'replace')):
+        if kind == 'start':
+            start = max(0.0, float(value))
+        elif start is not None:
+            silences.append((round(start, 3), round(float(value), 3)))
+            start = None
+    # Тишина до конца файла (без silence_end) не нужна: там часть заканчивается и так
+    return silences
+
+def frame_signature(frame, step=SIGNATURE_STEP):
+    """Нормированная гистограмма яркости прореженного кадра"""
+    small = np.ascontiguousarray(frame[::step, ::step])
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+    histogram = cv2.calcHist([gray], [0], None, [32], [0, 256])
+    return cv2.normalize(histogram, histogram, 1.0, 0.0, cv2.NORM_L1)
+
+def plan_cuts(duration, target, tolerance, silences):
+    """Времена разрезов только по паузам: середина паузы, ближайшая к целевой длине части.
+
+    Для нарезки копированием потока, где кадры не декодируются; без подходящей паузы режем по target.
+    """
+    cuts = []
+    position = 0.0
+    while duration - position > target + tolerance:
+        low, high = position + target - tolerance, position + target + tolerance
+        best = position + target
+        best_distance = None
+        for start, end in silences:
+            if start >= high:
+                break
+            middle = (start + end) / 2
+            if low <= middle <= high and (best_distance is None or abs(middle - best) < best_distance):
+                best_distance = abs(middle - best)
+                cut = middle
+        position = cut if best_distance is not None else best
+        cuts.append(round(position, 3))
+    return cuts
+
+class SceneCutter:
+    """Решает на лету, закончить ли часть перед очередным кадром.
+
+    До target - tolerance кадры не анализируются совсем. До target режем только на смене сцены внутри
+    паузы, после target - на смене сцены или в середине паузы; на target + tolerance часть закрывает
+    сам рендер.
+    """
+
+    def __init__(self, fps, target, tolerance, silences=(), threshold=SCENE_THRESHOLD):
+        self.fps = fps
+        self.min_frames = max(1, int((target - tolerance) * fps))
+        self.target_frames = int(target * fps)
+        self.max_frames = max(self.target_frames, int((target + tolerance) * fps))
+        self.silences = sorted(silences)
+        self.threshold = threshold
+        self.previous = None
+        self.silence_index = 0
+
+    def silence_at(self, time):
+        """Интервал тишины, содержащий time; время кадров только растёт, поэтому указатель идёт вперёд"""
+        while self.silence_index < len(self.silences) and self.silences[self.silence_index][1] <= time:
+            self.silence_index += 1
+        if self.silence_index < len(self.silences):
+            start, end = self.silences[self.silence_index]
+            if start <= time:
+                return start, end
+        return None
+
+    def should_cut(self, frame, frame_index, part_frames):
+        # Гистограмма нужна начиная с кадра перед окном, чтобы было с чем сравнить первый кадр окна
+        if part_frames < self.min_frames - 1:
+            self.previous = None
+            return False
+        signature = frame_signature(frame)
+        previous, self.previous = self.previous, signature
+        if part_frames < self.min_frames or previous is None:
+            return False
+
+        scene = cv2.compareHist(previous, signature, cv2.HISTCMP_BHATTACHARYYA) >= self.threshold
+        time = frame_index / self.fps
+        silence = self.silence_at(time)
+        if part_frames < self.target_frames:
+            return scene and silence is not None
+        if scene:
+            return True
+        return silence is not None and time >= (silence[0] + silence[1]) / 2
@@ -0,0 +1,230 @@
+import os
+import json
+import time
+import logging
+import threading
+import subprocess
+from collections import deque
+
+import cv2
+import numpy as np
+
+# Чтение исходника по HTTP без предварительного скачивания: ffmpeg забирает поток по сети и декодирует,
+# фоновый поток складывает кадры в ограниченный буфер упреждающего чтения. Сеть и декодирование идут
+# параллельно с компоновкой и кодированием, короткие задержки сети гасит буфер.
+logger = logging.getLogger("TwitchVideoSuite")
+
+# Предел буфера декодированных кадров, байт; 1080p - около 40 кадров
+READ_AHEAD_BYTES = int(os.getenv('STREAM_READ_AHEAD_MB', '256')) * 1024 * 1024
+# Переподключение ffmpeg при обрыве HTTP-соединения
+RECONNECT_ARGS = ['-reconnect', '1', '-reconnect_streamed', '1', '-reconnect_delay_max', '5']
+MEDIA_EXTENSIONS = ('.mp4', '.mov', '.mkv', '.webm', '.ts', '.m3u8')
+
+def is_remote(path):
+    return isinstance(path, str) and path.startswith(('http://', 'https://'))
+
+def source_name(path):
+    """Имя источника для манифеста и отчётов: абсолютный путь файла или адрес потока без параметров запроса"""
+    if is_remote(path):
+        return path.split('?', 1)[0]
+    return os.path.abspath(path)
+
+def is_direct_media(url):
+    """Ссылка на сам медиафайл, а не на страницу, которую надо разрешать через yt-dlp"""
+    return source_name(url).lower().endswith(MEDIA_EXTENSIONS)
+
+def probe_stream(url):
+    """Параметры видео- и звуковой дорожек удалённого источника; ffprobe читает только заголовки"""
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', *RECONNECT_ARGS,
+         '-show_entries', 'stream=codec_type,width,height,avg_frame_rate,nb_frames,sample_rate:format=duration',
+         '-of', 'json', url],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=True
+    )
+    data = json.loads(result.stdout.decode('utf-8'))
+    streams = data.get('streams', [])
+    video = next((stream for stream in streams if stream.get('codec_type') == 'video'), None)
+    audio = next((stream for stream in streams if stream.get('codec_type') == 'audio'), None)
+    if video is None:
+        raise ValueError(f"В источнике нет видеодорожки: {url}")
+    numerator, _, denominator = video.get('avg_frame_rate', '0/1').partition('/')
+    fps = float(numerator) / float(denominator or 1) if float(denominator or 1) else 0.0
+    fps = fps or 30.0
+    frame_count = int(video.get('nb_frames') or 0)
+    if not frame_count:
+        # HLS и потоки без индекса кадров: оценка по длительности
+        frame_count = int(round(float(data.get('format', {}).get('duration') or 0) * fps))
+    return {
+        'width': int(video['width']),
+        'height': int(video['height']),
+        'fps': fps,
+        'frame_count': frame_count,
+        'audio_sample_rate': int(audio['sample_rate']) if audio and audio.get('sample_rate') else None,
+    }
+
+class StreamCapture:
+    """Замена cv2.VideoCapture для HTTP-источника: read/get/set(POS_FRAMES)/isOpened/release.
+
+    Процесс ffmpeg запускается при первом read() с позиции, заданной set(); если перед этим вызван
+    capture_audio(), тот же процесс пишет звук в сырой PCM-файл - источник читается по сети один раз.
+    """
+
+    def __init__(self, url, read_ahead_bytes=READ_AHEAD_BYTES):
+        self.url = url
+        self.info = None
+        try:
+            self.info = probe_stream(url)
+        except (subprocess.CalledProcessError, OSError, ValueError, KeyError) as e:
+            logger.error(f"Не удалось открыть поток {url}: {e}")
+            return
+        self.width = self.info['width']
+        self.height = self.info['height']
+        self.fps = self.info['fps']
+        self.frame_bytes = self.width * self.height * 3
+        self.max_frames = max(2, read_ahead_bytes // self.frame_bytes)
+        self.start_frame = 0
+        self.position = 0
+        self.audio_path = None
+        self.audio_sample_rate = self.info['audio_sample_rate']
+        self.process = None
+        self.reader = None
+        self.frames = deque()
+        self.condition = threading.Condition()
+        self.eof = False
+        self.closed = False
+        # Пока рендер ждёт звук, буфер кадров может превышать max_frames (см. wait_audio)
+        self.waiting_audio = False
+
+    def isOpened(self):
+        return self.info is not None
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return self.info['frame_count']
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.width
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.height
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return self.position
+        return 0.0
+
+    def set(self, prop, value):
+        if prop != cv2.CAP_PROP_POS_FRAMES:
+            return False
+        # Перемотка - перезапуск ffmpeg с новой позиции; для рендера это только точка продолжения
+        self.stop_process()
+        self.start_frame = self.position = int(value)
+        return True
+
+    @property
+    def start_time(self):
+        return self.start_frame / self.fps
+
+    def capture_audio(self, audio_path):
+        """Звук со стартовой позиции пишется в audio_path (s16le, стерео); None, если звука нет"""
+        if not self.audio_sample_rate:
+            return None
+        self.audio_path = audio_path
+        return audio_path
+
+    def start_process(self):
+        command = ['ffmpeg', '-v', 'error', '-nostdin', *RECONNECT_ARGS]
+        if self.start_frame:
+            command += ['-ss', f"{self.start_time:.6f}"]
+        command += ['-i', self.url, '-map', '0:v:0', '-f', 'rawvideo', '-pix_fmt', 'bgr24', 'pipe:1']
+        if self.audio_path:
+            command += ['-map', '0:a:0', '-f', 's16le', '-ac', '2', '-ar', str(self.audio_sample_rate),
+                        '-y', self.audio_path]
+        logger.info(f"Чтение потока с кадра {self.start_frame}: {self.url}")
+        self.eof = False
+        self.process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                        bufsize=self.frame_bytes)
+        self.reader = threading.Thread(target=self._read_loop, args=(self.process,), daemon=True)
+        self.reader.start()
+
+    def _read_loop(self, process):
+        # Канал закрывает сам читающий поток: закрытие из другого потока во время read небезопасно
+        with process.stdout as stdout:
+            while True:
+                data = stdout.read(self.frame_bytes)
+                if len(data) < self.frame_bytes:
+                    break
+                frame = np.frombuffer(data, np.uint8).reshape(self.height, self.width, 3)
+                with self.condition:
+                    while len(self.frames) >= self.max_frames and not self.waiting_audio and self.process is process:
+                        self.condition.wait()
+                    if self.process is not process:
+                        return
+                    self.frames.append(frame)
+                    self.condition.notify_all()
+        with self.condition:
+            if self.process is process:
+                self.eof = True
+                self.condition.notify_all()
+
+    def read(self):
+        if self.info is None or self.closed:
+            return False, None
+        if self.process is None:
+            self.start_process()
+        with self.condition:
+            while not self.frames and not self.eof:
+                self.condition.wait()
+            if not self.frames:
+                return False, None
+            frame = self.frames.popleft()
+            self.condition.notify_all()
+        self.position += 1
+        return True, frame
+
+    def wait_audio(self, end_time, poll=0.05, stall_timeout=5.0):
+        """Ждёт, пока звук до end_time (секунды исходника) будет записан в файл.
+
+        Звук обычно опережает рендер на буфер кадров, но ffmpeg может отставать по звуку (чередование
+        дорожек в контейнере). Тогда он стоит на записи кадров в заполненный буфер, и звук не растёт:
+        на время ожидания буфер кадров снимает ограничение max_frames. Если файл всё равно перестал
+        расти (звуковая дорожка короче видео), ожидание прекращается.
+        """
+        if not self.audio_path:
+            return
+        needed = int((end_time - self.start_time) * self.audio_sample_rate) * 4
+        with self.condition:
+            self.waiting_audio = True
+            self.condition.notify_all()
+        try:
+            self._poll_audio(needed, poll, stall_timeout)
+        finally:
+            with self.condition:
+                self.waiting_audio = False
+
+    def _poll_audio(self, needed, poll, stall_timeout):
+        size, grown = -1, time.monotonic()
+        while self.process is not None and self.process.poll() is None:
+            current = os.path.getsize(self.audio_path) if os.path.exists(self.audio_path) else 0
+            if current >= needed:
+                return
+            if current != size:
+                size, grown = current, time.monotonic()
+            elif time.monotonic() - grown > stall_timeout:
+                logger.warning(f"Звук потока записан только до {current / 4 / self.audio_sample_rate:.1f} сек "
+                               f"от начала чтения, часть будет смонтирована с ним")
+                return
+            time.sleep(poll)
+
+    def stop_process(self):
+        with self.condition:
+            process, self.process = self.process, None
+            self.frames.clear()
+            self.condition.notify_all()
+        if process is not None:
+            process.kill()
+            process.wait()
+
+    def release(self):
+        self.closed = True
+        self.stop_process()
@@ -0,0 +1,89 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+# Трассировка конвейера клип -> загрузка -> рендер -> звук в формате Chrome trace events.
+# Файл открывается в chrome://tracing или https://ui.perfetto.dev.
+# Включается переменной TRACE_PATH (интерфейс сохраняет трассу при закрытии) или флагом --trace в cli.py.
+logger = logging.getLogger("TwitchVideoSuite")
+
+TRACE_PATH = os.getenv('TRACE_PATH')
+
+class Tracer:
+    """Собирает интервалы (span) с аргументами clip_id, job_id и т.п.; потокобезопасен"""
+
+    def __init__(self, enabled=False, max_events=200000):
+        self.enabled = enabled
+        self.events = deque(maxlen=max_events)
+        self.thread_names = {}
+        self.lock = threading.Lock()
+        # Стенные часы для согласования трасс разных процессов, perf_counter - для точности
+        self.wall_origin = time.time()
+        self.perf_origin = time.perf_counter()
+
+    def now_us(self):
+        return (self.wall_origin + time.perf_counter() - self.perf_origin) * 1e6
+
+    def record(self, event):
+        thread = threading.current_thread()
+        event['pid'] = os.getpid()
+        event['tid'] = thread.ident
+        with self.lock:
+            self.thread_names[thread.ident] = thread.name
+            self.events.append(event)
+
+    @contextmanager
+    def span(self, name, category='pipeline', **args):
+        if not self.enabled:
+            yield args
+            return
+        start = self.now_us()
+        try:
+            # Вызывающий код может дописать аргументы в словарь (например, размер результата)
+            yield args
+        except BaseException as e:
+            args['error'] = repr(e)
+            raise
+        finally:
+            duration = self.now_us() - start
+            self.record({'name': name, 'cat': category, 'ph': 'X', 'ts': start, 'dur': duration, 'args': args})
+            logger.debug(f"span {name} {duration / 1000:.1f} мс {args}")
+
+    def add_span(self, name, start_time, end_time=None, category='pipeline', **args):
+        """Интервал задним числом по стенным часам, например ожидание задачи в очереди"""
+        if not self.enabled:
+            return
+        start = start_time * 1e6
+        end = end_time * 1e6 if end_time is not None else self.now_us()
+        self.record({'name': name, 'cat': category, 'ph': 'X', 'ts': start, 'dur': max(0.0, end - start), 'args': args})
+
+    def instant(self, name, category='pipeline', **args):
+        if not self.enabled:
+            return
+        self.record({'name': name, 'cat': category, 'ph': 'i', 's': 't', 'ts': self.now_us(), 'args': args})
+
+    def export_chrome(self, path):
+        with self.lock:
+            events = list(self.events)
+            thread_names = dict(self.thread_names)
+        pid = os.getpid()
+        metadata = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+            for tid, name in thread_names.items()
+        ]
+        data = {'traceEvents': metadata + events, 'displayTimeUnit': 'ms'}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        logger.info(f"Трасса сохранена: {path} ({len(events)} событий)")
+        return path
+
+# Общий трассировщик приложения
+tracer = Tracer(enabled=bool(TRACE_PATH))
+span = tracer.span
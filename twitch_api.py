@@ -0,0 +1,114 @@
+import os
+import re
+import time
+import subprocess
+import logging
+
+import requests
+
+from tracing import span
+
+# Twitch Helix и yt-dlp без зависимостей от Qt: используются вкладкой поиска клипов и cli.py
+logger = logging.getLogger("TwitchVideoSuite")
+
+# Адреса можно переопределить, например на локальный fake_helix.py
+TOKEN_URL = os.getenv('TWITCH_TOKEN_URL', 'https://id.twitch.tv/oauth2/token')
+HELIX_URL = os.getenv('TWITCH_HELIX_URL', 'https://api.twitch.tv/helix')
+
+# Helix отдаёт не больше 100 клипов на страницу
+CLIP_PAGE_MAX = 100
+MAX_RETRIES = 5
+
+def sanitize_filename(name):
+    return re.sub(r'[\\/:"*?<>|]+', '_', name)
+
+def clip_filename(clip):
+    return sanitize_filename(f"{clip['channel']} - {clip['title']}.mp4")
+
+def clip_id_from_url(clip_url):
+    # Идентификатор клипа Helix совпадает с последним сегментом ссылки clips.twitch.tv/<id>
+    return clip_url.rstrip('/').rsplit('/', 1)[-1].split('?', 1)[0]
+
+def get_access_token(client_id, client_secret, token_url=TOKEN_URL):
+    params = {
+        'client_id': client_id,
+        'client_secret': client_secret,
+        'grant_type': 'client_credentials'
+    }
+    with span('helix.token', 'helix'):
+        response = requests.post(token_url, params=params).json()
+    return response['access_token']
+
+def helix_headers(client_id, token):
+    return {
+        'Client-ID': client_id,
+        'Authorization': f'Bearer {token}'
+    }
+
+def helix_get(url, headers, params, max_retries=MAX_RETRIES):
+    """GET к Helix с ожиданием сброса лимита при 429 и повтором при ошибках сервера"""
+    for attempt in range(max_retries + 1):
+        response = requests.get(url, headers=headers, params=params)
+        if attempt < max_retries and response.status_code == 429:
+            # Ratelimit-Reset - момент (unix time), когда ведро запросов снова полное
+            reset = float(response.headers.get('Ratelimit-Reset') or 0)
+            delay = min(60.0, max(0.1, reset - time.time()))
+            logger.warning(f"Helix: превышен лимит запросов, ожидание {delay:.1f} сек")
+            time.sleep(delay)
+            continue
+        if attempt < max_retries and response.status_code >= 500:
+            delay = 0.5 * 2 ** attempt
+            logger.warning(f"Helix: ошибка {response.status_code}, повтор через {delay:.1f} сек")
+            time.sleep(delay)
+            continue
+        response.raise_for_status()
+        return response.json()
+
+def get_user_id(username, headers, helix_url=HELIX_URL):
+    params = {'login': username}
+    with span('helix.users', 'helix', login=username):
+        response = helix_get(f'{helix_url}/users', headers, params)
+    return response['data'][0]['id'] if response['data'] else None
+
+def iter_clip_pages(user_id, headers, page_size=CLIP_PAGE_MAX, started_at='2024-01-01T00:00:00Z',
+                    max_pages=None, helix_url=HELIX_URL):
+    """Страницы клипов канала по курсору pagination.cursor, по мере получения"""
+    params = {
+        'broadcaster_id': user_id,
+        'first': min(page_size, CLIP_PAGE_MAX),
+        'started_at': started_at,
+    }
+    pages = 0
+    while True:
+        with span('helix.clips', 'helix', broadcaster_id=user_id, page=pages + 1) as args:
+            response = helix_get(f'{helix_url}/clips', headers, params)
+            args['count'] = len(response['data'])
+        yield response['data']
+        pages += 1
+        cursor = response.get('pagination', {}).get('cursor')
+        if not cursor or not response['data'] or (max_pages and pages >= max_pages):
+            return
+        params['after'] = cursor
+
+def get_clips(user_id, headers, first=20, started_at='2024-01-01T00:00:00Z', helix_url=HELIX_URL):
+    clips = []
+    for page in iter_clip_pages(user_id, headers, page_size=first, started_at=started_at, helix_url=helix_url):
+        clips.extend(page)
+        if len(clips) >= first:
+            break
+    return clips[:first]
+
+def download_clip(clip_url, save_path):
+    with span('download', 'download', clip_id=clip_id_from_url(clip_url), path=save_path):
+        subprocess.run(["yt-dlp", "-o", save_path, clip_url], check=True)
+
+def resolve_direct_url(clip_url):
+    with span('resolve_url', 'download', clip_id=clip_id_from_url(clip_url)):
+        result = subprocess.run(
+            ["yt-dlp", "-f", "mp4", "-g", clip_url],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            check=True
+        )
+    return result.stdout.strip()
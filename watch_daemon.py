@@ -0,0 +1,274 @@
+import os
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from render_core import Renderer, file_fingerprint
+
+# Режим наблюдения за папкой: новые клипы рендерятся по сохранённому пресету без участия человека.
+# watchdog (inotify/FSEvents/ReadDirectoryChangesW) необязателен - без него папка опрашивается через os.scandir.
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+logger = logging.getLogger("TwitchVideoSuite")
+
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.mov', '.avi', '.webm')
+# Временные файлы yt-dlp и загрузчиков: пока файл так называется, он ещё пишется
+PARTIAL_SUFFIXES = ('.part', '.ytdl', '.tmp', '.temp')
+LEDGER_NAME = '.render_ledger.jsonl'
+
+class RenderLedger:
+    """Журнал обработанных файлов (JSONL, только дозапись), ключ - отпечаток содержимого"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.records = {}
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Оборванная последняя строка после аварийного завершения
+                    continue
+                self.records[record['fingerprint']] = record
+
+    def seen(self, fingerprint, retry_failed=False):
+        record = self.records.get(fingerprint)
+        if record is None:
+            return False
+        return not (retry_failed and record['status'] == 'failed')
+
+    def record(self, fingerprint, path, status, **fields):
+        record = {'fingerprint': fingerprint, 'path': path, 'status': status, 'time': round(time.time(), 3)}
+        record.update(fields)
+        with self.lock:
+            self.records[fingerprint] = record
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+class FolderWatcher:
+    """Отдаёт новые видео папки, когда их размер и время изменения перестали меняться"""
+
+    def __init__(self, folder, settle_seconds=5.0):
+        self.folder = folder
+        self.settle_seconds = settle_seconds
+        # путь -> ((размер, mtime), момент, с которого файл не менялся)
+        self.pending = {}
+        self.emitted = set()
+
+    def is_candidate(self, name):
+        lower = name.lower()
+        if lower.startswith('.') or lower.endswith(PARTIAL_SUFFIXES):
+            return False
+        return lower.endswith(VIDEO_EXTENSIONS)
+
+    def scan(self):
+        now = time.monotonic()
+        ready = []
+        present = set()
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if not entry.is_file() or not self.is_candidate(entry.name):
+                    continue
+                path = entry.path
+                present.add(path)
+                if path in self.emitted:
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                state = (stat.st_size, stat.st_mtime_ns)
+                previous = self.pending.get(path)
+                if previous is None or previous[0] != state or stat.st_size == 0:
+                    self.pending[path] = (state, now)
+                    continue
+                if now - previous[1] >= self.settle_seconds:
+                    del self.pending[path]
+                    self.emitted.add(path)
+                    ready.append(path)
+
+        # Удалённые файлы забываем, чтобы файл с тем же именем снова был замечен
+        for path in list(self.pending):
+            if path not in present:
+                del self.pending[path]
+        self.emitted &= present
+        return ready
+
+class WakeHandler(FileSystemEventHandler):
+    def __init__(self, wake):
+        self.wake = wake
+
+    def on_any_event(self, event):
+        self.wake.set()
+
+class WatchDaemon:
+    """Наблюдает за папкой и рендерит готовые клипы пулом из workers потоков"""
+
+    def __init__(self, folder, output, preset, workers=2, ledger_path=None,
+                 poll_interval=2.0, settle_seconds=5.0, retry_failed=False, dedup_distance=None, emit=None):
+        self.folder = os.path.abspath(folder)
+        self.output = os.path.abspath(output)
+        self.preset = preset
+        self.workers = max(1, workers)
+        self.ledger = RenderLedger(ledger_path or os.path.join(self.folder, LEDGER_NAME))
+        self.watcher = FolderWatcher(self.folder, settle_seconds)
+        self.poll_interval = poll_interval
+        self.retry_failed = retry_failed
+        # Порог почти одинаковых клипов; None - без дедупликации
+        self.dedup_distance = dedup_distance
+        self.hash_index = None
+        if dedup_distance is not None:
+            from clip_dedup import HashIndex
+            self.hash_index = HashIndex()
+            for record in self.ledger.records.values():
+                if record['status'] == 'done' and record.get('phash') is not None:
+                    self.hash_index.add(record['path'], record['phash'])
+        self.emit = emit or (lambda event, **fields: None)
+        self.stop_event = threading.Event()
+        self.wake = threading.Event()
+        self.in_flight = {}
+        self.renderers = {}
+        self.lock = threading.Lock()
+
+    def output_folder(self, path):
+        # Свой каталог на клип: у каждого рендера собственные temp_parts и манифест
+        return os.path.join(self.output, os.path.splitext(os.path.basename(path))[0])
+
+    def find_duplicate(self, path):
+        """Путь уже принятого клипа того же момента или None; хеш нового клипа добавляется в индекс"""
+        from clip_dedup import video_hash
+        try:
+            value = video_hash(path)
+        except ValueError as e:
+            logger.warning(f"Не удалось вычислить хеш {path}: {e}")
+            return None, None
+        matches = self.hash_index.search(value, self.dedup_distance)
+        if matches:
+            return matches[0][0], value
+        self.hash_index.add(path, value)
+        return None, value
+
+    def render(self, path, fingerprint, phash=None):
+        last_percent = [-1]
+
+        def on_progress(percent):
+            if percent != last_percent[0]:
+                last_percent[0] = percent
+                self.emit('progress', path=path, percent=percent)
+
+        renderer = Renderer(
+            path,
+            self.output_folder(path),
+            self.preset['formats'],
+            rect_space=self.preset.get('rect_space'),
+            encoder=self.preset.get('encoder'),
+            on_progress=on_progress,
+            job_id=fingerprint[:12]
+        )
+        with self.lock:
+            if self.stop_event.is_set():
+                return 'stopped'
+            self.renderers[fingerprint] = renderer
+        self.emit('job_started', path=path, output=renderer.save_folder)
+        started = time.perf_counter()
+        try:
+            renderer.run()
+        finally:
+            with self.lock:
+                self.renderers.pop(fingerprint, None)
+
+        seconds = round(time.perf_counter() - started, 3)
+        if renderer.completed:
+            self.ledger.record(fingerprint, path, 'done', output=renderer.save_folder, seconds=seconds, phash=phash)
+            status = 'done'
+        elif not renderer.running:
+            # Остановлен вручную: в журнал не пишем, следующий запуск продолжит рендер по манифесту
+            status = 'stopped'
+        else:
+            self.ledger.record(fingerprint, path, 'failed', error=renderer.error, seconds=seconds)
+            status = 'failed'
+        self.emit('job_finished', path=path, status=status, error=renderer.error, seconds=seconds)
+        return status
+
+    def submit_ready(self, pool):
+        for path in self.watcher.scan():
+            try:
+                fingerprint = file_fingerprint(path)
+            except OSError as e:
+                logger.warning(f"Не удалось прочитать {path}: {e}")
+                self.watcher.emitted.discard(path)
+                continue
+            if fingerprint in self.in_flight or self.ledger.seen(fingerprint, self.retry_failed):
+                self.emit('skipped', path=path, fingerprint=fingerprint)
+                continue
+            phash = None
+            if self.hash_index is not None:
+                duplicate_of, phash = self.find_duplicate(path)
+                if duplicate_of:
+                    self.ledger.record(fingerprint, path, 'duplicate', duplicate_of=duplicate_of)
+                    self.emit('duplicate_skipped', path=path, duplicate_of=duplicate_of)
+                    continue
+            self.emit('queued', path=path, fingerprint=fingerprint)
+            future = pool.submit(self.render, path, fingerprint, phash)
+            self.in_flight[fingerprint] = future
+            future.add_done_callback(lambda _: self.wake.set())
+
+    def run(self):
+        os.makedirs(self.output, exist_ok=True)
+        observer = None
+        if Observer is not None:
+            observer = Observer()
+            observer.schedule(WakeHandler(self.wake), self.folder, recursive=False)
+            observer.start()
+        self.emit('watching', folder=self.folder, output=self.output, workers=self.workers,
+                  mode='events' if observer else 'poll')
+
+        pool = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            while not self.stop_event.is_set():
+                self.submit_ready(pool)
+                for fingerprint, future in list(self.in_flight.items()):
+                    if future.done():
+                        del self.in_flight[fingerprint]
+                        if future.exception() is not None:
+                            logger.error(f"Ошибка рендера: {future.exception()}")
+
+                # С событиями файловой системы опрос нужен только пока файлы дописываются
+                if observer and not self.watcher.pending:
+                    timeout = max(self.poll_interval, 30.0)
+                else:
+                    timeout = self.poll_interval
+                self.wake.wait(timeout)
+                self.wake.clear()
+        finally:
+            if observer:
+                observer.stop()
+                observer.join()
+            pool.shutdown(wait=True)
+        self.emit('watch_stopped')
+
+    def stop(self):
+        # Рендеры останавливаются на границе кадра, незавершённые задачи из очереди не запускаются
+        self.stop_event.set()
+        with self.lock:
+            for renderer in self.renderers.values():
+                renderer.stop()
+        for future in list(self.in_flight.values()):
+            future.cancel()
+        self.wake.set()